@@ -0,0 +1,178 @@
+"""
+Benchmark of the chatbot's checkpoint serializers: LangGraph's default one against the
+DeltaSerializer of chatbot_with_tools_and_memory/serializer.py.
+
+A conversation of N turns (a human message and an answer of --message-chars characters each)
+runs through a one node graph with `add_messages` state, checkpointed by the InMemorySaver or the
+PooledSqliteSaver of the chatbot. Reports the bytes handed to storage (checkpoints, writes and
+blobs), the time of the checkpoint writes of the whole conversation and of its last turn, and
+the time to load the latest checkpoint with cold serializer caches.
+
+Usage (from the agent_implementations directory):
+    python benchmarks/checkpoint_benchmark.py --turns 10,100,1000
+    python benchmarks/checkpoint_benchmark.py --turns 100 --saver sqlite --message-chars 2000
+"""
+from pathlib import Path
+from typing import Annotated, Any, Callable, Dict, List, Optional, TypedDict
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+BENCHMARKS_DIR: Path = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+import run_benchmarks # noqa: E402
+
+
+class CountingSerializer:
+    """Wraps a serializer and counts the bytes it produces."""
+
+    def __init__(self, serde: Any) -> None:
+        self.serde = serde
+        self.bytes_written: int = 0
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        self.bytes_written += len(data)
+        return type_, data
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        return self.serde.loads_typed(data)
+
+
+def timed(method: Callable[..., Any], timings: List[float]) -> Callable[..., Any]:
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started_at: float = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - started_at)
+    return wrapper
+
+
+def run_conversation(saver_name: str, serializer_name: str, turns: int, args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from langgraph.graph import END, StateGraph, add_messages
+
+    serializer = run_benchmarks.import_agent_module("chatbot", "serializer")
+    checkpointer = run_benchmarks.import_agent_module("chatbot", "checkpointer")
+
+    path: str = os.path.join(workdir, f"{saver_name}-{serializer_name}-{turns}.db")
+    store: Any = None
+    if serializer_name == "delta":
+        store = serializer.SqliteBlobStore(path) if saver_name == "sqlite" else serializer.MemoryBlobStore()
+        inner: Any = serializer.DeltaSerializer(store, compress = args.compress)
+    else:
+        inner = JsonPlusSerializer()
+    serde = CountingSerializer(inner)
+    if saver_name == "sqlite":
+        # Keep every checkpoint, pruning would hide how much each step writes.
+        saver: Any = checkpointer.PooledSqliteSaver(path, keep_last = None, serde = serde)
+    else:
+        saver = InMemorySaver(serde = serde)
+
+    write_timings: List[float] = []
+    saver.put = timed(saver.put, write_timings)
+    saver.put_writes = timed(saver.put_writes, write_timings)
+
+    class State(TypedDict):
+        messages: Annotated[List[BaseMessage], add_messages]
+
+    answer: str = ("Checkpoint benchmark answer. " * (args.message_chars // 29 + 1))[:args.message_chars]
+    builder = StateGraph(State)
+    builder.add_node("chatbot", lambda state: {"messages": [AIMessage(content = f"{len(state['messages'])}: {answer}")]})
+    builder.set_entry_point("chatbot")
+    builder.add_edge("chatbot", END)
+    graph = builder.compile(checkpointer = saver)
+
+    config: Dict[str, Any] = {"configurable": {"thread_id": "benchmark"}}
+    last_turn: float = 0.0
+    for turn in range(turns):
+        writes_before: int = len(write_timings)
+        graph.invoke({"messages": [HumanMessage(content = f"Question number {turn}?")]}, config)
+        last_turn = sum(write_timings[writes_before:])
+
+    # Cold read: a new serializer on the same store, nothing cached.
+    if serializer_name == "delta":
+        saver.serde = serializer.DeltaSerializer(store, compress = args.compress)
+    load_timings: List[float] = []
+    for _ in range(args.loads):
+        started_at: float = time.perf_counter()
+        checkpoint_tuple = saver.get_tuple(config)
+        load_timings.append(time.perf_counter() - started_at)
+        if serializer_name == "delta":
+            saver.serde = serializer.DeltaSerializer(store, compress = args.compress)
+    assert len(checkpoint_tuple.checkpoint["channel_values"]["messages"]) == 2 * turns
+
+    if saver_name == "sqlite":
+        saver.close()
+        if store is not None:
+            store.close()
+
+    return {
+        "saver": saver_name,
+        "serializer": serializer_name,
+        "turns": turns,
+        "bytes_written": serde.bytes_written + (store.bytes_written if store is not None else 0),
+        "write_seconds": sum(write_timings),
+        "last_turn_write_seconds": last_turn,
+        "load_seconds": run_benchmarks.percentile(load_timings, 50),
+    }
+
+
+def print_report(args: argparse.Namespace, results: List[Dict[str, Any]]) -> None:
+    print(f"\n== checkpoint serializers (message chars={args.message_chars}, compress={args.compress}) ==")
+    print(f"{'saver':>7} {'serializer':>10} {'turns':>6} {'written MB':>11} {'vs default':>10} {'writes s':>9} {'last turn ms':>13} {'load ms':>8}")
+    defaults: Dict[tuple, Dict[str, Any]] = {
+        (result["saver"], result["turns"]): result for result in results if result["serializer"] == "default"
+    }
+    for result in results:
+        baseline: Optional[Dict[str, Any]] = defaults.get((result["saver"], result["turns"]))
+        ratio: str = f"{result['bytes_written'] / baseline['bytes_written']:.3f}x" if baseline else "-"
+        print(
+            f"{result['saver']:>7} {result['serializer']:>10} {result['turns']:>6} {result['bytes_written'] / 1e6:>11.2f} {ratio:>10} "
+            f"{result['write_seconds']:>9.2f} {result['last_turn_write_seconds'] * 1000:>13.2f} {result['load_seconds'] * 1000:>8.2f}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--turns",
+        type = lambda value: [int(count) for count in value.split(",")],
+        default = [10, 100, 1000],
+        help = "Comma separated conversation lengths."
+    )
+    parser.add_argument("--saver", choices = ["memory", "sqlite", "all"], default = "all")
+    parser.add_argument("--message-chars", type = int, default = 400, help = "Characters of every answer.")
+    parser.add_argument("--loads", type = int, default = 5, help = "Loads of the latest checkpoint to time.")
+    parser.add_argument("--no-compress", dest = "compress", action = "store_false", help = "Turn the zstd compression of DeltaSerializer off.")
+    parser.add_argument("--json", dest = "json_path", help = "Also write the results as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    savers: List[str] = ["memory", "sqlite"] if args.saver == "all" else [args.saver]
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for saver_name in savers:
+            for turns in args.turns:
+                for serializer_name in ("default", "delta"):
+                    results.append(run_conversation(saver_name, serializer_name, turns, args, workdir))
+
+    print_report(args, results)
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump(results, file, indent = 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Deterministic stand-ins for the network clients used by the agents, so the graphs can be
+benchmarked offline. Every fake sleeps for a latency sampled from a configurable distribution
+(seeded, so two runs with the same seed see the same latencies) and returns scripted outputs.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+import asyncio
+import random
+import threading
+import time
+import zlib
+
+
+class LatencyDistribution:
+    """
+    Latency sampler parsed from a spec string:
+        - "const:0.2"            always 0.2 seconds
+        - "uniform:0.1,0.5"      uniform between 0.1 and 0.5 seconds
+        - "normal:0.3,0.05"      normal with mean 0.3 and std 0.05 (clipped at 0)
+        - "lognormal:0.3,0.5"    lognormal with median 0.3 and sigma 0.5, a long tailed API latency
+    """
+
+    def __init__(self, spec: str = "const:0", seed: int = 0) -> None:
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind: str = kind
+        self.params: List[float] = [float(value) for value in params.split(",") if value]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        if kind not in ("const", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {spec!r}.")
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "const":
+                return self.params[0] if self.params else 0.0
+            if self.kind == "uniform":
+                return self._random.uniform(*self.params)
+            if self.kind == "normal":
+                return max(self._random.gauss(*self.params), 0.0)
+            median, sigma = self.params
+            return self._random.lognormvariate(0, sigma) * median
+
+    def __repr__(self) -> str:
+        return self.spec
+
+
+def approximate_tokens(text: str) -> int:
+    return max(len(text) // 4, 1)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model whose replies come from `script(messages) -> AIMessage`, after a sampled latency.
+    `bind_tools` is accepted and ignored, so it drops into `llm.bind_tools(...)` call sites.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed = True)
+
+    script: Callable[[List[BaseMessage]], AIMessage]
+    latency: LatencyDistribution = LatencyDistribution()
+    model_name: str = "scripted"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        message: AIMessage = self.script(messages)
+        prompt_tokens: int = sum(approximate_tokens(str(m.content)) for m in messages)
+        completion_tokens: int = approximate_tokens(str(message.content) + str(message.tool_calls))
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return ChatResult(generations = [ChatGeneration(message = message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency.sample())
+        return self._reply(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency.sample())
+        return self._reply(messages)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+
+def fake_search_results(query: str, max_results: int = 2) -> Dict[str, Any]:
+    """A Tavily shaped response for the query."""
+    return {
+        "query": query,
+        "results": [
+            {
+                "url": f"https://example.com/{zlib.crc32(f'{query}-{rank}'.encode()) % 10_000}",
+                "title": f"Result {rank} for {query}",
+                "content": f"Scripted search result {rank} about {query}. " * 8,
+                "score": round(1 / (rank + 1), 3),
+            }
+            for rank in range(max_results)
+        ],
+        "response_time": 0.0,
+    }
+
+
+def install_fake_search(latency: LatencyDistribution) -> None:
+    """
+    Replace the Tavily backend of every TavilySearch (and CachedTavilySearch) in this process
+    with `fake_search_results` after a sampled latency.
+    """
+    from langchain_tavily import TavilySearch
+
+    def _run(self, query: str, run_manager: Any = None, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(latency.sample())
+        return fake_search_results(query, self.max_results or 2)
+
+    async def _arun(self, query: str, run_manager: Any = None, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(latency.sample())
+        return fake_search_results(query, self.max_results or 2)
+
+    TavilySearch._run = _run
+    TavilySearch._arun = _arun
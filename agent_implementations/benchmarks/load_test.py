@@ -0,0 +1,205 @@
+"""
+Load test of the ReAct agent API (simple_react_agent_langgraph/app.py).
+
+With --url the requests go to a server that is already running, eg. `python serve.py --workers 4`.
+Without it, the script starts the API itself with serve.py's settings for every worker count of
+--workers, each worker wired with the scripted fakes of fakes.py (no network access or API keys),
+and reports how requests/sec scale with the number of worker processes. With the default zero
+latency fakes a request is pure graph and HTTP overhead, so throughput should grow with the workers
+up to the number of cores. The client is a single asyncio process, on a large machine run it with
+--url from another host so it does not compete with the workers for the cores.
+
+Usage (from the agent_implementations directory):
+    python benchmarks/load_test.py --workers 1,2,4 --concurrency 64 --duration 10
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 32 --duration 30
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+
+BENCHMARKS_DIR: Path = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+import run_benchmarks # noqa: E402
+from fakes import LatencyDistribution, install_fake_search # noqa: E402
+
+
+def create_fake_app() -> Any:
+    """uvicorn app factory, runs in every worker process: the ReAct API with the fake LLM and search."""
+    install_fake_search(LatencyDistribution(os.environ["LOAD_TEST_SEARCH_LATENCY"]))
+    run_benchmarks.setup_react(LatencyDistribution(os.environ["LOAD_TEST_LLM_LATENCY"]))
+    return run_benchmarks.import_agent_module("react", "app").app
+
+
+def serve_fake(workers: int, port: int) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "load_test:create_fake_app",
+        factory = True,
+        app_dir = str(BENCHMARKS_DIR),
+        host = "127.0.0.1",
+        port = port,
+        workers = workers,
+        timeout_graceful_shutdown = 30,
+        backlog = 2048,
+        log_level = "warning"
+    )
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 120.0) -> None:
+    import httpx
+
+    deadline: float = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url = url, timeout = 2.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"The server exited with code {process.returncode}.")
+            try:
+                if (await client.get("/metrics")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"The server at {url} did not start within {timeout} seconds.")
+
+
+async def run_load(url: str, concurrency: int, duration: float, timeout: float) -> Dict[str, Any]:
+    """`concurrency` clients send requests back to back for `duration` seconds."""
+    import httpx
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    limits = httpx.Limits(max_connections = concurrency, max_keepalive_connections = concurrency)
+
+    async with httpx.AsyncClient(base_url = url, timeout = timeout, limits = limits) as client:
+        started_at: float = time.perf_counter()
+        deadline: float = started_at + duration
+
+        async def user(user_id: int) -> None:
+            request: int = 0
+            while time.perf_counter() < deadline:
+                request_started_at: float = time.perf_counter()
+                try:
+                    response = await client.get("/react_agent", params = {"input": f"Why is langgraph useful? ({user_id}-{request})"})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - request_started_at)
+                except httpx.HTTPError as e:
+                    errors.append(repr(e))
+                request += 1
+
+        await asyncio.gather(*(user(user_id) for user_id in range(concurrency)))
+        wall: float = time.perf_counter() - started_at
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": wall,
+        "throughput_rps": len(latencies) / wall if wall else float("nan"),
+        "latency_p50": run_benchmarks.percentile(latencies, 50),
+        "latency_p95": run_benchmarks.percentile(latencies, 95),
+        "latency_p99": run_benchmarks.percentile(latencies, 99),
+    }
+
+
+def load_test_workers(workers: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Start the fake backed API with `workers` processes, warm it up, measure, then shut it down gracefully."""
+    url: str = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--serve", "--workers", str(workers), "--port", str(args.port)],
+        stdout = None if args.verbose else subprocess.DEVNULL
+    )
+    try:
+        asyncio.run(wait_until_ready(url, process))
+        asyncio.run(run_load(url, args.concurrency, min(args.duration, 2.0), args.timeout))
+        result: Dict[str, Any] = asyncio.run(run_load(url, args.concurrency, args.duration, args.timeout))
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout = 60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"workers": workers, **result}
+
+
+def print_report(args: argparse.Namespace, results: List[Dict[str, Any]]) -> None:
+    print(f"\n== react API load test ({args.url or 'fakes'}, cores={os.cpu_count()}, llm={args.llm_latency}, search={args.search_latency}) ==")
+    print(f"{'workers':>7} {'conc':>5} {'reqs':>7} {'err':>5} {'rps':>9} {'speedup':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    baseline: float = results[0]["throughput_rps"] if results else float("nan")
+    for result in results:
+        print(
+            f"{result['workers'] or '-':>7} {result['concurrency']:>5} {result['requests']:>7} {result['errors']:>5} "
+            f"{result['throughput_rps']:>9.1f} {result['throughput_rps'] / baseline if baseline else float('nan'):>7.2f}x "
+            f"{result['latency_p50'] * 1000:>9.1f} {result['latency_p95'] * 1000:>9.1f} {result['latency_p99'] * 1000:>9.1f}"
+        )
+        if result["first_error"]:
+            print(f"{'':>7} first error: {result['first_error']}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help = "Load test this running server instead of starting one with fakes.")
+    parser.add_argument(
+        "--workers",
+        type = lambda value: [int(count) for count in value.split(",")],
+        default = [1, 2, 4],
+        help = "Comma separated worker counts, eg. 1,2,4,8."
+    )
+    parser.add_argument("--concurrency", type = int, default = 64, help = "Concurrent clients.")
+    parser.add_argument("--duration", type = float, default = 10.0, help = "Seconds of load per run.")
+    parser.add_argument("--timeout", type = float, default = 60.0, help = "Request timeout in seconds.")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--llm-latency", default = "const:0", help = "Fake LLM latency distribution, see fakes.LatencyDistribution.")
+    parser.add_argument("--search-latency", default = "const:0", help = "Fake Tavily latency distribution.")
+    parser.add_argument("--search-cache", action = "store_true", help = "Keep the shared search result cache on.")
+    parser.add_argument("--json", dest = "json_path", help = "Also write the results as JSON to this path.")
+    parser.add_argument("--verbose", action = "store_true", help = "Show the output of the server.")
+    parser.add_argument("--serve", action = "store_true", help = argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.json_path:
+        # prepare_environment changes into a temporary directory, which is gone when the JSON is written.
+        args.json_path = os.path.abspath(args.json_path)
+
+    if args.serve:
+        serve_fake(args.workers[0], args.port)
+        return
+
+    results: List[Dict[str, Any]] = []
+    if args.url:
+        results.append({"workers": None, **asyncio.run(run_load(args.url, args.concurrency, args.duration, args.timeout))})
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            # The workers inherit the dummy keys, the cache paths in workdir and the fake latencies.
+            run_benchmarks.prepare_environment(args, workdir)
+            # One client host sends every request, the per client rate limit of the API would reject most.
+            os.environ["CLIENT_REQUESTS_PER_MINUTE"] = "1000000000"
+            # Offline, the workers must not open connections to the real APIs on startup.
+            os.environ["HTTP_WARM_UP_CONNECTIONS"] = "0"
+            os.environ["LOAD_TEST_LLM_LATENCY"] = args.llm_latency
+            os.environ["LOAD_TEST_SEARCH_LATENCY"] = args.search_latency
+            for workers in args.workers:
+                results.append(load_test_workers(workers, args))
+
+    print_report(args, results)
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump(results, file, indent = 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""
+Offline benchmark of the agent graphs.
+
+Each graph runs with scripted fake chat models and a fake Tavily backend (see fakes.py), so no
+network access or API keys are needed and the numbers only reflect the graph runtime plus the
+configured fake latencies. Reports throughput, p50/p95/p99 end to end latency, time per graph
+node and memory growth over N runs at the requested concurrency levels.
+
+Usage (from the agent_implementations directory):
+    python benchmarks/run_benchmarks.py --graph all --runs 50 --concurrency 1,8
+    python benchmarks/run_benchmarks.py --graph react --mode async --llm-latency lognormal:0.2,0.5
+"""
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from langchain_core.callbacks import BaseCallbackHandler
+import argparse
+import asyncio
+import gc
+import importlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+
+BENCHMARKS_DIR: Path = Path(__file__).resolve().parent
+AGENTS_DIR: Path = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from fakes import LatencyDistribution, ScriptedChatModel, install_fake_search # noqa: E402
+
+
+GRAPH_DIRS: Dict[str, str] = {
+    "chatbot": "chatbot_with_tools_and_memory",
+    "reflexion": "reflexion_agent",
+    "react": "simple_react_agent_langgraph",
+}
+
+# Settings() of every agent requires these, the values are never sent anywhere.
+DUMMY_ENV: Dict[str, str] = {
+    "TAVILY_API_KEY": "benchmark",
+    "GOOGLE_API_KEY": "benchmark",
+    "GROQ_API_KEY": "benchmark",
+    "PINECONE_API_KEY": "benchmark",
+    "WATSONX_APIKEY": "benchmark",
+    "WATSONX_URL": "https://localhost",
+    "WATSONX_PROJECT_ID": "benchmark",
+    "COHERE_API_KEY": "benchmark",
+    "LANGSMITH_API_KEY": "benchmark",
+    "LANGSMITH_ENDPOINT": "https://localhost",
+    "LANGSMITH_PROJECT": "benchmark",
+}
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects the wall time of every graph node run (not of the runnables nested inside nodes)."""
+
+    run_inline: bool = True
+
+    def __init__(self) -> None:
+        self._started: Dict[UUID, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self.timings: Dict[str, List[float]] = {}
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        node: Optional[str] = (metadata or {}).get("langgraph_node")
+        if node and any(tag.startswith("graph:step:") for tag in tags or []):
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                node, start = started
+                self.timings.setdefault(node, []).append(time.perf_counter() - start)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+
+class BenchTarget:
+    """One graph wired with fakes: `invoke(i, config)` and `ainvoke(i, config)` run request number i."""
+
+    def __init__(
+        self,
+        invoke: Callable[[int, Dict[str, Any]], Any],
+        ainvoke: Callable[[int, Dict[str, Any]], Awaitable[Any]]
+    ) -> None:
+        self.invoke = invoke
+        self.ainvoke = ainvoke
+
+
+def import_agent_module(graph: str, module: str) -> Any:
+    """Import a module of an agent directory the way the agent itself runs (flat imports)."""
+    agent_dir: str = str(AGENTS_DIR / GRAPH_DIRS[graph])
+    if agent_dir not in sys.path:
+        sys.path.insert(0, agent_dir)
+    return importlib.import_module(module)
+
+
+def setup_chatbot(llm_latency: LatencyDistribution) -> BenchTarget:
+    from langchain_core.messages import HumanMessage, ToolMessage, AIMessage
+
+    graph_module = import_agent_module("chatbot", "graph")
+
+    def script(messages: List[Any]) -> AIMessage:
+        # First call of a turn asks for two searches and an addition in one message, the call after the
+        # ToolMessages answers. Set PARALLEL_TOOLS=false to compare with the calls run one by one.
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content = f"The answer is {messages[-1].content}.")
+        return AIMessage(
+            content = "",
+            tool_calls = [
+                {"name": "tavily_search", "args": {"query": "what is langgraph"}, "id": f"call_{uuid.uuid4().hex}"},
+                {"name": "tavily_search", "args": {"query": "langgraph use cases"}, "id": f"call_{uuid.uuid4().hex}"},
+                {"name": "addition", "args": {"num_1": 2, "num_2": 3}, "id": f"call_{uuid.uuid4().hex}"}
+            ]
+        )
+
+    # Swap the factories before the first call, the graph and the compactor are built from them.
+    tools_llm = ScriptedChatModel(script = script, latency = llm_latency)
+    summary_llm = ScriptedChatModel(
+        script = lambda messages: AIMessage(content = "Summary of the conversation."),
+        latency = llm_latency
+    )
+    graph_module.get_llm_with_tools = lambda: tools_llm
+    graph_module.get_llm = lambda: summary_llm
+    graph = graph_module.get_graph()
+
+    def payload(i: int) -> Dict[str, Any]:
+        return {"messages": [HumanMessage(content = f"What is {i} plus 3?")]}
+
+    def config(i: int, run_config: Dict[str, Any]) -> Dict[str, Any]:
+        return {**run_config, "configurable": {"thread_id": f"benchmark-{i}"}}
+
+    return BenchTarget(
+        invoke = lambda i, run_config: graph.invoke(payload(i), config(i, run_config)),
+        ainvoke = lambda i, run_config: graph.ainvoke(payload(i), config(i, run_config))
+    )
+
+
+def setup_reflexion(llm_latency: LatencyDistribution) -> BenchTarget:
+    from langchain_core.messages import HumanMessage, AIMessage
+
+    chains_module = import_agent_module("reflexion", "chains")
+    graph_module = import_agent_module("reflexion", "graph")
+
+    def answer(tool_name: str) -> Callable[[List[Any]], AIMessage]:
+        def script(messages: List[Any]) -> AIMessage:
+            args: Dict[str, Any] = {
+                "answer": "A scripted 250 words answer. " * 25,
+                "search_queries": ["langgraph overview", "langgraph use cases", "langgraph vs langchain"],
+                "reflection": {"missing": "Concrete examples.", "superfluous": "Nothing."},
+            }
+            if tool_name == "ReviseAnswer":
+                args["citations"] = ["https://example.com/1", "https://example.com/2"]
+            return AIMessage(
+                content = "",
+                tool_calls = [{"name": tool_name, "args": args, "id": f"call_{uuid.uuid4().hex}"}]
+            )
+        return script
+
+    # Keep the real prompts, swap only the models behind them.
+    responder_chain = chains_module.get_responder_chain().first | ScriptedChatModel(
+        script = answer("AnswerQuestion"), latency = llm_latency
+    )
+    revisor_chain = chains_module.get_revisor_chain().first | ScriptedChatModel(
+        script = answer("ReviseAnswer"), latency = llm_latency
+    )
+    graph_module.get_responder_chain = lambda: responder_chain
+    graph_module.get_revisor_chain = lambda: revisor_chain
+
+    def payload(i: int) -> List[Any]:
+        return [HumanMessage(content = f"Write a LinkedIn post about topic {i}.")]
+
+    return BenchTarget(
+        invoke = lambda i, run_config: graph_module.graph.invoke(payload(i), run_config),
+        ainvoke = lambda i, run_config: graph_module.graph.ainvoke(payload(i), run_config)
+    )
+
+
+def setup_react(llm_latency: LatencyDistribution) -> BenchTarget:
+    from langchain.agents import create_react_agent
+    from langchain_core.messages import AIMessage
+
+    agent_module = import_agent_module("react", "agent")
+    graph_module = import_agent_module("react", "graph")
+    app_module = import_agent_module("react", "app")
+
+    def script(messages: List[Any]) -> AIMessage:
+        # One search, then the final answer.
+        question_and_scratchpad: str = str(messages[-1].content).split("\nQuestion: ")[-1]
+        if "Observation:" in question_and_scratchpad:
+            return AIMessage(content = " I now know the final answer\nFinal Answer: LangGraph builds stateful agents.")
+        return AIMessage(content = " I should search.\nAction: tavily_search\nAction Input: what is langgraph")
+
+    agent = create_react_agent(
+        llm = ScriptedChatModel(script = script, latency = llm_latency),
+        prompt = agent_module.get_react_prompt(),
+        tools = import_agent_module("react", "tools").get_available_tools()
+    )
+    graph_module.get_agent = lambda: agent
+
+    def payload(i: int) -> Dict[str, Any]:
+        return app_module.AgentState(input = f"Why is langgraph useful? ({i})", agent_outcome = None, intermediate_steps = [])
+
+    return BenchTarget(
+        invoke = lambda i, run_config: graph_module.graph.invoke(payload(i), run_config),
+        ainvoke = lambda i, run_config: graph_module.graph.ainvoke(payload(i), run_config)
+    )
+
+
+SETUPS: Dict[str, Callable[[LatencyDistribution], BenchTarget]] = {
+    "chatbot": setup_chatbot,
+    "reflexion": setup_reflexion,
+    "react": setup_react,
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest rank percentile."""
+    if not values:
+        return float("nan")
+    ordered: List[float] = sorted(values)
+    index: int = min(max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+
+def rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_level(target: BenchTarget, runs: int, concurrency: int, mode: str, start: int) -> Dict[str, Any]:
+    timer = NodeTimer()
+    run_config: Dict[str, Any] = {"callbacks": [timer]}
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def record(started: float, error: Optional[BaseException]) -> None:
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if error is not None:
+                errors.append(repr(error))
+
+    def one(i: int) -> None:
+        started: float = time.perf_counter()
+        try:
+            target.invoke(i, run_config)
+            record(started, None)
+        except Exception as e:
+            record(started, e)
+
+    async def aone(i: int, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            started: float = time.perf_counter()
+            try:
+                await target.ainvoke(i, run_config)
+                record(started, None)
+            except Exception as e:
+                record(started, e)
+
+    async def arun_all() -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(aone(i, semaphore) for i in range(start, start + runs)))
+
+    gc.collect()
+    traced_before: int = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    rss_before: float = rss_mb()
+    wall_start: float = time.perf_counter()
+
+    if mode == "async":
+        asyncio.run(arun_all())
+    else:
+        with ThreadPoolExecutor(max_workers = concurrency) as executor:
+            list(executor.map(one, range(start, start + runs)))
+
+    wall: float = time.perf_counter() - wall_start
+    gc.collect()
+
+    result: Dict[str, Any] = {
+        "concurrency": concurrency,
+        "runs": runs,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": wall,
+        "throughput_rps": runs / wall if wall else float("nan"),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "nodes": {
+            node: {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p95": percentile(values, 95),
+            }
+            for node, values in sorted(timer.timings.items())
+        },
+        "max_rss_growth_mb": rss_mb() - rss_before,
+    }
+    if tracemalloc.is_tracing():
+        result["traced_growth_kb_per_run"] = (tracemalloc.get_traced_memory()[0] - traced_before) / 1024 / runs
+    return result
+
+
+def print_report(graph: str, args: argparse.Namespace, results: List[Dict[str, Any]]) -> None:
+    print(f"\n== {graph} ({args.mode}, llm={args.llm_latency}, search={args.search_latency}) ==")
+    print(f"{'conc':>5} {'runs':>5} {'err':>4} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss +MB':>8}")
+    for result in results:
+        print(
+            f"{result['concurrency']:>5} {result['runs']:>5} {result['errors']:>4} {result['throughput_rps']:>8.2f} "
+            f"{result['latency_p50'] * 1000:>9.1f} {result['latency_p95'] * 1000:>9.1f} "
+            f"{result['latency_p99'] * 1000:>9.1f} {result['max_rss_growth_mb']:>8.1f}"
+        )
+        for node, timing in result["nodes"].items():
+            print(f"{'':>5} node {node:<16} n={timing['count']:<6} mean={timing['mean'] * 1000:8.1f} ms  p95={timing['p95'] * 1000:8.1f} ms")
+        if "traced_growth_kb_per_run" in result:
+            print(f"{'':>5} traced memory growth {result['traced_growth_kb_per_run']:.1f} KiB/run")
+        if result["first_error"]:
+            print(f"{'':>5} first error: {result['first_error']}")
+
+
+def benchmark_graph(graph: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    llm_latency = LatencyDistribution(args.llm_latency, seed = args.seed)
+    install_fake_search(LatencyDistribution(args.search_latency, seed = args.seed + 1))
+
+    quiet = io.StringIO()
+    with redirect_stdout(sys.stdout if args.verbose else quiet):
+        target: BenchTarget = SETUPS[graph](llm_latency)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results: List[Dict[str, Any]] = []
+    next_request: int = 0
+    for concurrency in args.concurrency:
+        with redirect_stdout(sys.stdout if args.verbose else quiet):
+            # Warm up imports and lazy clients before measuring.
+            run_level(target, runs = 1, concurrency = 1, mode = args.mode, start = next_request)
+            next_request += 1
+            results.append(run_level(target, args.runs, concurrency, args.mode, start = next_request))
+        next_request += args.runs
+        quiet.seek(0)
+        quiet.truncate()
+
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", choices = [*GRAPH_DIRS, "all"], default = "all")
+    parser.add_argument("--runs", type = int, default = 50, help = "Runs per concurrency level.")
+    parser.add_argument(
+        "--concurrency",
+        type = lambda value: [int(level) for level in value.split(",")],
+        default = [1, 8],
+        help = "Comma separated concurrency levels, eg. 1,8,32."
+    )
+    parser.add_argument("--mode", choices = ["sync", "async"], default = "sync", help = "Threads with invoke, or asyncio with ainvoke.")
+    parser.add_argument("--llm-latency", default = "lognormal:0.05,0.3", help = "Fake LLM latency distribution, see fakes.LatencyDistribution.")
+    parser.add_argument("--search-latency", default = "lognormal:0.03,0.3", help = "Fake Tavily latency distribution.")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--search-cache", action = "store_true", help = "Keep the search result cache on (off by default, every search misses).")
+    parser.add_argument("--trace-memory", action = "store_true", help = "Track allocations with tracemalloc (slower).")
+    parser.add_argument("--json", dest = "json_path", help = "Also write the results as JSON to this path.")
+    parser.add_argument("--verbose", action = "store_true", help = "Show the prints of the agents.")
+    return parser.parse_args(argv)
+
+
+def strip_options(argv: List[str], names: tuple[str, ...]) -> List[str]:
+    """Remove `--name value` and `--name=value` options from argv."""
+    stripped: List[str] = []
+    skip_next: bool = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+        elif arg in names:
+            skip_next = True
+        elif not any(arg.startswith(f"{name}=") for name in names):
+            stripped.append(arg)
+    return stripped
+
+
+def prepare_environment(args: argparse.Namespace, workdir: str) -> None:
+    for name, value in DUMMY_ENV.items():
+        os.environ.setdefault(name, value)
+    # Never trace benchmark runs to LangSmith.
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    # Keep every sqlite file of the agents out of the source tree.
+    os.environ["SEARCH_CACHE_PATH"] = os.path.join(workdir, "search_cache.db")
+    os.environ["LLM_CACHE"] = "false"
+    os.environ["SEMANTIC_CACHE"] = "false"
+    if not args.search_cache:
+        os.environ["SEARCH_CACHE_TTL_SECONDS"] = "0"
+    os.chdir(workdir)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.json_path:
+        # prepare_environment changes into a temporary directory, which is gone when the JSON is written.
+        args.json_path = os.path.abspath(args.json_path)
+
+    if args.graph == "all":
+        # The agents share module names (config, tools, graph), so every graph runs in its own process.
+        child_argv: List[str] = strip_options(list(argv if argv is not None else sys.argv[1:]), ("--graph", "--json"))
+        all_results: Dict[str, Any] = {}
+        for graph in GRAPH_DIRS:
+            with tempfile.TemporaryDirectory() as output_dir:
+                output_path: str = os.path.join(output_dir, "results.json")
+                subprocess.run(
+                    [sys.executable, __file__, *child_argv, "--graph", graph, "--json", output_path],
+                    check = True
+                )
+                with open(output_path) as file:
+                    all_results.update(json.load(file))
+        if args.json_path:
+            with open(args.json_path, "w") as file:
+                json.dump(all_results, file, indent = 2)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_environment(args, workdir)
+        results: List[Dict[str, Any]] = benchmark_graph(args.graph, args)
+
+    print_report(args.graph, args, results)
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump({args.graph: results}, file, indent = 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple, SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+
+
+class SharedExclusiveLock:
+    """Held by many threads at once in shared mode, or by a single one in exclusive mode."""
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._shared: int = 0
+        self._exclusive: bool = False
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            self._exclusive = True
+            self._condition.wait_for(lambda: self._shared == 0)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+class PooledSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver for many concurrent chat threads.
+
+    Differences with the plain SqliteSaver on one shared connection:
+        - A pool of connections in WAL mode, so readers do not wait on the single writer
+          and threads do not queue up behind one process wide lock.
+        - A put stores the checkpoint, records the thread activity and prunes the thread in one
+          transaction, and the async methods run on a worker thread so `graph.ainvoke` does not
+          block the event loop.
+        - A retention policy: only the `keep_last` newest checkpoints of every thread are kept,
+          and threads idle for longer than `max_idle_seconds` are pruned. With the DeltaSerializer,
+          the message blobs no remaining checkpoint refers to are deleted as well, after pruning
+          idle or deleted threads and every `prune_every` puts.
+
+    Lookups by thread_id are served by the (thread_id, checkpoint_ns, checkpoint_id) primary keys.
+    """
+
+    def __init__(
+        self,
+        path: str = "chatbot_memory.db",
+        *,
+        pool_size: int = 4,
+        keep_last: int | None = 20,
+        max_idle_seconds: float | None = None,
+        prune_every: int = 100,
+        acquire_timeout: float = 30.0,
+        serde: SerializerProtocol | None = None
+    ) -> None:
+        self.path = path
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.keep_last = keep_last
+        self.max_idle_seconds = max_idle_seconds
+        self.prune_every = prune_every
+
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._created: int = 0
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()
+        self._puts: int = 0
+        # Checkpoint writes hold it shared, the blob garbage collection exclusively.
+        self._write_lock = SharedExclusiveLock()
+
+        super().__init__(conn = None, serde = serde)
+
+    # SqliteSaver talks to `self.conn`, point it to the connection checked out by the current thread.
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            raise RuntimeError("No pooled connection is checked out by this thread.")
+        return conn
+
+    @conn.setter
+    def conn(self, value: sqlite3.Connection | None) -> None:
+        pass # Connections come from the pool.
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread = False, timeout = 30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return self._connect()
+
+        try:
+            return self._pool.get(timeout = self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No pooled SQLite connection was free within {self.acquire_timeout}s.") from None
+
+    @contextmanager
+    def _checkout(self) -> Iterator[sqlite3.Connection]:
+        previous: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if previous is not None:
+            # The thread already holds a connection (eg. while iterating `list()`), a second checkout
+            # could wait forever on an exhausted pool.
+            yield previous
+            return
+
+        conn: sqlite3.Connection = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._pool.put(conn)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        with self.lock:
+            if self.is_setup:
+                return
+            with self._checkout() as conn:
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS checkpoints (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        checkpoint_id TEXT NOT NULL,
+                        parent_checkpoint_id TEXT,
+                        type TEXT,
+                        checkpoint BLOB,
+                        metadata BLOB,
+                        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                    );
+                    CREATE TABLE IF NOT EXISTS writes (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        checkpoint_id TEXT NOT NULL,
+                        task_id TEXT NOT NULL,
+                        idx INTEGER NOT NULL,
+                        channel TEXT NOT NULL,
+                        type TEXT,
+                        value BLOB,
+                        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                    );
+                    CREATE TABLE IF NOT EXISTS thread_activity (
+                        thread_id TEXT PRIMARY KEY,
+                        updated_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS thread_activity_updated_at ON thread_activity(updated_at);
+                    """
+                )
+                conn.commit()
+            self.is_setup = True
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        self.setup()
+        with self._checkout() as conn:
+            # A transaction opened while the thread is in one joins it, the outermost commits.
+            owner: bool = transaction and not getattr(self._local, "in_transaction", False)
+            if owner:
+                self._local.in_transaction = True
+            cur: sqlite3.Cursor = conn.cursor()
+            try:
+                yield cur
+                if owner:
+                    conn.commit()
+            except Exception:
+                if owner:
+                    conn.rollback()
+                raise
+            finally:
+                cur.close()
+                if owner:
+                    self._local.in_transaction = False
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        # The checkpoint, the thread activity and the pruning are one transaction.
+        with self._write_lock.shared(), self.cursor() as cur:
+            next_config: RunnableConfig = super().put(config, checkpoint, metadata, new_versions)
+
+            thread_id: str = str(next_config["configurable"]["thread_id"])
+            checkpoint_ns: str = next_config["configurable"]["checkpoint_ns"]
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time())
+            )
+            if self.keep_last is not None:
+                self._prune_thread(cur, thread_id, checkpoint_ns)
+
+        self._puts += 1
+        if self._puts % self.prune_every == 0:
+            # Pruning idle threads collects the blobs too, else collect those of the checkpoints
+            # keep_last dropped since the last time.
+            if not self.prune_idle_threads() and self.keep_last is not None:
+                self.collect_garbage()
+
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with self._write_lock.shared():
+            super().put_writes(config, writes, task_id, task_path)
+
+    def _prune_thread(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str) -> None:
+        """Delete every checkpoint (and its writes) older than the `keep_last` newest of the thread."""
+        cur.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return
+        (oldest_kept_id,) = row
+        cur.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, oldest_kept_id)
+        )
+        cur.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, oldest_kept_id)
+        )
+
+    def prune_idle_threads(self, max_idle_seconds: float | None = None) -> int:
+        """Delete every thread without a new checkpoint for `max_idle_seconds`. Returns the number of threads pruned."""
+        max_idle_seconds = max_idle_seconds if max_idle_seconds is not None else self.max_idle_seconds
+        if max_idle_seconds is None:
+            return 0
+
+        with self.cursor() as cur:
+            cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+                (time.time() - max_idle_seconds,)
+            )
+            thread_ids: list[tuple[str]] = cur.fetchall()
+            cur.executemany("DELETE FROM checkpoints WHERE thread_id = ?", thread_ids)
+            cur.executemany("DELETE FROM writes WHERE thread_id = ?", thread_ids)
+            cur.executemany("DELETE FROM thread_activity WHERE thread_id = ?", thread_ids)
+        if thread_ids:
+            self.collect_garbage()
+        return len(thread_ids)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+        self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """
+        Delete the blobs of the DeltaSerializer that no stored checkpoint or write refers to anymore.
+        Returns the number of blobs deleted, always 0 with another serializer.
+        """
+        collect: Callable[[Iterable[tuple[str | None, bytes | None]]], int] | None = getattr(
+            self.serde, "collect_garbage", None
+        )
+        if collect is None:
+            return 0
+
+        # No checkpoint is written meanwhile, one encoded but not yet stored would lose its blobs.
+        with self._write_lock.exclusive(), self.cursor(transaction = False) as cur:
+            def payloads() -> Iterator[tuple[str | None, bytes | None]]:
+                yield from cur.execute("SELECT type, checkpoint FROM checkpoints")
+                yield from cur.execute("SELECT type, value FROM writes")
+
+            return collect(payloads())
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+    # Async methods run the sync ones on a worker thread, the pool makes them safe to run concurrently.
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples: list[CheckpointTuple] = await asyncio.to_thread(
+            lambda: list(self.list(config, filter = filter, before = before, limit = limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
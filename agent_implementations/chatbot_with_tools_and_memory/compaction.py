@@ -0,0 +1,99 @@
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+
+SUMMARY_INSTRUCTION: str = (
+    "You maintain a running summary of a conversation between a human and an AI assistant.\n"
+    "Extend the existing summary with the new messages below. Keep every fact, number, name, "
+    "decision and open question the assistant may need later, drop small talk. "
+    "Answer with the updated summary only."
+)
+
+
+class HistoryCompactor:
+    """
+    Keeps the prompt of the chatbot under a token budget.
+
+    When the history (plus the running summary) grows past `token_budget`, the oldest turns are folded
+    into an LLM generated summary and removed from the state. The most recent turns, at least
+    `keep_recent_tokens` worth of them, are kept verbatim. The history is only cut right before a
+    HumanMessage, so an AIMessage with tool calls always stays together with its ToolMessages.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        token_budget: int = 4000,
+        keep_recent_tokens: int = 1500,
+        token_counter: Callable[[Sequence[BaseMessage]], int] = count_tokens_approximately
+    ) -> None:
+        self.llm = llm
+        self.token_budget = token_budget
+        self.keep_recent_tokens = keep_recent_tokens
+        self.token_counter = token_counter
+
+    def needs_compaction(self, messages: Sequence[BaseMessage], summary: str) -> bool:
+        summary_tokens: int = self.token_counter([SystemMessage(content = summary)]) if summary else 0
+        return self.token_counter(messages) + summary_tokens > self.token_budget
+
+    def split(self, messages: Sequence[BaseMessage]) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        """Split the history in (older, recent) at the last turn boundary that keeps `keep_recent_tokens` in recent."""
+        recent_tokens: int = 0
+        cut: int = len(messages)
+        while cut > 0 and recent_tokens < self.keep_recent_tokens:
+            cut -= 1
+            recent_tokens += self.token_counter([messages[cut]])
+
+        # Move the cut back to the start of that turn.
+        while cut > 0 and not isinstance(messages[cut], HumanMessage):
+            cut -= 1
+
+        return list(messages[:cut]), list(messages[cut:])
+
+    def _summary_prompt(self, summary: str, older: Sequence[BaseMessage]) -> List[BaseMessage]:
+        transcript: List[str] = []
+        for message in older:
+            if isinstance(message, AIMessage) and message.tool_calls:
+                calls: str = ", ".join(f"{call['name']}({call['args']})" for call in message.tool_calls)
+                transcript.append(f"AI called tools: {calls}")
+            elif message.content:
+                transcript.append(f"{message.type}: {message.content}")
+
+        return [
+            SystemMessage(content = SUMMARY_INSTRUCTION),
+            HumanMessage(
+                content = f"Existing summary:\n{summary or 'None'}\n\nNew messages:\n" + "\n".join(transcript)
+            )
+        ]
+
+    def _update(self, older: Sequence[BaseMessage], summary: AIMessage) -> Dict[str, Any]:
+        return {
+            "summary": summary.content,
+            "messages": [RemoveMessage(id = message.id) for message in older]
+        }
+
+    def compact(self, messages: Sequence[BaseMessage], summary: str = "") -> Dict[str, Any]:
+        """Returns the state update that folds the older turns into the summary, or an empty update."""
+        if not self.needs_compaction(messages, summary):
+            return {}
+        older, _ = self.split(messages)
+        if not older:
+            return {}
+        return self._update(older, self.llm.invoke(self._summary_prompt(summary, older)))
+
+    async def acompact(self, messages: Sequence[BaseMessage], summary: str = "") -> Dict[str, Any]:
+        if not self.needs_compaction(messages, summary):
+            return {}
+        older, _ = self.split(messages)
+        if not older:
+            return {}
+        return self._update(older, await self.llm.ainvoke(self._summary_prompt(summary, older)))
+
+
+def with_summary(messages: Sequence[BaseMessage], summary: str) -> List[BaseMessage]:
+    """Prepend the running summary of the compacted turns to the history sent to the LLM."""
+    if not summary:
+        return list(messages)
+    return [SystemMessage(content = f"Summary of the earlier conversation:\n{summary}"), *messages]
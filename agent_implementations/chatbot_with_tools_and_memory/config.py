@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings): 
@@ -11,9 +12,68 @@ class Settings(BaseSettings):
     langsmith_tracing: bool
     langsmith_project: str
 
+    # Search result cache shared by the TavilySearch tool.
+    search_cache_path: str = "search_cache.db"
+    search_cache_ttl_seconds: int = 86400
+    search_cache_max_entries: int = 5000
+    search_cache_memory_entries: int = 256
+
+    # Opt-in semantic cache of final answers.
+    semantic_cache: bool = False
+    semantic_cache_embedder: str = "hashing"
+    semantic_cache_threshold: float = 0.9
+    semantic_cache_ttl_seconds: float = 3600
+    semantic_cache_max_entries: int = 1000
+
+    # Opt-in exact match cache of LLM calls, for dev and CI replays.
+    llm_cache: bool = False
+    llm_cache_path: str = "llm_cache.db"
+    llm_cache_max_entries: int = 10000
+
+    # Chat model providers ("groq", "google") in order of preference. Routing is opt-in: more than one,
+    # eg. LLM_PROVIDERS='["groq", "google"]' with GOOGLE_API_KEY set, puts them behind a RouterChatModel
+    # that sends each call to the fastest healthy one and fails over to the others, see llm_router.py.
+    llm_providers: list[str] = ["groq"]
+    llm_hedging: bool = False
+
+    # Tool calls of one AIMessage run concurrently, each bounded by the timeout, see parallel_tools.py.
+    parallel_tools: bool = True
+    tool_max_concurrency: int = 8
+    tool_timeout_seconds: float = 30.0
+
+    # Message history compaction in front of the chatbot node.
+    history_compaction: bool = True
+    history_token_budget: int = 4000
+    history_keep_recent_tokens: int = 1500
+
+    # Checkpointer, "memory" keeps the history in process, "sqlite" persists it with PooledSqliteSaver.
+    checkpointer: str = "memory"
+    checkpoint_db_path: str = "chatbot_memory.db"
+    checkpoint_pool_size: int = 4
+    checkpoint_keep_last: int = 20
+    checkpoint_max_idle_seconds: float | None = None
+    # "delta" writes each message once instead of the whole history at every step (see serializer.py),
+    # "default" is the serializer of LangGraph. Compression needs the zstandard package.
+    checkpoint_serializer: str = "delta"
+    checkpoint_compression: bool = True
+
+    # Shared keep-alive HTTP connection pool of the Groq and Tavily clients, see transport.py.
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 60.0
+    http_timeout_seconds: float = 60.0
+    http2: bool = True
+
+    # Per node timings, token counts and tool calls, see instrumentation.py.
+    instrumentation: bool = False
+
     class Config:
         env_file = ".env"
         extra = "ignore"
 
-settings = Settings()
-print("API Keys loaded succesfully.")
\ No newline at end of file
+@lru_cache(maxsize = None)
+def get_settings() -> Settings:
+    """Settings are read from the environment and .env on first use, then reused by every caller."""
+    settings: Settings = Settings()
+    print("API Keys loaded succesfully.")
+    return settings
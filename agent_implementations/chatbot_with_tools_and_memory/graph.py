@@ -1,50 +1,139 @@
-from config import settings
-from tools import available_tools
+from config import get_settings
+from tools import get_available_tools, get_tool_registry
 from typing import Dict, TypedDict, List, Annotated
+from functools import lru_cache
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
 from langgraph.graph import StateGraph, END, add_messages
-from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
-from langchain_groq.chat_models import ChatGroq
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.sqlite import SqliteSaver
-import sqlite3
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from compaction import HistoryCompactor, with_summary
+from semantic_cache import SemanticCache, build_embedder
+from llm_cache import SQLiteLRUCache
+from llm_router import RouterChatModel
+from parallel_tools import ParallelToolExecutor
+from instrumentation import instrumented_config
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+# Clients, the compactor, the checkpointer and the graph are built on first use and reused,
+# importing this module does not read the settings or open any connection.
+
+@lru_cache(maxsize = None)
+def get_llm_cache() -> SQLiteLRUCache | None:
+    settings = get_settings()
+    if not settings.llm_cache:
+        return None
+    return SQLiteLRUCache(path = settings.llm_cache_path, max_entries = settings.llm_cache_max_entries)
+
+
+@lru_cache(maxsize = None)
+def get_google_llm() -> BaseChatModel:
+    from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        google_api_key = get_settings().google_api_key,
+        model = "gemini-2.5-flash",
+        max_tokens = 3000,
+        temperature = 0.1,
+        cache = get_llm_cache()
+    )
+
+
+@lru_cache(maxsize = None)
+def get_groq_llm() -> BaseChatModel:
+    from langchain_groq.chat_models import ChatGroq
+    from transport import get_http_pool
+
+    # Keep-alive connections shared with the Tavily client, see transport.py.
+    http_pool = get_http_pool()
+    return ChatGroq(
+        http_client = http_pool.client,
+        http_async_client = http_pool.async_client,
+        groq_api_key = get_settings().groq_api_key,
+        temperature = 0.2,
+        max_retries = 2,
+        max_tokens = 3000,
+        model = "llama-3.1-8b-instant",
+        cache = get_llm_cache()
+    )
+
+
+@lru_cache(maxsize = None)
+def get_llm() -> BaseChatModel:
+    """The chat model of the chatbot, a RouterChatModel over the providers when more than one is configured."""
+    settings = get_settings()
+    builders = {"groq": get_groq_llm, "google": get_google_llm}
+    providers: List[BaseChatModel] = [builders[name]() for name in settings.llm_providers]
+    if len(providers) == 1:
+        return providers[0]
+    return RouterChatModel(providers = providers, names = settings.llm_providers, hedge = settings.llm_hedging)
+
+
+@lru_cache(maxsize = None)
+def get_llm_with_tools() -> Runnable:
+    return get_llm().bind_tools(tools = get_available_tools())
+
+
+# Folds the older turns into a running summary once the history passes the token budget.
+@lru_cache(maxsize = None)
+def get_history_compactor() -> HistoryCompactor:
+    settings = get_settings()
+    return HistoryCompactor(
+        llm = get_llm(),
+        token_budget = settings.history_token_budget,
+        keep_recent_tokens = settings.history_keep_recent_tokens
+    )
+
+
+# Runs the tool calls of one AIMessage concurrently, see ParallelToolExecutor.
+@lru_cache(maxsize = None)
+def get_tool_executor() -> ParallelToolExecutor:
+    settings = get_settings()
+    return ParallelToolExecutor(
+        registry = get_tool_registry(),
+        max_concurrency = settings.tool_max_concurrency if settings.parallel_tools else 1,
+        timeout_seconds = settings.tool_timeout_seconds
+    )
 
 
-google_llm = ChatGoogleGenerativeAI(
-    google_api_key = settings.google_api_key,
-    model = "gemini-2.5-flash",
-    max_tokens = 3000,
-    temperature = 0.1
-)
-
+class ChatBotState(TypedDict):
+    messages: Annotated[List[BaseMessage], add_messages]
+    summary: str # Summary of the turns removed from messages by the compaction node.
 
-groq_llm = ChatGroq(
-    groq_api_key = settings.groq_api_key,
-    temperature = 0.2,
-    max_retries = 2,
-    max_tokens = 3000,
-    model = "llama-3.1-8b-instant"
-)
 
-llm_with_tools = groq_llm.bind_tools(tools = available_tools)
+def compact_node(state: ChatBotState) -> ChatBotState:
+    if not get_settings().history_compaction:
+        return {}
+    return get_history_compactor().compact(state["messages"], state.get("summary", ""))
 
 
-class ChatBotState(TypedDict):
-    messages: Annotated[List[BaseMessage], add_messages]
+async def acompact_node(state: ChatBotState) -> ChatBotState:
+    if not get_settings().history_compaction:
+        return {}
+    return await get_history_compactor().acompact(state["messages"], state.get("summary", ""))
 
 
 def chatbot_node(state: ChatBotState) -> ChatBotState:
     return {
-        "messages": [llm_with_tools.invoke(state["messages"])]
+        "messages": [get_llm_with_tools().invoke(with_summary(state["messages"], state.get("summary", "")))]
     }
 
 
+def tool_node(state: ChatBotState, config: RunnableConfig) -> ChatBotState:
+    return {"messages": get_tool_executor().invoke(state["messages"][-1], config)}
+
+
+async def atool_node(state: ChatBotState, config: RunnableConfig) -> ChatBotState:
+    return {"messages": await get_tool_executor().ainvoke(state["messages"][-1], config)}
+
+
 def tool_call_required(state: ChatBotState) -> ChatBotState:
     """Check if the last message requires tool calls."""
     last_ai_message: AIMessage = state["messages"][-1]
@@ -53,36 +142,119 @@ def tool_call_required(state: ChatBotState) -> ChatBotState:
     return END 
 
 
+COMPACT = "compact"
 CHATBOT = "chatbot"
 TOOL = "tool"
 
 
-# Graph Initialization.
-graph_builder = StateGraph(ChatBotState)
-graph_builder.add_node(CHATBOT, chatbot_node)
-graph_builder.add_node(TOOL, ToolNode(tools = available_tools))
-graph_builder.add_edge(TOOL, CHATBOT)
-graph_builder.add_conditional_edges(
-    CHATBOT,
-    tool_call_required,
-    path_map = {
-        TOOL: TOOL,
-        END: END
-    }
-)
-graph_builder.set_entry_point(CHATBOT)
-# Memory Initalization
-memory = InMemorySaver()
+def get_checkpoint_serializer() -> SerializerProtocol | None:
+    """The DeltaSerializer of the checkpointer, or None for the default serializer of LangGraph."""
+    settings = get_settings()
+    if settings.checkpoint_serializer != "delta":
+        return None
+    from serializer import DeltaSerializer, MemoryBlobStore, SqliteBlobStore
 
-# # If you want true persistence, you can use SqliteSaver instead.
-# conn: sqlite3.Connection = sqlite3.connect("chatbot_memory.db")
-# memory = SqliteSaver(connection = conn) # A sqlite db will be created if it does not exist. and store all the checkpoints there.
+    # Each message is written once, in a blob store next to the checkpoints, see serializer.py.
+    store = SqliteBlobStore(settings.checkpoint_db_path) if settings.checkpointer == "sqlite" else MemoryBlobStore()
+    return DeltaSerializer(store, compress = settings.checkpoint_compression)
 
 
-# Final Graph.
-graph = graph_builder.compile(checkpointer = memory)
+@lru_cache(maxsize = None)
+def get_checkpointer() -> BaseCheckpointSaver:
+    settings = get_settings()
+    if settings.checkpointer == "sqlite":
+        from checkpointer import PooledSqliteSaver
+
+        # True persistence, a pool of WAL connections with a retention policy, see PooledSqliteSaver.
+        return PooledSqliteSaver(
+            path = settings.checkpoint_db_path,
+            pool_size = settings.checkpoint_pool_size,
+            keep_last = settings.checkpoint_keep_last,
+            max_idle_seconds = settings.checkpoint_max_idle_seconds,
+            serde = get_checkpoint_serializer()
+        )
+    return InMemorySaver(serde = get_checkpoint_serializer())
+
+
+@lru_cache(maxsize = None)
+def get_graph() -> CompiledStateGraph:
+    # Graph Initialization.
+    graph_builder = StateGraph(ChatBotState)
+    graph_builder.add_node(COMPACT, RunnableLambda(compact_node, afunc = acompact_node, name = COMPACT))
+    graph_builder.add_node(CHATBOT, chatbot_node)
+    graph_builder.add_node(TOOL, RunnableLambda(tool_node, afunc = atool_node, name = TOOL))
+    graph_builder.add_edge(COMPACT, CHATBOT)
+    graph_builder.add_edge(TOOL, COMPACT)
+    graph_builder.add_conditional_edges(
+        CHATBOT,
+        tool_call_required,
+        path_map = {
+            TOOL: TOOL,
+            END: END
+        }
+    )
+    graph_builder.set_entry_point(COMPACT)
+
+    # Final Graph.
+    return graph_builder.compile(checkpointer = get_checkpointer())
+
+# display(Image(get_graph().get_graph().draw_mermaid_png()))
+
+
+@lru_cache(maxsize = None)
+def get_semantic_cache() -> SemanticCache:
+    settings = get_settings()
+    return SemanticCache(
+        embedder = build_embedder(settings.semantic_cache_embedder, settings.google_api_key),
+        threshold = settings.semantic_cache_threshold,
+        ttl_seconds = settings.semantic_cache_ttl_seconds,
+        max_entries = settings.semantic_cache_max_entries
+    )
+
+
+def answer(human_input: str, config: Dict) -> AIMessage:
+    """
+    Answer one human turn of a thread. With the semantic cache enabled, a paraphrase of an earlier
+    question is answered from the cache and the turn is still recorded in the thread's memory.
+    The cache is shared by all threads, so it only serves and stores the first turn of a thread:
+    later turns may depend on the thread's history ("what's my name?").
+    """
+    settings = get_settings()
+    graph: CompiledStateGraph = get_graph()
+    use_cache: bool = settings.semantic_cache and not graph.get_state(config).values.get("messages")
+
+    if use_cache and (cached := get_semantic_cache().lookup(human_input)) is not None:
+        cached_message: AIMessage = AIMessage(content = cached)
+        graph.update_state(
+            config,
+            {"messages": [HumanMessage(content = human_input), cached_message]},
+            as_node = CHATBOT
+        )
+        return cached_message
+
+    response: ChatBotState = graph.invoke(
+        ChatBotState(
+            messages = [
+                HumanMessage(content = human_input)
+            ]
+        ),
+        config = config
+    )
+    last_ai_message: AIMessage = response["messages"][-1]
+
+    if use_cache:
+        # The tools called during this turn, ie. after the last HumanMessage.
+        turn_start: int = max(
+            index for index, message in enumerate(response["messages"]) if isinstance(message, HumanMessage)
+        )
+        tools_used: List[str] = [
+            tool_call["name"]
+            for message in response["messages"][turn_start:] if isinstance(message, AIMessage)
+            for tool_call in message.tool_calls
+        ]
+        get_semantic_cache().store(human_input, last_ai_message.content, tools_used)
 
-# display(Image(graph.get_graph().draw_mermaid_png()))
+    return last_ai_message
 
 
 
@@ -99,16 +271,12 @@ if __name__ == "__main__":
         if human_input in ["exit", "end"]:
             break
 
-        response: ChatBotState = graph.invoke(
-            ChatBotState(
-                messages = [
-                    HumanMessage(content = human_input)
-                ]
-            ),
-            config = config 
-        )
+        turn_config, run_metrics = instrumented_config(config, "chatbot", get_settings().instrumentation)
+        ai_message: AIMessage = answer(human_input, turn_config)
 
-        print(f"AI: {response["messages"][-1].content}", end = "\n\n")
+        print(f"AI: {ai_message.content}", end = "\n\n")
+        if run_metrics:
+            print(run_metrics.summary(), end = "\n\n")
 
 
 
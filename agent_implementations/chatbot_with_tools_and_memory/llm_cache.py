@@ -0,0 +1,114 @@
+from typing import Any, Optional
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteLRUCache(BaseCache):
+    """
+    Deterministic LLM call cache backed by SQLite, with least recently used eviction.
+
+    LangChain calls the cache with the serialized messages as `prompt` and a `llm_string` that
+    holds the model name, temperature and every bound kwarg, including the tool schemas and
+    tool_choice passed by `bind_tools`. The cache key is the hash of both, so the same messages sent
+    to the same model with the same tools (eg. AnswerQuestion, ReviseAnswer, the arithmetic tools)
+    are served from disk instead of calling the provider again.
+
+    Attach it to a chat model with `cache = SQLiteLRUCache(...)`, it works for invoke and ainvoke.
+    Processes pointing to the same path share the cache.
+    """
+
+    def __init__(self, path: str = "llm_cache.db", max_entries: int = 10000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection inherited through fork is never reused, each worker process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread = False, timeout = 30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key: str = self._key(prompt, llm_string)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value: str = dumps(list(return_val))
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, accessed_at) VALUES (?, ?, ?)",
+                (self._key(prompt, llm_string), value, time.time())
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return await asyncio.to_thread(self.lookup, prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.clear, **kwargs)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,327 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from langchain_core.callbacks import (
+    AsyncCallbackManager, AsyncCallbackManagerForLLMRun, CallbackManager, CallbackManagerForLLMRun
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import ConfigDict, Field
+import asyncio
+import contextvars
+import threading
+import time
+
+
+class ProviderHealth:
+    """Moving latency and error profile of one provider."""
+
+    def __init__(self, name: str, alpha: float = 0.2, window: int = 100) -> None:
+        self.name = name
+        self.alpha = alpha
+        self.latency_ewma: float | None = None
+        self.error_rate: float = 0.0 # EWMA of failures, 0 to 1.
+        self.latencies: deque[float] = deque(maxlen = window)
+        self.measured_at: float | None = None # Last time a call measured or probed it, time.monotonic().
+        self.consecutive_failures: int = 0
+        self.open_until: float = 0.0
+
+        self.calls: int = 0
+        self.failures: int = 0
+        self.hedges: int = 0
+        self.hedges_won: int = 0
+
+    def observe_latency(self, seconds: float) -> None:
+        self.measured_at = time.monotonic()
+        self.latencies.append(seconds)
+        self.latency_ewma = seconds if self.latency_ewma is None else self.alpha * seconds + (1 - self.alpha) * self.latency_ewma
+
+    def record_success(self, seconds: float) -> None:
+        self.calls += 1
+        self.consecutive_failures = 0
+        self.error_rate *= 1 - self.alpha
+        self.observe_latency(seconds)
+
+    def record_failure(self, failure_threshold: int, cooldown_seconds: float) -> None:
+        self.calls += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        if self.consecutive_failures >= failure_threshold:
+            # Take the provider out of rotation for a while, it is retried once the cooldown ends.
+            self.open_until = time.monotonic() + cooldown_seconds
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def p95(self, min_samples: int) -> float | None:
+        if len(self.latencies) < min_samples:
+            return None
+        ordered: List[float] = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 3),
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "p95": self.p95(1),
+            "healthy": self.healthy,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+        }
+
+
+class RouterHealth:
+    """Health of every provider of a router, shared by the router and its `bind_tools` copies."""
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.providers: Dict[str, ProviderHealth] = {}
+
+    def get(self, name: str) -> ProviderHealth:
+        with self.lock:
+            return self.providers.setdefault(name, ProviderHealth(name))
+
+
+def _child_callbacks(run_manager: Any, manager_class: type, hedged: bool) -> Any:
+    """Callbacks of a provider call, nested under the router run (LLM run managers have no get_child)."""
+    if run_manager is None:
+        return None
+    manager = manager_class(handlers = [], parent_run_id = run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    if hedged:
+        manager.add_tags(["hedge"], inherit = False)
+    return manager
+
+
+def provider_name(model: Any) -> str:
+    bound: Any = getattr(model, "bound", model) # Unwrap the RunnableBinding made by bind_tools.
+    return str(getattr(bound, "model_name", None) or getattr(bound, "model", None) or type(bound).__name__)
+
+
+class RouterChatModel(BaseChatModel):
+    """
+    Chat model that routes each call to the fastest healthy provider of `providers`.
+
+    Every provider keeps a moving average of its latency and error rate. Providers are tried
+    fastest first. A provider that has not been measured yet, or not for `probe_interval_seconds`,
+    gets the next call first, so a slower provider is still called now and then and a slow cold
+    start does not freeze its average. A failed call falls over to the next provider, and after `failure_threshold` consecutive
+    failures a provider sits out `cooldown_seconds`. With `hedge` on, a call still running after
+    the p95 latency of its provider is sent to the next provider as well, and the first answer wins.
+
+    `bind_tools` binds the tools to every provider and returns a router sharing the same health,
+    so the router drops into `llm.bind_tools(...)` call sites unchanged.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed = True)
+
+    providers: List[Runnable]
+    names: List[str] = Field(default_factory = list)
+    hedge: bool = False
+    hedge_min_samples: int = 20
+    failure_threshold: int = 3
+    cooldown_seconds: float = 30.0
+    probe_interval_seconds: float = 60.0
+    health: RouterHealth = Field(default_factory = RouterHealth, exclude = True)
+
+    def model_post_init(self, __context: Any) -> None:
+        if not self.names:
+            self.names = [provider_name(provider) for provider in self.providers]
+
+    @property
+    def _llm_type(self) -> str:
+        return "router"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"providers": self.names, "hedge": self.hedge}
+
+    def _get_ls_params(self, stop: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        params: Dict[str, Any] = dict(super()._get_ls_params(stop = stop, **kwargs))
+        # The provider calls are traced as child runs, tracing and metrics count them, not the router run.
+        params["ls_provider"] = "router"
+        params["ls_model_name"] = "+".join(self.names)
+        return params
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "RouterChatModel":
+        return self.model_copy(update = {"providers": [provider.bind_tools(tools, **kwargs) for provider in self.providers]})
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.health.get(name).stats for name in self.names}
+
+    def _order(self) -> List[int]:
+        """Provider indexes: the provider to probe if any, then healthy before cooling down, then fastest first."""
+        now: float = time.monotonic()
+        with self.health.lock:
+            healths: List[ProviderHealth] = [self.health.get(name) for name in self.names]
+            probe: int | None = next(
+                (
+                    index for index, health in enumerate(healths)
+                    if health.healthy and (health.measured_at is None or now - health.measured_at >= self.probe_interval_seconds)
+                ),
+                None
+            )
+            if probe is not None:
+                # Only this call probes it, the concurrent ones keep the measured order.
+                healths[probe].measured_at = now
+
+        def key(index: int) -> Tuple[bool, bool, float, int]:
+            health: ProviderHealth = healths[index]
+            latency: float = health.latency_ewma if health.latency_ewma is not None else float("inf")
+            return (index != probe, not health.healthy, latency, index)
+        return sorted(range(len(self.providers)), key = key)
+
+    def _hedge_delay(self, order: List[int]) -> float | None:
+        if not self.hedge or len(order) < 2:
+            return None
+        return self.health.get(self.names[order[0]]).p95(self.hedge_min_samples)
+
+    def _result(self, index: int, message: AIMessage) -> ChatResult:
+        message.response_metadata["router_provider"] = self.names[index]
+        return ChatResult(generations = [ChatGeneration(message = message)], llm_output = {"provider": self.names[index]})
+
+    def _call(
+        self,
+        index: int,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[CallbackManagerForLLMRun],
+        hedged: bool = False,
+        **kwargs: Any
+    ) -> ChatResult:
+        health: ProviderHealth = self.health.get(self.names[index])
+        callbacks: Any = _child_callbacks(run_manager, CallbackManager, hedged)
+        started_at: float = time.perf_counter()
+        try:
+            message: AIMessage = self.providers[index].invoke(messages, config = {"callbacks": callbacks}, stop = stop, **kwargs)
+        except Exception:
+            with self.health.lock:
+                health.record_failure(self.failure_threshold, self.cooldown_seconds)
+            raise
+        with self.health.lock:
+            health.record_success(time.perf_counter() - started_at)
+            health.hedges_won += int(hedged)
+        return self._result(index, message)
+
+    async def _acall(
+        self,
+        index: int,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[AsyncCallbackManagerForLLMRun],
+        hedged: bool = False,
+        **kwargs: Any
+    ) -> ChatResult:
+        health: ProviderHealth = self.health.get(self.names[index])
+        callbacks: Any = _child_callbacks(run_manager, AsyncCallbackManager, hedged)
+        started_at: float = time.perf_counter()
+        try:
+            message: AIMessage = await self.providers[index].ainvoke(messages, config = {"callbacks": callbacks}, stop = stop, **kwargs)
+        except asyncio.CancelledError:
+            # Lost a hedge race, the elapsed time is still a lower bound of its latency.
+            with self.health.lock:
+                health.observe_latency(time.perf_counter() - started_at)
+            raise
+        except Exception:
+            with self.health.lock:
+                health.record_failure(self.failure_threshold, self.cooldown_seconds)
+            raise
+        with self.health.lock:
+            health.record_success(time.perf_counter() - started_at)
+            health.hedges_won += int(hedged)
+        return self._result(index, message)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        order: List[int] = self._order()
+        last_error: Exception | None = None
+        tried: int = 0
+
+        if (delay := self._hedge_delay(order)) is not None:
+            tried = 2
+            executor = ThreadPoolExecutor(max_workers = 2)
+            try:
+                # Copy the context so the provider runs keep the parent run of the callbacks.
+                primary: Future = executor.submit(
+                    contextvars.copy_context().run, self._call, order[0], messages, stop, run_manager, **kwargs
+                )
+                done, pending = wait([primary], timeout = delay)
+                if not done:
+                    with self.health.lock:
+                        self.health.get(self.names[order[1]]).hedges += 1
+                    pending.add(executor.submit(
+                        contextvars.copy_context().run, self._call, order[1], messages, stop, run_manager, True, **kwargs
+                    ))
+                else:
+                    tried = 1
+                while done or pending:
+                    for future in done:
+                        try:
+                            return future.result()
+                        except Exception as e:
+                            last_error = e
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED) if pending else (set(), set())
+            finally:
+                # The losing request finishes in the background and still updates the latency profile.
+                executor.shutdown(wait = False)
+
+        for index in order[tried:]:
+            try:
+                return self._call(index, messages, stop, run_manager, **kwargs)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        order: List[int] = self._order()
+        last_error: Exception | None = None
+        tried: int = 0
+
+        if (delay := self._hedge_delay(order)) is not None:
+            tried = 1
+            tasks: set[asyncio.Task] = {asyncio.create_task(self._acall(order[0], messages, stop, run_manager, **kwargs))}
+            done, pending = await asyncio.wait(tasks, timeout = delay)
+            if not done:
+                tried = 2
+                with self.health.lock:
+                    self.health.get(self.names[order[1]]).hedges += 1
+                pending.add(asyncio.create_task(self._acall(order[1], messages, stop, run_manager, True, **kwargs)))
+            try:
+                while done or pending:
+                    for task in done:
+                        try:
+                            return task.result()
+                        except Exception as e:
+                            last_error = e
+                    done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED) if pending else (set(), set())
+            finally:
+                for task in pending:
+                    task.cancel()
+
+        for index in order[tried:]:
+            try:
+                return await self._acall(index, messages, stop, run_manager, **kwargs)
+            except Exception as e:
+                last_error = e
+        raise last_error
@@ -0,0 +1,116 @@
+from typing import Any, Dict, List
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from tool_registry import RegisteredTool, ToolRegistry
+import asyncio
+import contextvars
+import time
+
+
+# Same wording as the error messages of langgraph's ToolNode, the model is prompted the same way to recover.
+TOOL_CALL_ERROR_TEMPLATE: str = "Error: {error}\n Please fix your mistakes."
+
+
+class ParallelToolExecutor:
+    """
+    Runs every tool call of an AIMessage concurrently and returns one ToolMessage per call,
+    in the order of the calls, whatever order they finish in.
+
+    `invoke` runs the calls on a thread pool bounded by `max_concurrency`. The timeout of a call
+    starts when a worker picks it up, a call running past it is answered with an error and left
+    to finish in the background, since a thread cannot be interrupted.
+    `ainvoke` runs the calls as tasks bounded by a semaphore, a call running past the timeout is
+    cancelled. Tools without a coroutine run on the default executor through `BaseTool.ainvoke`.
+
+    Like ToolNode, a failing tool call becomes an error ToolMessage instead of failing the turn.
+    """
+
+    def __init__(self, registry: ToolRegistry, max_concurrency: int = 8, timeout_seconds: float = 30.0) -> None:
+        self.registry = registry
+        self.max_concurrency = max(max_concurrency, 1)
+        self.timeout_seconds = timeout_seconds
+
+    def _error_message(self, tool_call: Dict[str, Any], error: str) -> ToolMessage:
+        return ToolMessage(
+            content = TOOL_CALL_ERROR_TEMPLATE.format(error = error),
+            name = tool_call["name"],
+            tool_call_id = tool_call["id"],
+            status = "error"
+        )
+
+    def _prepare(self, tool_call: Dict[str, Any]) -> tuple[RegisteredTool, Dict[str, Any]]:
+        registered_tool: RegisteredTool | None = self.registry.get(tool_call["name"])
+        if registered_tool is None:
+            raise KeyError(f"{tool_call['name']} is not a valid tool, try one of {list(self.registry.tools_by_name)}.")
+        # Passing the whole tool call makes the tool answer with a ToolMessage carrying the call id.
+        return registered_tool, {**tool_call, "args": registered_tool.parse(tool_call["args"]), "type": "tool_call"}
+
+    def run_tool(self, tool_call: Dict[str, Any], config: RunnableConfig | None = None) -> ToolMessage:
+        try:
+            registered_tool, call = self._prepare(tool_call)
+            return registered_tool.tool.invoke(call, config)
+        except Exception as e:
+            return self._error_message(tool_call, repr(e))
+
+    async def arun_tool(self, tool_call: Dict[str, Any], config: RunnableConfig | None = None) -> ToolMessage:
+        try:
+            registered_tool, call = self._prepare(tool_call)
+            return await registered_tool.tool.ainvoke(call, config)
+        except Exception as e:
+            return self._error_message(tool_call, repr(e))
+
+    def invoke(self, message: AIMessage, config: RunnableConfig | None = None) -> List[ToolMessage]:
+        tool_calls: List[Dict[str, Any]] = message.tool_calls
+        started_at: Dict[int, float] = {}
+        results: Dict[int, ToolMessage] = {}
+
+        def run(index: int) -> ToolMessage:
+            started_at[index] = time.monotonic()
+            return self.run_tool(tool_calls[index], config)
+
+        executor = ThreadPoolExecutor(max_workers = min(self.max_concurrency, len(tool_calls)) or 1)
+        # Each call runs in a copy of the caller's context, so the run's callbacks see the tool runs.
+        futures: Dict[Future, int] = {
+            executor.submit(contextvars.copy_context().run, run, index): index for index in range(len(tool_calls))
+        }
+        pending: set[Future] = set(futures)
+
+        try:
+            while pending:
+                now: float = time.monotonic()
+                deadlines: List[float] = [
+                    started_at[futures[future]] + self.timeout_seconds for future in pending if futures[future] in started_at
+                ]
+                wait_for: float = max(min(deadlines) - now, 0) if deadlines else self.timeout_seconds
+                done, pending = wait(pending, timeout = wait_for, return_when = FIRST_COMPLETED)
+
+                for future in done:
+                    results[futures[future]] = future.result()
+
+                # Give up on calls that have been running longer than the timeout.
+                now = time.monotonic()
+                for future in list(pending):
+                    index: int = futures[future]
+                    if index in started_at and now - started_at[index] >= self.timeout_seconds:
+                        pending.discard(future)
+                        results[index] = self._error_message(
+                            tool_calls[index], f"Tool call timed out after {self.timeout_seconds} seconds."
+                        )
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+
+        return [results[index] for index in range(len(tool_calls))]
+
+    async def ainvoke(self, message: AIMessage, config: RunnableConfig | None = None) -> List[ToolMessage]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(tool_call: Dict[str, Any]) -> ToolMessage:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self.arun_tool(tool_call, config), timeout = self.timeout_seconds)
+                except asyncio.TimeoutError:
+                    return self._error_message(tool_call, f"Tool call timed out after {self.timeout_seconds} seconds.")
+
+        # gather keeps the order of the calls, and cancels the pending calls if the turn is cancelled.
+        return list(await asyncio.gather(*(run(tool_call) for tool_call in message.tool_calls)))
@@ -0,0 +1,231 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_tavily import TavilySearch
+from pydantic import Field
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so near-identical strings share one cache entry.
+    eg. "  'LangGraph   Case Studies?' " and "langgraph case studies" give the same key.
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.strip("\"'`").strip(" ?!.,;:")
+
+
+class SearchCache:
+    """
+    Two level cache for search results: an in-memory LRU in front of a SQLite store.
+
+    Entries expire after `ttl_seconds`. The SQLite store keeps at most `max_entries` rows and
+    evicts the least recently used ones, the in-memory LRU keeps at most `memory_entries`.
+    The SQLite file can be shared by every agent (and every process) by pointing them to the same path.
+    """
+
+    def __init__(
+        self,
+        path: str = "search_cache.db",
+        ttl_seconds: int = 86400,
+        max_entries: int = 5000,
+        memory_entries: int = 256
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so importing a module that builds a cache does not touch the disk.
+        # A connection inherited through fork is never reused, each worker process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread = False, timeout = 30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed_at ON search_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def make_key(query: str, params: Dict[str, Any]) -> str:
+        payload: str = json.dumps(
+            {"query": normalize_query(query), "params": params},
+            sort_keys = True,
+            default = str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now: float = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value_json, created_at = row
+            if now - created_at >= self.ttl_seconds:
+                conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                conn.commit()
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            value = json.loads(value_json)
+            self._remember(key, created_at, value)
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now: float = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, default = str), now, now)
+            )
+            # Size based eviction, drop expired rows first and then the least recently used ones.
+            conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            (count,) = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+            if count > self.max_entries:
+                cursor = conn.execute(
+                    "DELETE FROM search_cache WHERE key IN "
+                    "(SELECT key FROM search_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                self.evictions += cursor.rowcount
+            conn.commit()
+            self._remember(key, now, value)
+
+    def _remember(self, key: str, created_at: float, value: Dict[str, Any]) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last = False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            conn.execute("DELETE FROM search_cache")
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of this process."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CachedTavilySearch(TavilySearch):
+    """
+    Drop-in replacement for TavilySearch that serves repeated queries from a SearchCache.
+    Error responses and empty results are never cached.
+    """
+
+    cache: SearchCache = Field(default_factory = SearchCache, exclude = True)
+
+    def _cache_key(self, query: str, kwargs: Dict[str, Any]) -> str:
+        params: Dict[str, Any] = {
+            "max_results": self.max_results,
+            "topic": self.topic,
+            "search_depth": self.search_depth,
+            "include_domains": self.include_domains,
+            "exclude_domains": self.exclude_domains,
+            "time_range": self.time_range,
+            **{name: value for name, value in kwargs.items() if value is not None},
+        }
+        return self.cache.make_key(query, params)
+
+    @staticmethod
+    def _cacheable(result: Any) -> bool:
+        return isinstance(result, dict) and "error" not in result and bool(result.get("results"))
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        key: str = self._cache_key(query, kwargs)
+        cached: Optional[Dict[str, Any]] = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        result: Dict[str, Any] = super()._run(query = query, run_manager = run_manager, **kwargs)
+        if self._cacheable(result):
+            self.cache.set(key, result)
+        return result
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        key: str = self._cache_key(query, kwargs)
+        # The cache takes a lock and reads SQLite, off the event loop.
+        cached: Optional[Dict[str, Any]] = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+
+        result: Dict[str, Any] = await super()._arun(query = query, run_manager = run_manager, **kwargs)
+        if self._cacheable(result):
+            await asyncio.to_thread(self.cache.set, key, result)
+        return result
@@ -0,0 +1,164 @@
+from typing import Any, Iterable, List, Optional
+from langchain_core.embeddings import Embeddings
+import hashlib
+import numpy as np
+import re
+import threading
+import time
+
+
+class HashingEmbedder(Embeddings):
+    """
+    Local embedder with no model download: hashes word unigrams, word bigrams and character
+    trigrams into a fixed size vector. Good enough to match paraphrases that share most of their
+    words, eg. "What is LangGraph?" and "what's langgraph". Swap in any LangChain `Embeddings`
+    (eg. GoogleGenerativeAIEmbeddings) for real semantic matching.
+    """
+
+    def __init__(self, dimensions: int = 1024) -> None:
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[str]:
+        words: List[str] = re.findall(r"\w+", text.casefold())
+        features: List[str] = list(words)
+        features += [f"{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded: str = f"#{word}#"
+            features += [padded[i: i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype = np.float32)
+        for feature in self._features(text):
+            digest: bytes = hashlib.blake2b(feature.encode(), digest_size = 8).digest()
+            index: int = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign: float = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class SemanticCache:
+    """
+    Final answer cache keyed on the meaning of the question.
+
+    Questions are embedded and kept in a NumPy matrix of unit vectors, a lookup is one matrix-vector
+    product (cosine similarity) and returns the cached answer of the nearest question when its
+    similarity is at least `threshold`. Entries expire after `ttl_seconds`, and the least recently
+    used entry is evicted past `max_entries`. Answers produced with a tool from `bypass_tools`
+    (eg. date_time) are time sensitive and never stored. A hit also needs the same numbers in both
+    questions, "what is 2 plus 98" must never be answered with the result of "what is 3 plus 98".
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embeddings] = None,
+        threshold: float = 0.9,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+        bypass_tools: Iterable[str] = ("date_time",)
+    ) -> None:
+        self.embedder: Embeddings = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass_tools: set[str] = set(bypass_tools)
+
+        self._vectors: np.ndarray | None = None
+        self._questions: List[str] = []
+        self._numbers: List[List[str]] = []
+        self._answers: List[Any] = []
+        self._created_at: List[float] = []
+        self._used_at: List[float] = []
+        self._lock = threading.Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def _numbers_in(question: str) -> List[str]:
+        return re.findall(r"\d+(?:\.\d+)?", question)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype = np.float32)
+        norm: float = float(np.linalg.norm(array))
+        return array / norm if norm else array
+
+    def _drop(self, index: int) -> None:
+        self._vectors = np.delete(self._vectors, index, axis = 0)
+        for values in (self._questions, self._numbers, self._answers, self._created_at, self._used_at):
+            del values[index]
+
+    def _lookup(self, question: str, vector: np.ndarray) -> Optional[Any]:
+        now: float = time.time()
+        with self._lock:
+            # Expire old entries before searching.
+            for index in reversed(range(len(self._created_at))):
+                if now - self._created_at[index] >= self.ttl_seconds:
+                    self._drop(index)
+
+            if not self._questions:
+                self.misses += 1
+                return None
+
+            similarities: np.ndarray = self._vectors @ vector
+            best: int = int(np.argmax(similarities))
+            if similarities[best] < self.threshold or self._numbers[best] != self._numbers_in(question):
+                self.misses += 1
+                return None
+
+            self._used_at[best] = now
+            self.hits += 1
+            return self._answers[best]
+
+    def _store(self, question: str, vector: np.ndarray, answer: Any) -> None:
+        now: float = time.time()
+        with self._lock:
+            if self._questions and len(self._questions) >= self.max_entries:
+                self._drop(int(np.argmin(self._used_at)))
+
+            row: np.ndarray = vector.reshape(1, -1)
+            self._vectors = row if self._vectors is None or not self._questions else np.vstack([self._vectors, row])
+            self._questions.append(question)
+            self._numbers.append(self._numbers_in(question))
+            self._answers.append(answer)
+            self._created_at.append(now)
+            self._used_at.append(now)
+
+    def _cacheable(self, tools_used: Iterable[str]) -> bool:
+        return not self.bypass_tools.intersection(tools_used)
+
+    def lookup(self, question: str) -> Optional[Any]:
+        return self._lookup(question, self._normalize(self.embedder.embed_query(question)))
+
+    async def alookup(self, question: str) -> Optional[Any]:
+        return self._lookup(question, self._normalize(await self.embedder.aembed_query(question)))
+
+    def store(self, question: str, answer: Any, tools_used: Iterable[str] = ()) -> None:
+        if self._cacheable(tools_used):
+            self._store(question, self._normalize(self.embedder.embed_query(question)), answer)
+
+    async def astore(self, question: str, answer: Any, tools_used: Iterable[str] = ()) -> None:
+        tools_used = list(tools_used)
+        if self._cacheable(tools_used):
+            self._store(question, self._normalize(await self.embedder.aembed_query(question)), answer)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._questions, self._numbers, self._answers, self._created_at, self._used_at = [], [], [], [], []
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._questions)}
+
+
+def build_embedder(name: str, google_api_key: str | None = None) -> Embeddings:
+    """Embedder selected by the `semantic_cache_embedder` setting, "hashing" (local) or "google"."""
+    if name == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(model = "models/text-embedding-004", google_api_key = google_api_key)
+    return HashingEmbedder()
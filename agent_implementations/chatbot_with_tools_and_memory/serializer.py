@@ -0,0 +1,359 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+import hashlib
+import importlib.util
+import ormsgpack
+import os
+import sqlite3
+import threading
+
+
+# Key of the dict standing for a message list in an encoded checkpoint.
+MESSAGES_REF: str = "__delta_messages__"
+TYPE_PREFIX: str = "delta+"
+# First byte of every encoded blob and checkpoint.
+RAW: bytes = b"\x00"
+ZSTD: bytes = b"\x01"
+
+ZSTD_AVAILABLE: bool = importlib.util.find_spec("zstandard") is not None
+
+
+def _compress(data: bytes) -> bytes:
+    import zstandard
+
+    return zstandard.compress(data, 3)
+
+
+def _decompress(data: bytes) -> bytes:
+    if not ZSTD_AVAILABLE:
+        raise RuntimeError("This checkpoint is zstd compressed, install the zstandard package to read it.")
+    import zstandard
+
+    return zstandard.decompress(data)
+
+
+def _key(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size = 16).digest()
+
+
+class MemoryBlobStore:
+    """Blobs by key in a dict, for the InMemorySaver."""
+
+    def __init__(self) -> None:
+        self._blobs: Dict[bytes, bytes] = {}
+        self.bytes_written: int = 0
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+        return {key: self._blobs[key] for key in keys if key in self._blobs}
+
+    def put_many(self, blobs: Dict[bytes, bytes]) -> None:
+        for key, blob in blobs.items():
+            if key not in self._blobs:
+                self._blobs[key] = blob
+                self.bytes_written += len(blob)
+
+    def keys(self) -> List[bytes]:
+        return list(self._blobs)
+
+    def delete_many(self, keys: Iterable[bytes]) -> None:
+        for key in keys:
+            self._blobs.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBlobStore:
+    """
+    Blobs by key in a SQLite table, it can live in the checkpoint database. Blobs are immutable,
+    a key is the hash of the content, so writing one again is a no-op and every process can share the file.
+    """
+
+    def __init__(self, path: str = "chatbot_memory.db") -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self.bytes_written: int = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, and never reused across a fork.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread = False, timeout = 30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS checkpoint_blobs (key BLOB PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+        keys = list(keys)
+        blobs: Dict[bytes, bytes] = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), 500): # Stay under the SQLite variable limit.
+                batch: List[bytes] = keys[start:start + 500]
+                blobs.update(conn.execute(
+                    f"SELECT key, value FROM checkpoint_blobs WHERE key IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall())
+        return blobs
+
+    def put_many(self, blobs: Dict[bytes, bytes]) -> None:
+        if not blobs:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR IGNORE INTO checkpoint_blobs (key, value) VALUES (?, ?)", blobs.items())
+            conn.commit()
+            self.bytes_written += sum(len(blob) for blob in blobs.values())
+
+    def keys(self) -> List[bytes]:
+        with self._lock:
+            return [key for (key,) in self._connection().execute("SELECT key FROM checkpoint_blobs")]
+
+    def delete_many(self, keys: Iterable[bytes]) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("DELETE FROM checkpoint_blobs WHERE key = ?", ((key,) for key in keys))
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class DeltaSerializer(SerializerProtocol):
+    """
+    Checkpoint serializer that writes every message once.
+
+    With `add_messages` each checkpoint holds the whole conversation, so the default serializer
+    writes the full, growing message list at every step. Here each message is encoded on its
+    own (msgpack, by the wrapped JsonPlusSerializer) and stored in the blob store under the hash
+    of its bytes. A message list is stored as a node: the key of an earlier node holding its
+    prefix plus the keys of the messages added since, so a step writes only its new messages and
+    one small node. After `max_chain` nodes the next one lists every key again, which bounds the
+    lookups of a read. The checkpoint keeps only the key of the node.
+
+    Blobs and checkpoints larger than `compress_min_bytes` are zstd compressed when the
+    zstandard package is installed. Checkpoints written by another serializer are still read.
+
+    Every message is encoded again at every step, since a message object may change after it was
+    checkpointed (`add_messages` fills in `message.id` later); only the blobs not stored yet are
+    written. The last `cache_entries` blobs and nodes are remembered to skip the store. Blobs stay when the checkpoints using them are deleted, until `collect_garbage` is given the
+    checkpoints that remain (PooledSqliteSaver does it when it prunes).
+    """
+
+    def __init__(
+        self,
+        store: MemoryBlobStore | SqliteBlobStore,
+        serde: SerializerProtocol | None = None,
+        compress: bool = True,
+        compress_min_bytes: int = 1024,
+        max_chain: int = 32,
+        cache_entries: int = 10000
+    ) -> None:
+        self.store = store
+        self.serde: SerializerProtocol = serde or JsonPlusSerializer()
+        self.compress: bool = compress and ZSTD_AVAILABLE
+        self.compress_min_bytes = compress_min_bytes
+        self.max_chain = max_chain
+        self.cache_entries = cache_entries
+
+        self._lock = threading.RLock()
+        self._nodes: OrderedDict[bytes, int] = OrderedDict() # Node key -> chain length, of the nodes known to be stored.
+        self._blobs: OrderedDict[bytes, bytes] = OrderedDict() # Blobs read or written last.
+
+    # Encoding of one blob.
+
+    def _pack(self, data: bytes) -> bytes:
+        if self.compress and len(data) >= self.compress_min_bytes:
+            return ZSTD + _compress(data)
+        return RAW + data
+
+    @staticmethod
+    def _unpack(blob: bytes) -> bytes:
+        return _decompress(blob[1:]) if blob[:1] == ZSTD else blob[1:]
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key: Any, value: Any, max_entries: int) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last = False)
+
+    # Writing.
+
+    def _message_key(self, message: BaseMessage, new_blobs: Dict[bytes, bytes]) -> bytes:
+        # The key is the hash of the current content, ids included, never cached by message object.
+        data: bytes = ormsgpack.packb(self.serde.dumps_typed(message))
+        key: bytes = _key(data)
+        if key not in self._blobs:
+            new_blobs[key] = self._pack(data)
+            self._remember(self._blobs, key, new_blobs[key], self.cache_entries)
+        return key
+
+    def _list_key(self, messages: List[BaseMessage], new_blobs: Dict[bytes, bytes]) -> bytes:
+        keys: List[bytes] = [self._message_key(message, new_blobs) for message in messages]
+        # The key of a list chains the keys of its messages, every prefix has its own.
+        prefixes: List[bytes] = []
+        key: bytes = b""
+        for message_key in keys:
+            key = _key(key + message_key)
+            prefixes.append(key)
+
+        if key in self._nodes:
+            self._nodes.move_to_end(key)
+            return key
+        parent: Optional[bytes] = None
+        parent_length: int = 0
+        # The previous step's list is usually this one minus the last few messages.
+        for index in range(len(prefixes) - 2, max(len(prefixes) - 18, -1), -1):
+            length: Optional[int] = self._nodes.get(prefixes[index])
+            if length is not None and length < self.max_chain:
+                parent, parent_length = prefixes[index], length
+                keys = keys[index + 1:]
+                break
+
+        new_blobs[key] = self._pack(ormsgpack.packb([parent, keys]))
+        self._remember(self._nodes, key, parent_length + 1, self.cache_entries)
+        return key
+
+    def _encode(self, obj: Any, new_blobs: Dict[bytes, bytes]) -> Any:
+        if isinstance(obj, list) and obj and all(isinstance(item, BaseMessage) for item in obj):
+            return {MESSAGES_REF: self._list_key(obj, new_blobs)}
+        if isinstance(obj, dict):
+            return {key: self._encode(value, new_blobs) for key, value in obj.items()}
+        if type(obj) in (list, tuple):
+            return type(obj)(self._encode(item, new_blobs) for item in obj)
+        return obj
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        new_blobs: Dict[bytes, bytes] = {}
+        with self._lock:
+            encoded: Any = self._encode(obj, new_blobs)
+            # The blobs go first, a checkpoint never points to a blob that is not stored.
+            try:
+                self.store.put_many(new_blobs)
+            except Exception:
+                # The caches now name blobs that were not stored, start over from the store.
+                self._nodes.clear()
+                self._blobs.clear()
+                raise
+        type_, data = self.serde.dumps_typed(encoded)
+        return TYPE_PREFIX + type_, self._pack(data)
+
+    # Reading.
+
+    def _get_blobs(self, keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+        blobs: Dict[bytes, bytes] = {}
+        missing: List[bytes] = []
+        for key in keys:
+            if key in self._blobs:
+                blobs[key] = self._blobs[key]
+            else:
+                missing.append(key)
+        if missing:
+            for key, blob in self.store.get_many(missing).items():
+                blobs[key] = blob
+                self._remember(self._blobs, key, blob, self.cache_entries)
+        absent: set[bytes] = set(missing) - set(blobs)
+        if absent:
+            raise KeyError(f"{len(absent)} checkpoint blobs are missing from the blob store.")
+        return blobs
+
+    def _load_list(self, key: bytes) -> List[BaseMessage]:
+        segments: List[List[bytes]] = []
+        node: Optional[bytes] = key
+        length: int = 0
+        while node is not None:
+            node_key: bytes = node
+            node, message_keys = ormsgpack.unpackb(self._unpack(self._get_blobs([node_key])[node_key]))
+            segments.append(message_keys)
+            length += 1
+        self._remember(self._nodes, key, length, self.cache_entries)
+
+        keys: List[bytes] = [message_key for segment in reversed(segments) for message_key in segment]
+        blobs: Dict[bytes, bytes] = self._get_blobs(dict.fromkeys(keys))
+        messages: List[BaseMessage] = []
+        for message_key in keys:
+            messages.append(self.serde.loads_typed(tuple(ormsgpack.unpackb(self._unpack(blobs[message_key])))))
+        return messages
+
+    def _decode(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if len(obj) == 1 and MESSAGES_REF in obj:
+                return self._load_list(obj[MESSAGES_REF])
+            return {key: self._decode(value) for key, value in obj.items()}
+        if type(obj) in (list, tuple):
+            return type(obj)(self._decode(item) for item in obj)
+        return obj
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if not type_.startswith(TYPE_PREFIX):
+            return self.serde.loads_typed(data) # Written by the default serializer.
+        obj: Any = self.serde.loads_typed((type_[len(TYPE_PREFIX):], self._unpack(payload)))
+        with self._lock:
+            return self._decode(obj)
+
+    # Garbage collection.
+
+    def _referenced_lists(self, obj: Any, keys: set[bytes]) -> None:
+        if isinstance(obj, dict):
+            if len(obj) == 1 and MESSAGES_REF in obj:
+                keys.add(obj[MESSAGES_REF])
+            else:
+                for value in obj.values():
+                    self._referenced_lists(value, keys)
+        elif type(obj) in (list, tuple):
+            for item in obj:
+                self._referenced_lists(item, keys)
+
+    def referenced_keys(self, payloads: Iterable[Tuple[Optional[str], Optional[bytes]]]) -> set[bytes]:
+        """The keys of every node and message blob that the (type, bytes) `payloads` refer to."""
+        nodes: set[bytes] = set()
+        for type_, payload in payloads:
+            if type_ and payload is not None and type_.startswith(TYPE_PREFIX):
+                self._referenced_lists(self.serde.loads_typed((type_[len(TYPE_PREFIX):], self._unpack(payload))), nodes)
+
+        # Walk the node chains level by level, a prefix shared by many lists is read once.
+        keys: set[bytes] = set(nodes)
+        frontier: List[bytes] = list(nodes)
+        while frontier:
+            parents: List[bytes] = []
+            for blob in self.store.get_many(frontier).values():
+                parent, message_keys = ormsgpack.unpackb(self._unpack(blob))
+                keys.update(message_keys)
+                if parent is not None and parent not in keys:
+                    keys.add(parent)
+                    parents.append(parent)
+            frontier = parents
+        return keys
+
+    def collect_garbage(self, payloads: Iterable[Tuple[Optional[str], Optional[bytes]]]) -> int:
+        """
+        Delete the blobs that none of `payloads`, every checkpoint and write still stored, refers to.
+        No checkpoint may be written meanwhile: one encoded but not yet stored would lose its blobs.
+        Returns the number of blobs deleted.
+        """
+        live: set[bytes] = self.referenced_keys(payloads)
+        with self._lock:
+            dead: set[bytes] = {key for key in self.store.keys() if key not in live}
+            if not dead:
+                return 0
+            self.store.delete_many(dead)
+            # The caches must not name a deleted blob, or the next write would skip storing it again.
+            for key in dead:
+                self._blobs.pop(key, None)
+                self._nodes.pop(key, None)
+        return len(dead)
@@ -0,0 +1,49 @@
+# The agents share module names (config, graph, ...), run the tests of one agent at a time:
+#     python -m pytest chatbot_with_tools_and_memory/tests
+from pathlib import Path
+from typing import Annotated, TypedDict
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from langchain_core.messages import AIMessage, HumanMessage # noqa: E402
+from langgraph.checkpoint.memory import InMemorySaver # noqa: E402
+from langgraph.graph import StateGraph, add_messages # noqa: E402
+from serializer import DeltaSerializer, MemoryBlobStore # noqa: E402
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def build_graph(serializer: DeltaSerializer):
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("answer", lambda state: {"messages": [AIMessage(content = f"Answer to {state['messages'][-1].content}")]})
+    graph_builder.set_entry_point("answer")
+    return graph_builder.compile(checkpointer = InMemorySaver(serde = serializer))
+
+
+def test_message_ids_survive_a_round_trip():
+    serializer = DeltaSerializer(MemoryBlobStore())
+    graph = build_graph(serializer)
+    config = {"configurable": {"thread_id": "1"}}
+    for question in ("one", "two"):
+        graph.invoke({"messages": [HumanMessage(content = question)]}, config)
+
+    messages = graph.get_state(config).values["messages"]
+    assert [message.content for message in messages] == ["one", "Answer to one", "two", "Answer to two"]
+    assert all(message.id for message in messages)
+    assert len({message.id for message in messages}) == 4
+
+    # Read back with cold caches, only from the blob store.
+    cold = DeltaSerializer(serializer.store)
+    assert cold.loads_typed(serializer.dumps_typed(messages)) == messages
+
+
+def test_garbage_collection_keeps_the_blobs_of_remaining_checkpoints():
+    serializer = DeltaSerializer(MemoryBlobStore())
+    kept = serializer.dumps_typed({"messages": [HumanMessage(content = "kept", id = "1")]})
+    serializer.dumps_typed({"messages": [HumanMessage(content = "dropped", id = "2")]})
+
+    assert serializer.collect_garbage([kept]) == 2 # The dropped message and its node.
+    assert serializer.loads_typed(kept)["messages"][0].content == "kept"
@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Sequence
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel
+import json
+import re
+
+
+class RegisteredTool:
+    """
+    A tool together with an argument parser compiled once from its `args_schema`.
+
+    The parser accepts what an LLM usually sends as tool input:
+        - a dict, eg. {"num_1": 2, "num_2": 98}
+        - a JSON string, eg. '{"num_1": 2, "num_2": 98}'
+        - a plain string for single argument tools, eg. "LangGraph case studies" for tavily_search
+        - positional values for multi argument tools, eg. "2, 98" for addition
+    and returns a dict validated and coerced by the schema.
+    """
+
+    def __init__(self, tool: BaseTool) -> None:
+        self.tool = tool
+        self.name: str = tool.name
+
+        schema = tool.args_schema if isinstance(tool.args_schema, type) and issubclass(tool.args_schema, BaseModel) else None
+        self.schema: type[BaseModel] | None = schema
+        self.field_names: List[str] = list(schema.model_fields) if schema else []
+        self.required_fields: List[str] = [
+            name for name, field in schema.model_fields.items() if field.is_required()
+        ] if schema else []
+
+    def _to_dict(self, tool_input: Any) -> Dict[str, Any] | Any:
+        if not isinstance(tool_input, str):
+            return tool_input
+
+        text: str = tool_input.strip()
+        if text.startswith("{"):
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                pass # Fall back to the plain string handling below.
+
+        if not self.field_names:
+            return {}
+
+        if len(self.required_fields) == 1:
+            return {self.required_fields[0]: text.strip("\"'")}
+
+        values: List[str] = [value.strip("\"' ") for value in re.split(r"[,\s]+", text) if value.strip("\"' ")]
+        if len(values) == len(self.field_names):
+            return dict(zip(self.field_names, values))
+
+        return text
+
+    def parse(self, tool_input: Any) -> Any:
+        """Parse and validate the raw tool input. Raises pydantic.ValidationError for invalid input."""
+        data: Any = self._to_dict(tool_input)
+        if self.schema is None or not isinstance(data, dict):
+            return data
+        return self.schema.model_validate(data).model_dump(exclude_unset = True)
+
+
+class ToolRegistry:
+    """
+    Name index and argument parsers of the available tools, built once per process. The ReAct
+    action node and the chatbot's ParallelToolExecutor (parallel_tools.py) dispatch through it;
+    a stock ToolNode built from `tools` would skip the parsers.
+    """
+
+    def __init__(self, tools: Sequence[BaseTool]) -> None:
+        self.tools: List[BaseTool] = list(tools)
+        self.tools_by_name: Dict[str, RegisteredTool] = {tool.name: RegisteredTool(tool) for tool in self.tools}
+
+    def get(self, name: str) -> RegisteredTool | None:
+        return self.tools_by_name.get(name)
+
+    def invoke(self, name: str, tool_input: Any) -> Any:
+        registered_tool: RegisteredTool | None = self.get(name)
+        if registered_tool is None:
+            raise KeyError(f"Tool {name} not found.")
+        return registered_tool.tool.invoke(input = registered_tool.parse(tool_input))
+
+    async def ainvoke(self, name: str, tool_input: Any) -> Any:
+        registered_tool: RegisteredTool | None = self.get(name)
+        if registered_tool is None:
+            raise KeyError(f"Tool {name} not found.")
+        return await registered_tool.tool.ainvoke(input = registered_tool.parse(tool_input))
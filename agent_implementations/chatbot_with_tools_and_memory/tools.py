@@ -1,7 +1,8 @@
 from datetime import datetime
 from langchain_core.tools import tool 
-from langchain_tavily import TavilySearch
-from config import settings
+from config import get_settings
+from functools import lru_cache
+from tool_registry import ToolRegistry
 from typing import List, Any
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
@@ -72,14 +73,36 @@ def division(num_1: int | float, num_2: int | float) -> float:
 
 
 
-tavily_search = TavilySearch(
-    tavily_api_key = settings.tavily_api_key,
-    max_results = 2
-)
+@lru_cache(maxsize = None)
+def get_tavily_search() -> BaseTool:
+    """The cached Tavily search tool, created on first use and reused afterwards."""
+    from search_cache import CachedTavilySearch, SearchCache
+    from transport import PooledTavilySearchAPIWrapper
+
+    settings = get_settings()
+    search_cache = SearchCache(
+        path = settings.search_cache_path,
+        ttl_seconds = settings.search_cache_ttl_seconds,
+        max_entries = settings.search_cache_max_entries,
+        memory_entries = settings.search_cache_memory_entries
+    )
+
+    return CachedTavilySearch(
+        api_wrapper = PooledTavilySearchAPIWrapper(tavily_api_key = settings.tavily_api_key),
+        max_results = 2,
+        cache = search_cache
+    )
+
+
+@lru_cache(maxsize = None)
+def get_available_tools() -> List[BaseTool]:
+    return [get_current_date, addition, multiplication, subtraction, division, get_tavily_search()]
+
 
-available_tools: List[BaseTool | TavilySearch] = [
-    get_current_date, addition, multiplication, subtraction, division, tavily_search
-]
+# Name index and argument parsers, built once on first use and shared by the graph nodes.
+@lru_cache(maxsize = None)
+def get_tool_registry() -> ToolRegistry:
+    return ToolRegistry(get_available_tools())
 
 
 
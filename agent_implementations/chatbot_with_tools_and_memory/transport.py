@@ -0,0 +1,184 @@
+from typing import Any, Dict, Iterable, List
+from functools import lru_cache
+from config import get_settings
+from langchain_tavily._utilities import TAVILY_API_URL, TavilySearchAPIWrapper
+import asyncio
+import importlib.util
+import httpx
+import threading
+import time
+
+
+# Hosts of the clients configured from the pool, opened ahead of the first request by `warm_up`.
+# Gemini is not among them, langchain-google-genai talks to it over its own gRPC channel.
+WARM_UP_URLS: Dict[str, str] = {
+    "groq": "https://api.groq.com",
+    "tavily": TAVILY_API_URL,
+}
+
+
+class HttpPool:
+    """
+    Process wide keep-alive connection pools shared by the LLM and search clients: one httpx.Client
+    for sync calls and one httpx.AsyncClient for async calls, so a connection opened by one call is
+    reused by the next instead of paying DNS, TCP and TLS again. HTTP/2 is used when the h2
+    package is installed (httpx[http2]), it multiplexes the requests to a host on one connection.
+
+    The async client belongs to the event loop that first uses it, like any httpx.AsyncClient.
+    `stats` reports how full the pools are, a request that finds every connection busy has to wait
+    for one and is counted as saturated.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry_seconds: float = 60.0,
+        timeout_seconds: float = 60.0,
+        http2: bool = True
+    ) -> None:
+        self.max_connections = max_connections
+        self.http2: bool = http2 and importlib.util.find_spec("h2") is not None
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {"sync": 0, "async": 0}
+        self.saturated_requests: Dict[str, int] = {"sync": 0, "async": 0}
+
+        limits = httpx.Limits(
+            max_connections = max_connections,
+            max_keepalive_connections = max_keepalive_connections,
+            keepalive_expiry = keepalive_expiry_seconds
+        )
+        timeout = httpx.Timeout(timeout_seconds, connect = min(timeout_seconds, 10.0))
+        self.client = httpx.Client(
+            limits = limits, timeout = timeout, http2 = self.http2,
+            event_hooks = {"request": [lambda request: self._count("sync")]}
+        )
+
+        async def count_async(request: httpx.Request) -> None:
+            self._count("async")
+
+        self.async_client = httpx.AsyncClient(
+            limits = limits, timeout = timeout, http2 = self.http2,
+            event_hooks = {"request": [count_async]}
+        )
+
+    @staticmethod
+    def _pool_state(client: httpx.Client | httpx.AsyncClient) -> Dict[str, int]:
+        # The connection pool of httpcore behind the default transport.
+        pool: Any = getattr(client._transport, "_pool", None)
+        connections: List[Any] = list(getattr(pool, "connections", []))
+        return {
+            "open_connections": len(connections),
+            "active_connections": sum(not connection.is_idle() for connection in connections),
+            "queued_requests": sum(request.is_queued() for request in list(getattr(pool, "_requests", []))),
+        }
+
+    def _count(self, kind: str) -> None:
+        client: httpx.Client | httpx.AsyncClient = self.client if kind == "sync" else self.async_client
+        busy: bool = self._pool_state(client)["active_connections"] >= self.max_connections
+        with self._lock:
+            self.requests[kind] += 1
+            self.saturated_requests[kind] += int(busy)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "max_connections": self.max_connections,
+                **{
+                    kind: {
+                        **self._pool_state(client),
+                        "requests": self.requests[kind],
+                        "saturated_requests": self.saturated_requests[kind],
+                    }
+                    for kind, client in (("sync", self.client), ("async", self.async_client))
+                },
+            }
+
+    def warm_up(self, urls: Iterable[str], connections: int = 1) -> Dict[str, float | str]:
+        """Open `connections` connections to every url with the sync client. Returns the seconds (or the error) per url."""
+        timings: Dict[str, float | str] = {}
+        for url in urls:
+            started_at: float = time.perf_counter()
+            try:
+                for _ in range(connections):
+                    self.client.head(url) # Any answer means the connection is open and kept alive.
+                timings[url] = time.perf_counter() - started_at
+            except httpx.HTTPError as e:
+                timings[url] = repr(e)
+        return timings
+
+    async def awarm_up(self, urls: Iterable[str], connections: int = 1) -> Dict[str, float | str]:
+        """Async variant of `warm_up`, the requests to a host are concurrent so they open distinct connections."""
+        async def open_connections(url: str) -> float | str:
+            started_at: float = time.perf_counter()
+            try:
+                await asyncio.gather(*(self.async_client.head(url) for _ in range(connections)))
+                return time.perf_counter() - started_at
+            except httpx.HTTPError as e:
+                return repr(e)
+
+        urls = list(urls)
+        return dict(zip(urls, await asyncio.gather(*(open_connections(url) for url in urls))))
+
+    async def keep_warm(self, urls: Iterable[str], interval_seconds: float, connections: int = 1) -> None:
+        """Re-open the connections every `interval_seconds`, so a request after an idle gap finds them open. Runs until cancelled."""
+        urls = list(urls)
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.awarm_up(urls, connections)
+
+    def close(self) -> None:
+        self.client.close()
+
+    async def aclose(self) -> None:
+        self.client.close()
+        await self.async_client.aclose()
+
+
+@lru_cache(maxsize = None)
+def get_http_pool() -> HttpPool:
+    """The HttpPool of this process, every client built from the settings uses it."""
+    settings = get_settings()
+    return HttpPool(
+        max_connections = settings.http_max_connections,
+        max_keepalive_connections = settings.http_max_keepalive_connections,
+        keepalive_expiry_seconds = settings.http_keepalive_expiry_seconds,
+        timeout_seconds = settings.http_timeout_seconds,
+        http2 = settings.http2
+    )
+
+
+class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    """
+    TavilySearchAPIWrapper sending its requests through the HttpPool. The stock wrapper opens a new
+    connection for every search (requests.post, and a new aiohttp session in async).
+    """
+
+    def _request(self, query: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "url": f"{self.api_base_url or TAVILY_API_URL}/search",
+            "json": {"query": query, **{name: value for name, value in kwargs.items() if value is not None}},
+            "headers": {
+                "Authorization": f"Bearer {self.tavily_api_key.get_secret_value()}",
+                "Content-Type": "application/json",
+                "X-Client-Source": "langchain-tavily",
+            },
+        }
+
+    @staticmethod
+    def _result(response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            try:
+                detail: Any = response.json().get("detail", {})
+            except ValueError:
+                detail = {}
+            raise ValueError(f"Error {response.status_code}: {detail.get('error') if isinstance(detail, dict) else 'Unknown error'}")
+        return response.json()
+
+    def raw_results(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        return self._result(get_http_pool().client.post(**self._request(query, kwargs)))
+
+    async def raw_results_async(self, query: str, **kwargs: Any) -> Dict[str, Any]:
+        return self._result(await get_http_pool().async_client.post(**self._request(query, kwargs)))
@@ -0,0 +1,441 @@
+"""
+Batch runner of the reflexion graph.
+
+Runs the graph over a file of prompts with bounded concurrency and writes one JSON line per
+prompt to the output file as soon as it completes. LLM and search calls are throttled
+(requests and tokens per minute), per chat model provider when limits are given for it, transient failures are retried with exponential
+backoff, and the output file doubles as the checkpoint: running the same command again skips
+every prompt that already has an "ok" line, so a crashed batch resumes where it stopped.
+
+Input is either a text file with one prompt per line, or a JSONL file of {"id": ..., "prompt": ...}
+objects (the id defaults to a hash of the prompt).
+
+Usage (from the reflexion_agent directory):
+    python batch.py topics.txt --output posts.jsonl --concurrency 8 --rpm 60 --tpm 1000000
+    python batch.py topics.txt --provider-limit google_genai=15:1000000 --provider-limit groq=30:6000
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TypedDict
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import LLMResult
+from config import get_settings
+from stopping import LoopState
+from instrumentation import RunMetrics, instrumented_config
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+
+# Key of the LLM limiter used when no limiter is registered for the provider of a chat model.
+DEFAULT_LLM_LIMITER: str = "llm"
+
+TRANSIENT_STATUS_CODES: set[int] = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES: tuple[str, ...] = (
+    "RateLimit", "ResourceExhausted", "Timeout", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "APIConnectionError", "ConnectError", "ReadError", "Overloaded"
+)
+
+
+class BatchItem(TypedDict):
+    id: str
+    prompt: str
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute budget of one provider, as two token buckets refilled continuously.
+
+    `acquire(tokens)` waits until a request slot and the estimated tokens are available. The estimate
+    is corrected with `settle(tokens)` once the real usage is known, the balance may go negative
+    and later requests then wait for the debt to be refilled.
+    """
+
+    def __init__(self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests: float = float(requests_per_minute or 0)
+        self._tokens: float = float(tokens_per_minute or 0)
+        self._updated_at: float = time.monotonic()
+        self._lock = asyncio.Lock()
+
+        self.waited_seconds: float = 0.0
+
+    def _refill(self) -> None:
+        now: float = time.monotonic()
+        elapsed: float = now - self._updated_at
+        self._updated_at = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _wait_time(self, tokens: int) -> float:
+        wait: float = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            wait = (1 - self._requests) * 60 / self.requests_per_minute
+        if self.tokens_per_minute:
+            # A single request larger than the whole budget only waits for a full bucket.
+            needed: float = min(tokens, self.tokens_per_minute)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+    async def acquire(self, tokens: int = 0) -> None:
+        # The lock is fair, waiting callers are served in arrival order.
+        async with self._lock:
+            while True:
+                self._refill()
+                wait: float = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+
+    def settle(self, tokens: int) -> None:
+        if self.tokens_per_minute:
+            self._tokens -= tokens
+
+
+class RateLimitCallback(AsyncCallbackHandler):
+    """
+    Throttles every chat model and tool call of a run, before the call is sent.
+
+    Chat models are looked up by their `ls_provider` (eg. "google_genai") and fall back to the
+    "llm" limiter, tools by their name (eg. "tavily_search"). The tokens of a chat model call are
+    estimated from the prompt and settled with the usage reported by the provider.
+    """
+
+    def __init__(self, limiters: Dict[str, RateLimiter]) -> None:
+        self.limiters = limiters
+        self._reserved: Dict[UUID, tuple[RateLimiter, int]] = {}
+
+    async def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        provider: str | None = (metadata or {}).get("ls_provider")
+        if provider == "router":
+            return # A RouterChatModel, the provider call nested in it is throttled instead.
+        limiter: RateLimiter | None = self.limiters.get(provider) or self.limiters.get(DEFAULT_LLM_LIMITER)
+        if limiter is None:
+            return
+        estimate: int = sum(count_tokens_approximately(prompt) for prompt in messages)
+        await limiter.acquire(estimate)
+        self._reserved[run_id] = (limiter, estimate)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        limiter, estimate = self._reserved.pop(run_id, (None, 0))
+        if limiter is None:
+            return
+        used: int = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage: Dict[str, Any] | None = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                used += (usage or {}).get("total_tokens", 0)
+        if used:
+            limiter.settle(used - estimate)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._reserved.pop(run_id, None)
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        limiter: RateLimiter | None = self.limiters.get((serialized or {}).get("name"))
+        if limiter is not None:
+            await limiter.acquire()
+
+
+def item_id(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode()).hexdigest()[:16]
+
+
+def load_prompts(path: str) -> List[BatchItem]:
+    """Read the prompts of a .txt (one per line) or .jsonl file, dropping blank lines and duplicate ids."""
+    items: Dict[str, BatchItem] = {}
+    with open(path, encoding = "utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record: Dict[str, Any] = json.loads(line)
+                item = BatchItem(id = str(record.get("id") or item_id(record["prompt"])), prompt = record["prompt"])
+            else:
+                item = BatchItem(id = item_id(line), prompt = line)
+            items.setdefault(item["id"], item)
+    return list(items.values())
+
+
+def completed_ids(output_path: str) -> set[str]:
+    """Ids with an "ok" result in an existing output file. A torn last line of a crashed run is ignored."""
+    done: set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding = "utf-8") as file:
+        for line in file:
+            try:
+                record: Dict[str, Any] = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def is_transient(error: BaseException) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses are worth retrying, bad requests are not."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    for code in (getattr(error, "status_code", None), getattr(error, "code", None)):
+        if isinstance(code, int) and code in TRANSIENT_STATUS_CODES:
+            return True
+    names: str = " ".join(cls.__name__ for cls in type(error).__mro__)
+    if any(name in names for name in TRANSIENT_ERROR_NAMES):
+        return True
+    # Provider SDK errors are often re-raised by the LangChain integration, look at the cause too.
+    cause: BaseException | None = error.__cause__ or error.__context__
+    return cause is not None and cause is not error and is_transient(cause)
+
+
+def final_answer(messages: List[BaseMessage]) -> Dict[str, Any]:
+    """The ReviseAnswer (or AnswerQuestion) arguments of the last AIMessage of the run."""
+    from chains import revisor_chain_validator, response_chain_validator
+
+    last_ai_message: AIMessage = next(message for message in reversed(messages) if isinstance(message, AIMessage))
+    try:
+        return revisor_chain_validator.invoke(last_ai_message)[0].model_dump()
+    except Exception:
+        return response_chain_validator.invoke(last_ai_message)[0].model_dump()
+
+
+def usage_of(messages: List[BaseMessage]) -> Dict[str, int]:
+    usage: Dict[str, int] = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for message in messages:
+        for key, value in (getattr(message, "usage_metadata", None) or {}).items():
+            if key in usage:
+                usage[key] += value
+    return usage
+
+
+class BatchRunner:
+    """
+    Runs the reflexion graph over many prompts, at most `concurrency` at a time, on one event loop.
+    Results are appended (and flushed) to `output_path` in completion order.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        concurrency: int = 4,
+        limiters: Optional[Dict[str, RateLimiter]] = None,
+        max_attempts: int = 3,
+        retry_base_seconds: float = 2.0,
+        timeout_seconds: float | None = 300.0,
+        run_metrics: Optional[RunMetrics] = None,
+        graph: Any = None
+    ) -> None:
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.limiters: Dict[str, RateLimiter] = limiters or {}
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.timeout_seconds = timeout_seconds
+        self.run_metrics = run_metrics # Shared by every run of the batch.
+        self._graph = graph
+
+        self.counts: Dict[str, int] = {"ok": 0, "error": 0, "skipped": 0, "retries": 0}
+
+    @property
+    def graph(self) -> Any:
+        if self._graph is None:
+            from graph import graph
+            self._graph = graph
+        return self._graph
+
+    async def _run_once(self, item: BatchItem) -> List[BaseMessage]:
+        config, _ = instrumented_config(
+            {
+                "callbacks": [RateLimitCallback(self.limiters)],
+                "run_name": "reflexion_batch",
+                "metadata": {"batch_item_id": item["id"]}
+            },
+            "reflexion",
+            enabled = self.run_metrics is not None,
+            run_metrics = self.run_metrics
+        )
+        run = self.graph.ainvoke([HumanMessage(content = item["prompt"])], config = config)
+        if self.timeout_seconds:
+            return await asyncio.wait_for(run, timeout = self.timeout_seconds)
+        return await run
+
+    async def _run_item(self, item: BatchItem) -> Dict[str, Any]:
+        started_at: float = time.perf_counter()
+        attempt: int = 0
+        while True:
+            attempt += 1
+            try:
+                messages: List[BaseMessage] = await self._run_once(item)
+                return {
+                    "id": item["id"],
+                    "prompt": item["prompt"],
+                    "status": "ok",
+                    "answer": final_answer(messages),
+                    "usage": usage_of(messages),
+                    "iterations": LoopState(messages).iterations,
+                    "attempts": attempt,
+                    "latency_seconds": round(time.perf_counter() - started_at, 3)
+                }
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_transient(e):
+                    return {
+                        "id": item["id"],
+                        "prompt": item["prompt"],
+                        "status": "error",
+                        "error": f"{type(e).__name__}: {e}",
+                        "attempts": attempt,
+                        "latency_seconds": round(time.perf_counter() - started_at, 3)
+                    }
+                # Exponential backoff with jitter, so the retries of a burst do not come back together.
+                delay: float = self.retry_base_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                print(f"[{item['id']}] attempt {attempt} failed with {type(e).__name__}, retrying in {delay:.1f}s")
+                self.counts["retries"] += 1
+                await asyncio.sleep(delay)
+
+    async def run(self, items: Iterable[BatchItem]) -> Dict[str, int]:
+        done: set[str] = completed_ids(self.output_path)
+        items = list(items)
+        pending: List[BatchItem] = [item for item in items if item["id"] not in done]
+        # Only the prompts of this input, the output file may hold the results of other inputs too.
+        self.counts["skipped"] = len(items) - len(pending)
+        print(f"{len(pending)} prompts to run, {self.counts['skipped']} already completed in {self.output_path}.")
+
+        queue: asyncio.Queue[BatchItem] = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+
+        with open(self.output_path, "a", encoding = "utf-8") as output:
+
+            async def worker() -> None:
+                while not queue.empty():
+                    item: BatchItem = queue.get_nowait()
+                    result: Dict[str, Any] = await self._run_item(item)
+                    # Single threaded event loop, whole lines are written one at a time.
+                    output.write(json.dumps(result, default = str) + "\n")
+                    output.flush()
+                    os.fsync(output.fileno())
+                    self.counts[result["status"]] += 1
+                    print(f"[{item['id']}] {result['status']} in {result['latency_seconds']}s "
+                          f"({self.counts['ok'] + self.counts['error']}/{len(pending)})")
+
+            await asyncio.gather(*(worker() for _ in range(max(1, min(self.concurrency, len(pending))))))
+
+        return self.counts
+
+
+def build_limiters(
+    llm_requests_per_minute: int | None,
+    llm_tokens_per_minute: int | None,
+    search_requests_per_minute: int | None,
+    llm_provider_limits: Dict[str, Tuple[int | None, int | None]] | None = None
+) -> Dict[str, RateLimiter]:
+    """
+    The limiters of RateLimitCallback: one per ls_provider of `llm_provider_limits` (requests and
+    tokens per minute), the shared "llm" one for the other chat models, and the Tavily one.
+    """
+    limiters: Dict[str, RateLimiter] = {}
+    if llm_requests_per_minute or llm_tokens_per_minute:
+        limiters[DEFAULT_LLM_LIMITER] = RateLimiter(llm_requests_per_minute, llm_tokens_per_minute)
+    for provider, (requests_per_minute, tokens_per_minute) in (llm_provider_limits or {}).items():
+        limiters[provider] = RateLimiter(requests_per_minute, tokens_per_minute)
+    if search_requests_per_minute:
+        limiters["tavily_search"] = RateLimiter(search_requests_per_minute)
+    return limiters
+
+
+def provider_limit(value: str) -> Tuple[str, Tuple[int | None, int | None]]:
+    """Parse PROVIDER=RPM[:TPM], an empty or "none" limit disables it."""
+    provider, separator, limits = value.partition("=")
+    if not separator or not provider:
+        raise argparse.ArgumentTypeError(f"Expected PROVIDER=RPM[:TPM], got {value!r}.")
+    requests_per_minute, _, tokens_per_minute = limits.partition(":")
+    try:
+        parsed: List[int | None] = [
+            int(limit) if limit.strip().lower() not in ("", "none") else None
+            for limit in (requests_per_minute, tokens_per_minute)
+        ]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Limits of {value!r} must be integers.") from None
+    return provider, (parsed[0], parsed[1])
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prompts", help = "Text file with one prompt per line, or JSONL with id and prompt fields.")
+    parser.add_argument("--output", default = "batch_results.jsonl", help = "JSONL results, also used to resume.")
+    parser.add_argument("--concurrency", type = int, default = settings.batch_concurrency)
+    parser.add_argument("--rpm", type = int, default = settings.batch_llm_requests_per_minute, help = "LLM requests per minute.")
+    parser.add_argument("--tpm", type = int, default = settings.batch_llm_tokens_per_minute, help = "LLM tokens per minute.")
+    parser.add_argument(
+        "--provider-limit", action = "append", type = provider_limit, dest = "provider_limits",
+        default = None, metavar = "PROVIDER=RPM[:TPM]",
+        help = "Own LLM limits of a provider by ls_provider (eg. groq=30:6000), repeatable. Adds to batch_llm_provider_limits."
+    )
+    parser.add_argument("--search-rpm", type = int, default = settings.batch_search_requests_per_minute, help = "Tavily requests per minute.")
+    parser.add_argument("--max-attempts", type = int, default = settings.batch_max_attempts)
+    parser.add_argument("--timeout", type = float, default = settings.batch_timeout_seconds, help = "Seconds per attempt.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    settings = get_settings()
+
+    runner = BatchRunner(
+        output_path = args.output,
+        concurrency = args.concurrency,
+        limiters = build_limiters(
+            args.rpm, args.tpm, args.search_rpm,
+            {**settings.batch_llm_provider_limits, **dict(args.provider_limits or [])}
+        ),
+        max_attempts = args.max_attempts,
+        retry_base_seconds = settings.batch_retry_base_seconds,
+        timeout_seconds = args.timeout,
+        run_metrics = RunMetrics("reflexion") if settings.instrumentation else None
+    )
+    started_at: float = time.perf_counter()
+    counts: Dict[str, int] = asyncio.run(runner.run(load_prompts(args.prompts)))
+
+    print(
+        f"Done in {time.perf_counter() - started_at:.1f}s: {counts['ok']} ok, {counts['error']} failed, "
+        f"{counts['skipped']} skipped, {counts['retries']} retries. Results in {args.output}."
+    )
+
+    from graph import stopping_stats
+    stats: Dict[str, Any] = stopping_stats.stats
+    print(
+        f"Revisions: {stats['iterations']} run, {stats['iterations_saved']} saved and "
+        f"{stats['iterations_added']} added against one revision per run over {stats['runs']} runs, "
+        f"stop reasons {stats['reasons']}."
+    )
+    if runner.run_metrics:
+        print(runner.run_metrics.summary())
+
+
+if __name__ == "__main__":
+    main()
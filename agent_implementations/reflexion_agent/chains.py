@@ -1,32 +1,90 @@
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_ibm import ChatWatsonx
-from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
-from config import settings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from config import get_settings
 from models import ReviseAnswer, AnswerQuestion
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
 from langchain_core.output_parsers.openai_tools import PydanticToolsParser
+from llm_cache import SQLiteLRUCache
+from llm_router import RouterChatModel
+from structured_output import StructuredOutput
+from pydantic import BaseModel
 from dotenv import load_dotenv
 
 
 load_dotenv(dotenv_path = ".env", verbose = True) # To make sure the langsmith env credentials loaded. 
 
 # LLM initailization.
-# llm = ChatWatsonx(
-#     apikey = settings.watsonx_apikey,
-#     project_id = settings.watsonx_project_id,
-#     url = settings.watsonx_url,
-#     temperature = 0.9,
-#     model_id = "ibm/granite-3-3-8b-instruct",
-#     max_tokens = 10000
-# )
+# The LLM and the chains are built on first use and reused, importing this module does not
+# read the settings or create any client.
+
+@lru_cache(maxsize = None)
+def get_llm_cache() -> SQLiteLRUCache | None:
+    settings = get_settings()
+    if not settings.llm_cache:
+        return None
+    return SQLiteLRUCache(path = settings.llm_cache_path, max_entries = settings.llm_cache_max_entries)
+
+
+def _build_google_llm() -> BaseChatModel:
+    # Imported here, the Gemini client pulls in the gRPC stack.
+    from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        google_api_key = get_settings().google_api_key,
+        model = "gemini-2.0-flash",
+        max_tokens = 10000,
+        temperature = 0.9,
+        cache = get_llm_cache()
+    )
+
+
+def _build_groq_llm() -> BaseChatModel:
+    from langchain_groq.chat_models import ChatGroq
+    from transport import get_http_pool
+
+    # Keep-alive connections shared with the Tavily client, see transport.py.
+    http_pool = get_http_pool()
+    return ChatGroq(
+        http_client = http_pool.client,
+        http_async_client = http_pool.async_client,
+        groq_api_key = get_settings().groq_api_key,
+        model = "llama-3.3-70b-versatile",
+        max_tokens = 10000,
+        temperature = 0.9,
+        cache = get_llm_cache()
+    )
+
+
+def _build_watsonx_llm() -> BaseChatModel:
+    from langchain_ibm import ChatWatsonx
+
+    settings = get_settings()
+    return ChatWatsonx(
+        apikey = settings.watsonx_apikey,
+        project_id = settings.watsonx_project_id,
+        url = settings.watsonx_url,
+        temperature = 0.9,
+        model_id = "ibm/granite-3-3-8b-instruct",
+        max_tokens = 10000,
+        cache = get_llm_cache()
+    )
+
+
+LLM_BUILDERS = {"google": _build_google_llm, "groq": _build_groq_llm, "watsonx": _build_watsonx_llm}
+
+
+@lru_cache(maxsize = None)
+def get_llm() -> BaseChatModel:
+    """The chat model of both chains, a RouterChatModel over the providers when more than one is configured."""
+    settings = get_settings()
+    providers: list[BaseChatModel] = [LLM_BUILDERS[name]() for name in settings.llm_providers]
+    if len(providers) == 1:
+        return providers[0]
+    return RouterChatModel(providers = providers, names = settings.llm_providers, hedge = settings.llm_hedging)
 
-llm = ChatGoogleGenerativeAI(
-    google_api_key = settings.google_api_key,
-    model = "gemini-2.0-flash",
-    max_tokens = 10000,
-    temperature = 0.9
-)
 
 # Actor prompt template.
 # actor_prompt_template = ChatPromptTemplate.from_messages(
@@ -71,11 +129,21 @@ actor_prompt_template = ChatPromptTemplate.from_messages(
 )
 
 
+def prompt_current_time() -> str:
+    """
+    The current time of the prompts, read when a prompt is formatted. Only the date, since a finer
+    time would change the prompt, and so the LLM cache key, at every call.
+    """
+    return get_settings().prompt_current_time or date.today().isoformat()
+
+
 # Initalizing the Responder Chain.
-responder_chain = (
-    actor_prompt_template.partial(current_time = datetime.now().isoformat(), initial_instruction = "Provide a details 250 words of answer. ") 
-    | llm.bind_tools(tools = [AnswerQuestion], tool_choice = "AnswerQuestion")
-)
+@lru_cache(maxsize = None)
+def get_responder_chain() -> Runnable:
+    return (
+        actor_prompt_template.partial(current_time = prompt_current_time, initial_instruction = "Provide a details 250 words of answer. ") 
+        | get_llm().bind_tools(tools = [AnswerQuestion], tool_choice = "AnswerQuestion")
+    )
 
 
 # Initial Instruction for revisor chain.
@@ -113,14 +181,15 @@ Ensure the references list and citations are clearly visible, verifiable, and ma
 
 
 # Initalizing Revisor chain.
-
-revisor_chain = (
-    actor_prompt_template.partial(
-        current_time = datetime.now().isoformat(),
-        initial_instruction = revisor_initial_instruction
+@lru_cache(maxsize = None)
+def get_revisor_chain() -> Runnable:
+    return (
+        actor_prompt_template.partial(
+            current_time = prompt_current_time,
+            initial_instruction = revisor_initial_instruction
+        )
+        | get_llm().bind_tools(tools = [ReviseAnswer], tool_choice = "ReviseAnswer")
     )
-    | llm.bind_tools(tools = [ReviseAnswer], tool_choice = "ReviseAnswer")
-)   
 
 
 # Validators to ensure the result is in proper pydantic schema.
@@ -128,6 +197,13 @@ response_chain_validator = PydanticToolsParser(tools = [AnswerQuestion])
 revisor_chain_validator  = PydanticToolsParser(tools = [ReviseAnswer])
 
 
+# Repairs the tool call of a chain's answer and asks the LLM again only for the fields still missing,
+# see structured_output.py. The graph nodes run every answer through it.
+@lru_cache(maxsize = None)
+def get_structured_output(schema: type[BaseModel]) -> StructuredOutput:
+    return StructuredOutput(schema, llm = get_llm, max_reasks = get_settings().structured_output_max_reasks)
+
+
 if __name__ == "__main__":
 
     "Testing this two chain response."
@@ -137,7 +213,7 @@ if __name__ == "__main__":
 
     messages.append(inital_human_message)
     
-    response: AIMessage = responder_chain.invoke({"messages": messages})
+    response: AIMessage = get_responder_chain().invoke({"messages": messages})
     # Since we use llm.bind_tool() it store the results in a **.tool_calls** attribute not in a **.content**
     # Here at this stage we need to validate the llm response. whether it give us a output in a 
     # proper Pydantic[AnswerQuestion] scheme. So use **response_chain_validator**. It internally uses PydanticToolsParser.
@@ -157,7 +233,7 @@ if __name__ == "__main__":
     print(f"AI message added to messages. messages list contains {len(messages)} BaseMessage", end = "\n\n\n")
 
 
-    revisor_response: AIMessage = revisor_chain.invoke({"messages": messages})
+    revisor_response: AIMessage = get_revisor_chain().invoke({"messages": messages})
 
     revised_answer: list[ReviseAnswer] = revisor_chain_validator.invoke(revisor_response)
 
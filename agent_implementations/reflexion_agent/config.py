@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 
@@ -11,16 +12,85 @@ class Settings(BaseSettings):
     cohere_api_key: str 
     tavily_api_key: str
     google_api_key: str
+    groq_api_key: str | None = None
 
     langsmith_api_key: str
     langsmith_endpoint: str
     langsmith_tracing: bool
     langsmith_project: str
 
+    # Chat model providers in order of preference ("google", "groq", "watsonx"), more than one
+    # puts them behind a RouterChatModel.
+    llm_providers: list[str] = ["google"]
+    llm_hedging: bool = False
+
+    # Tavily search fan-out used by the tool executor.
+    parallel_search: bool = True
+    search_max_concurrency: int = 4
+    search_timeout_seconds: float = 15.0
+
+    # Search result cache shared by the TavilySearch tool.
+    search_cache_path: str = "search_cache.db"
+    search_cache_ttl_seconds: int = 86400
+    search_cache_max_entries: int = 5000
+    search_cache_memory_entries: int = 256
+
+    # Opt-in exact match cache of LLM calls, for dev and CI replays.
+    llm_cache: bool = False
+    llm_cache_path: str = "llm_cache.db"
+    llm_cache_max_entries: int = 10000
+    # Current time given to the prompts. None uses today's date, day granular so that cached calls
+    # replay across processes; a fixed value (eg. "2025-01-01") pins it for CI.
+    prompt_current_time: str | None = None
+
+    # Stopping policy of the revise loop, see stopping.py. None disables a budget.
+    # One revision, as the original graph did; raise it to let the quality policies decide.
+    max_iterations: int = 1
+    stop_on_empty_critique: bool = True
+    stop_min_answer_change: float | None = 0.05
+    stop_token_budget: int | None = None
+    stop_latency_budget_seconds: float | None = None
+
+    # Search evidence of the revisor, see evidence.py. Off sends every search result in full.
+    evidence_store: bool = True
+    evidence_top_k: int = 6
+    evidence_token_budget: int = 1500
+    evidence_passage_chars: int = 600
+
+    # Structured output of the chains, see structured_output.py. Streaming is off while llm_cache is on.
+    structured_output_streaming: bool = True
+    structured_output_max_reasks: int = 1
+
+    # Batch runner, see batch.py. None disables a limit. The llm limits are shared by the chat
+    # model providers without their own [requests, tokens] per minute in
+    # `batch_llm_provider_limits`, keyed by ls_provider (eg. {"google_genai": [15, 1000000], "groq": [30, 6000]}).
+    batch_concurrency: int = 4
+    batch_llm_requests_per_minute: int | None = 15
+    batch_llm_tokens_per_minute: int | None = 1_000_000
+    batch_llm_provider_limits: dict[str, tuple[int | None, int | None]] = {}
+    batch_search_requests_per_minute: int | None = 100
+    batch_max_attempts: int = 3
+    batch_retry_base_seconds: float = 2.0
+    batch_timeout_seconds: float = 300.0
+
+    # Shared keep-alive HTTP connection pool of the Groq and Tavily clients, see transport.py.
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 60.0
+    http_timeout_seconds: float = 60.0
+    http2: bool = True
+
+    # Per node timings, token counts and tool calls, see instrumentation.py.
+    instrumentation: bool = False
+
     class Config:
         env_file = ".env"
         extra = "ignore"
 
 
-settings = Settings()
-print("Environment Variables Loaded Sucessfully.")
\ No newline at end of file
+@lru_cache(maxsize = None)
+def get_settings() -> Settings:
+    """Settings are read from the environment and .env on first use, then reused by every caller."""
+    settings: Settings = Settings()
+    print("Environment Variables Loaded Sucessfully.")
+    return settings
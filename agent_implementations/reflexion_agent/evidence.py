@@ -0,0 +1,235 @@
+from typing import Any, Dict, Iterable, List
+from collections import Counter
+from langchain_core.messages import BaseMessage, ToolMessage
+from urllib.parse import urlsplit, urlunsplit
+import hashlib
+import math
+import re
+
+
+# Words too common to tell passages apart.
+STOPWORDS: set[str] = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "which", "with", "how", "why",
+    "more", "not", "no", "should", "could", "would", "can", "about", "answer", "missing", "lacks", "does",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r"[a-z0-9]+", text.casefold()) if word not in STOPWORDS and len(word) > 1]
+
+
+def approximate_tokens(text: str) -> int:
+    return max(len(text) // 4, 1)
+
+
+def normalize_url(url: str) -> str:
+    """The same page under http/https, www, a fragment or a trailing slash is one URL."""
+    parts = urlsplit(url.strip())
+    host: str = parts.netloc.casefold().removeprefix("www.")
+    return urlunsplit(("https", host, parts.path.rstrip("/"), parts.query, ""))
+
+
+def split_passages(text: str, max_chars: int) -> List[str]:
+    """Split a search result into passages of whole sentences, at most `max_chars` each (longer sentences are cut)."""
+    passages: List[str] = []
+    current: str = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", " ".join(text.split())):
+        sentence = sentence[:max_chars]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+class Passage:
+    """A piece of a search result. `id` is the hash of its normalized text, the same text under another URL is the same passage."""
+
+    __slots__ = ("id", "url", "title", "text", "query", "round")
+
+    def __init__(self, url: str, title: str, text: str, query: str, round: int) -> None:
+        self.id: str = hashlib.sha1(" ".join(tokenize(text)).encode()).hexdigest()[:16]
+        self.url = url
+        self.title = title
+        self.text = text
+        self.query = query
+        self.round = round
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"url": self.url, "title": self.title, "text": self.text, "query": self.query, "round": self.round}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Passage":
+        return cls(data["url"], data.get("title", ""), data["text"], data.get("query", ""), data.get("round", 0))
+
+
+class BM25:
+    """Okapi BM25 over tokenized documents, small enough to rebuild for every round."""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.frequencies: List[Counter[str]] = [Counter(document) for document in documents]
+        self.lengths: List[int] = [len(document) for document in documents]
+        self.average_length: float = sum(self.lengths) / len(documents) if documents else 0.0
+        document_frequency: Counter[str] = Counter(word for document in documents for word in set(document))
+        self.idf: Dict[str, float] = {
+            word: math.log(1 + (len(documents) - count + 0.5) / (count + 0.5)) for word, count in document_frequency.items()
+        }
+
+    def scores(self, query: List[str]) -> List[float]:
+        scores: List[float] = []
+        for frequencies, length in zip(self.frequencies, self.lengths):
+            score: float = 0.0
+            for word in query:
+                frequency: int = frequencies.get(word, 0)
+                if frequency:
+                    norm: float = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+                    score += self.idf[word] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+class EvidenceStore:
+    """
+    The search evidence of one reflexion run, rebuilt from the ToolMessages of the state.
+
+    Search results are split into passages and deduplicated across rounds, by URL and by the
+    hash of their text, so a page fetched again in a later round adds nothing. Every round the
+    passages not yet shown are ranked with BM25 against the critique of what is missing
+    (Reflection.missing) and the new search queries, and only the best ones that fit the token
+    budget go into the ToolMessage. The whole pool travels in the ToolMessage artifact, which is
+    kept in the state but never sent to the LLM, so a passage skipped now can still be picked
+    when a later critique asks for it.
+    """
+
+    def __init__(self, passage_chars: int = 600) -> None:
+        self.passage_chars = passage_chars
+        self.passages: Dict[str, Passage] = {}
+        self.urls: set[str] = set()
+        self.shown: set[str] = set()
+        self.round: int = 0
+        self.duplicates: int = 0
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[BaseMessage], passage_chars: int = 600) -> "EvidenceStore":
+        store = cls(passage_chars)
+        for message in messages:
+            artifact: Any = message.artifact if isinstance(message, ToolMessage) else None
+            if not isinstance(artifact, dict) or "evidence" not in artifact:
+                continue
+            for data in artifact["evidence"]:
+                passage: Passage = Passage.from_dict(data)
+                store.passages[passage.id] = passage
+                store.urls.add(normalize_url(passage.url))
+            store.shown.update(artifact.get("shown", []))
+            store.round = max(store.round, artifact.get("round", 0))
+        return store
+
+    def add_results(self, query: str, results: Dict[str, Any]) -> List[Passage]:
+        """Add the Tavily response of a query, returns its new passages."""
+        added: List[Passage] = []
+        for result in results.get("results") or []:
+            url: str = normalize_url(str(result.get("url", "")))
+            if url in self.urls:
+                self.duplicates += 1
+                continue
+            self.urls.add(url)
+            for text in split_passages(str(result.get("content") or ""), self.passage_chars):
+                passage = Passage(str(result.get("url", "")), str(result.get("title", "")), text, query, self.round)
+                if passage.id in self.passages:
+                    self.duplicates += 1
+                    continue
+                self.passages[passage.id] = passage
+                added.append(passage)
+        return added
+
+    def select(self, critique: str, queries: List[str], top_k: int, token_budget: int) -> List[Passage]:
+        """The best `top_k` passages not shown yet that fit in `token_budget`, they are marked as shown."""
+        candidates: List[Passage] = [passage for passage in self.passages.values() if passage.id not in self.shown]
+        if not candidates:
+            return []
+        query: List[str] = tokenize(" ".join([critique, *queries]))
+        scores: List[float] = BM25([tokenize(f"{passage.title} {passage.text}") for passage in candidates]).scores(query)
+        # Ties (eg. an empty critique) go to the newest passages.
+        ranked: List[Passage] = [
+            passage for _, _, passage in sorted(
+                zip(scores, (passage.round for passage in candidates), candidates), key = lambda item: (item[0], item[1]), reverse = True
+            )
+        ]
+
+        selected: List[Passage] = []
+        used: int = 0
+        for passage in ranked:
+            tokens: int = approximate_tokens(passage.text) + 20 # The title and URL line.
+            if used + tokens > token_budget:
+                continue
+            selected.append(passage)
+            used += tokens
+            if len(selected) >= top_k:
+                break
+        self.shown.update(passage.id for passage in selected)
+        return selected
+
+    def artifact(self, added: List[Passage], selected: List[Passage]) -> Dict[str, Any]:
+        return {
+            "round": self.round,
+            "evidence": [passage.to_dict() for passage in added],
+            "shown": [passage.id for passage in selected],
+        }
+
+
+def render_evidence(passages: List[Passage], errors: Dict[str, str], duplicates: int) -> str:
+    """The ToolMessage content: numbered passages with their URL, to be cited by the revisor."""
+    lines: List[str] = [f"[{number}] {passage.title} ({passage.url})\n{passage.text}" for number, passage in enumerate(passages, 1)]
+    lines.extend(f"Search for '{query}' failed: {error}" for query, error in errors.items())
+    if not passages and not errors:
+        # With a failed search the error lines above already say why nothing new came back.
+        lines.append(
+            "No new evidence, the results repeat the sources already given above." if duplicates
+            else "No new evidence, the searches returned no results."
+        )
+    elif duplicates:
+        lines.append(f"({duplicates} results repeating earlier sources were left out.)")
+    return "\n\n".join(lines)
+
+
+def build_evidence_messages(
+    messages: List[BaseMessage],
+    tool_calls: List[dict],
+    results: Dict[str, Dict[str, Any]],
+    top_k: int = 6,
+    token_budget: int = 1500,
+    passage_chars: int = 600
+) -> List[ToolMessage]:
+    """One ToolMessage per tool call with the evidence selected for its critique, in the original tool call order."""
+    store: EvidenceStore = EvidenceStore.from_messages(messages, passage_chars)
+    store.round += 1
+
+    tool_messages: List[ToolMessage] = []
+    for tool_call in tool_calls:
+        queries: List[str] = tool_call["args"].get("search_queries", [])
+        reflection: Any = tool_call["args"].get("reflection") or {}
+        critique: str = str(reflection.get("missing", "") if isinstance(reflection, dict) else reflection)
+
+        duplicates_before: int = store.duplicates
+        added: List[Passage] = []
+        errors: Dict[str, str] = {}
+        for query in queries:
+            result: Dict[str, Any] = results.get(query) or {}
+            if "error" in result:
+                errors[query] = str(result["error"])
+            added.extend(store.add_results(query, result))
+
+        selected: List[Passage] = store.select(critique, queries, top_k, token_budget)
+        tool_messages.append(
+            ToolMessage(
+                content = render_evidence(selected, errors, store.duplicates - duplicates_before),
+                artifact = store.artifact(added, selected),
+                tool_call_id = tool_call["id"]
+            )
+        )
+    return tool_messages
@@ -1,9 +1,20 @@
 from langgraph.graph import MessageGraph, END
-from typing import List
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from chains import responder_chain, revisor_chain
-from tool_executor import execute_tool
-from models import ReviseAnswer
+from typing import List, Type
+from functools import lru_cache
+from langchain_core.callbacks.manager import adispatch_custom_event, dispatch_custom_event
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, message_chunk_to_message
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+from chains import get_responder_chain, get_revisor_chain, get_structured_output
+from config import get_settings
+from tool_executor import execute_tool, aexecute_tool
+from stopping import (
+    AnswerConverged, AnyOf, EmptyCritique, LatencyBudget, LoopState, StoppingPolicy, StoppingStats, TokenBudget
+)
+from models import AnswerQuestion, ReviseAnswer
+from structured_output import ToolCallStream
+from instrumentation import instrumented_config
+import time
 
 
 RESPONDER = "responder"
@@ -11,48 +22,135 @@ REVISOR =  "revisor"
 TOOLS_EXECUTOR = "tools_executor"
 
 
+# How the runs of this process stopped, and how many revisions the early stops saved.
+stopping_stats = StoppingStats()
 
-def responder_node(state: List[BaseMessage]) -> List[BaseMessage]:
-    return responder_chain.invoke({"messages": state})
 
+@lru_cache(maxsize = None)
+def get_stopping_policy() -> AnyOf:
+    settings = get_settings()
+    policies: List[StoppingPolicy] = []
+    if settings.stop_on_empty_critique:
+        policies.append(EmptyCritique())
+    if settings.stop_min_answer_change is not None:
+        policies.append(AnswerConverged(settings.stop_min_answer_change))
+    if settings.stop_token_budget is not None:
+        policies.append(TokenBudget(settings.stop_token_budget))
+    if settings.stop_latency_budget_seconds is not None:
+        policies.append(LatencyBudget(settings.stop_latency_budget_seconds))
+    return AnyOf(policies, max_iterations = settings.max_iterations)
 
-def revisor_node(state: List[BaseMessage]) -> List[BaseMessage]:
-    return revisor_chain.invoke({"messages": state})
+
+def _stamp_latency(message: AIMessage, started_at: float) -> AIMessage:
+    """Record when the LLM call started and how long it took, the latency budget reads them back."""
+    message.response_metadata["started_at"] = started_at
+    message.response_metadata["latency_seconds"] = round(time.time() - started_at, 3)
+    return message
+
+
+def _stream_answer(chain: Runnable, schema: Type[BaseModel], state: List[BaseMessage], config: RunnableConfig) -> AIMessage:
+    """Stream the chain, publishing the arguments parsed so far as "partial_answer" events (astream_events)."""
+    stream = ToolCallStream()
+    for chunk in chain.stream({"messages": state}):
+        # The events need the run of the graph, a node called directly has no callbacks to send them to.
+        if (partial_args := stream.add(chunk)) and config.get("callbacks"):
+            dispatch_custom_event("partial_answer", {"schema": schema.__name__, "args": partial_args}, config = config)
+    return get_structured_output(schema).ensure(message_chunk_to_message(stream.message), state, stream.args(schema.__name__))
+
+
+async def _astream_answer(chain: Runnable, schema: Type[BaseModel], state: List[BaseMessage], config: RunnableConfig) -> AIMessage:
+    stream = ToolCallStream()
+    async for chunk in chain.astream({"messages": state}):
+        if (partial_args := stream.add(chunk)) and config.get("callbacks"):
+            await adispatch_custom_event("partial_answer", {"schema": schema.__name__, "args": partial_args}, config = config)
+    return await get_structured_output(schema).aensure(message_chunk_to_message(stream.message), state, stream.args(schema.__name__))
+
+
+def _streaming() -> bool:
+    # A streamed call skips the LLM cache, the cached replays keep the plain invoke.
+    settings = get_settings()
+    return settings.structured_output_streaming and not settings.llm_cache
+
+
+def _answer(chain: Runnable, schema: Type[BaseModel], state: List[BaseMessage], config: RunnableConfig) -> AIMessage:
+    if _streaming():
+        return _stream_answer(chain, schema, state, config)
+    return get_structured_output(schema).ensure(chain.invoke({"messages": state}), state)
+
+
+async def _aanswer(chain: Runnable, schema: Type[BaseModel], state: List[BaseMessage], config: RunnableConfig) -> AIMessage:
+    if _streaming():
+        return await _astream_answer(chain, schema, state, config)
+    return await get_structured_output(schema).aensure(await chain.ainvoke({"messages": state}), state)
+
+
+def responder_node(state: List[BaseMessage], config: RunnableConfig) -> List[BaseMessage]:
+    started_at: float = time.time()
+    return _stamp_latency(_answer(get_responder_chain(), AnswerQuestion, state, config), started_at)
+
+
+def revisor_node(state: List[BaseMessage], config: RunnableConfig) -> List[BaseMessage]:
+    started_at: float = time.time()
+    return _stamp_latency(_answer(get_revisor_chain(), ReviseAnswer, state, config), started_at)
+
+
+async def aresponder_node(state: List[BaseMessage], config: RunnableConfig) -> List[BaseMessage]:
+    started_at: float = time.time()
+    return _stamp_latency(await _aanswer(get_responder_chain(), AnswerQuestion, state, config), started_at)
+
+
+async def arevisor_node(state: List[BaseMessage], config: RunnableConfig) -> List[BaseMessage]:
+    started_at: float = time.time()
+    return _stamp_latency(await _aanswer(get_revisor_chain(), ReviseAnswer, state, config), started_at)
 
 
 def should_continue(state: List[BaseMessage]) -> str:
-    if len(state) > 3:
-        return END
-    return REVISOR
+    """
+    After the first answer and after each revision, search and revise (once more) unless the
+    stopping policy says the answer is done: a first answer without critique skips the revision.
+    """
+    policy: AnyOf = get_stopping_policy()
+    loop_state: LoopState = LoopState(state)
+    reason: str | None = policy.should_stop(loop_state)
+    if reason is None:
+        return TOOLS_EXECUTOR
+
+    stopping_stats.record(loop_state.iterations, reason)
+    return END
 
 
 # Graph Building.
 graph_builder = MessageGraph()
 
-graph_builder.add_node(RESPONDER, responder_node)
-graph_builder.add_node(TOOLS_EXECUTOR, execute_tool)
-graph_builder.add_node(REVISOR, revisor_node)
+graph_builder.add_node(RESPONDER, RunnableLambda(responder_node, afunc = aresponder_node, name = RESPONDER))
+graph_builder.add_node(TOOLS_EXECUTOR, RunnableLambda(execute_tool, afunc = aexecute_tool, name = TOOLS_EXECUTOR))
+graph_builder.add_node(REVISOR, RunnableLambda(revisor_node, afunc = arevisor_node, name = REVISOR))
 
 graph_builder.set_entry_point(RESPONDER)
-graph_builder.add_edge(RESPONDER, TOOLS_EXECUTOR)
+graph_builder.add_conditional_edges(RESPONDER, should_continue, path_map = {TOOLS_EXECUTOR: TOOLS_EXECUTOR, END: END})
 graph_builder.add_edge(TOOLS_EXECUTOR, REVISOR)
-graph_builder.add_conditional_edges(REVISOR, should_continue, path_map = {RESPONDER: RESPONDER, END: END})
+graph_builder.add_conditional_edges(REVISOR, should_continue, path_map = {TOOLS_EXECUTOR: TOOLS_EXECUTOR, END: END})
 
 graph = graph_builder.compile()
 
 
 if __name__ == "__main__":
     
+    run_config, run_metrics = instrumented_config(None, "reflexion", get_settings().instrumentation)
     tweet = graph.invoke(
         [
             HumanMessage(content = "Write a LinkedIn blog post in the topic of **Python for AI Agents**.")
-        ]
+        ],
+        config = run_config
     )
     print(f"All response contains {len(tweet)} BaseMessage those are:\n{tweet}", end = "\n\n\n")
 
     last_response: AIMessage = tweet[-1]
 
     print(f"Final Response: {last_response}", end = "\n\n\n")
+    print(f"Stopping: {stopping_stats.stats}", end = "\n\n\n")
+    if run_metrics:
+        print(run_metrics.summary(), end = "\n\n\n")
 
     try:
         
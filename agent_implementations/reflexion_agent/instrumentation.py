@@ -0,0 +1,270 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+import bisect
+import threading
+import time
+
+
+# USD per million (input, output) tokens, list prices used for the cost estimate.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "ibm/granite-3-3-8b-instruct": (0.20, 0.20),
+}
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.counts: List[int] = [0] * len(self.buckets)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        index: int = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Process wide counters and histograms, rendered in the Prometheus text format by `render_prometheus`."""
+
+    HELP: Dict[str, str] = {
+        "agent_node_duration_seconds": "Wall time of a graph node.",
+        "agent_node_errors_total": "Graph node runs that raised.",
+        "agent_llm_duration_seconds": "Wall time of an LLM call.",
+        "agent_llm_tokens_total": "LLM tokens, by node and type (prompt or completion).",
+        "agent_llm_cost_usd_total": "Estimated LLM cost from MODEL_PRICES.",
+        "agent_tool_calls_total": "Tool calls, by tool and status.",
+        "agent_tool_duration_seconds": "Wall time of a tool call.",
+    }
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1) -> None:
+        key: Labels = tuple(sorted(labels.items()))
+        with self._lock:
+            series: Dict[Labels, float] = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        key: Labels = tuple(sorted(labels.items()))
+        with self._lock:
+            self.histograms.setdefault(name, {}).setdefault(key, Histogram()).observe(value)
+
+    @staticmethod
+    def _labels(labels: Labels, extra: Labels = ()) -> str:
+        pairs: List[str] = [f'{name}="{_escape(value)}"' for name, value in (*labels, *extra)]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines += [f"# HELP {name} {self.HELP.get(name, name)}", f"# TYPE {name} counter"]
+                lines += [f"{name}{self._labels(labels)} {value}" for labels, value in sorted(series.items())]
+
+            for name, series in sorted(self.histograms.items()):
+                lines += [f"# HELP {name} {self.HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(series.items()):
+                    cumulative: int = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._labels(labels, (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model.removeprefix("models/"), (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class RunMetrics(BaseCallbackHandler):
+    """
+    Callback that times the graph nodes, LLM calls and tool calls of the runs it is attached to.
+
+    Every measurement goes to the process wide `registry` (exported at /metrics) and to this
+    object's own summary, printed by CLI entry points after a run. One instance can be shared by
+    many concurrent runs, eg. a whole batch. Attach it with `instrumented_config`.
+    """
+
+    run_inline: bool = True # Called on the event loop thread, no executor hop per event.
+
+    def __init__(self, graph: str, metrics: MetricsRegistry = registry) -> None:
+        self.graph = graph
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, Tuple[str, str, float]] = {} # run id -> (kind, name, started at)
+        self._llm_runs: Dict[UUID, Tuple[str, str]] = {} # run id -> (node, model)
+
+        self.nodes: Dict[str, Dict[str, float]] = {}
+        self.tools: Dict[str, Dict[str, float]] = {}
+        self.llm: Dict[str, float] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+    def _start(self, run_id: UUID, kind: str, name: str) -> None:
+        with self._lock:
+            self._started[run_id] = (kind, name, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> Tuple[str | None, str, float]:
+        with self._lock:
+            kind, name, started_at = self._started.pop(run_id, (None, "", 0.0))
+        return kind, name, time.perf_counter() - started_at
+
+    def _add(self, table: Dict[str, Dict[str, float]], name: str, **values: float) -> None:
+        with self._lock:
+            row: Dict[str, float] = table.setdefault(name, {"calls": 0, "errors": 0, "seconds": 0.0})
+            for key, value in values.items():
+                row[key] = row.get(key, 0) + value
+
+    # Graph nodes, the chain runs tagged with a graph step (not the runnables nested inside a node).
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        tags: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        if any(tag.startswith("graph:step:") for tag in tags or []):
+            self._start(run_id, "node", (metadata or {}).get("langgraph_node") or kwargs.get("name") or "unknown")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        kind, node, seconds = self._finish(run_id)
+        if kind == "node":
+            self.metrics.observe("agent_node_duration_seconds", {"graph": self.graph, "node": node}, seconds)
+            self._add(self.nodes, node, calls = 1, seconds = seconds)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        kind, node, seconds = self._finish(run_id)
+        if kind == "node":
+            self.metrics.inc("agent_node_errors_total", {"graph": self.graph, "node": node, "error": type(error).__name__})
+            self.metrics.observe("agent_node_duration_seconds", {"graph": self.graph, "node": node}, seconds)
+            self._add(self.nodes, node, calls = 1, errors = 1, seconds = seconds)
+
+    # LLM calls, attributed to the node they run in.
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        metadata = metadata or {}
+        if metadata.get("ls_provider") == "router":
+            return # A RouterChatModel, the provider call nested in it is measured instead.
+        with self._lock:
+            self._llm_runs[run_id] = (metadata.get("langgraph_node", "none"), str(metadata.get("ls_model_name", "unknown")))
+        self._start(run_id, "llm", "")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        _, _, seconds = self._finish(run_id)
+        with self._lock:
+            if run_id not in self._llm_runs:
+                return
+            node, model = self._llm_runs.pop(run_id)
+
+        prompt_tokens: int = 0
+        completion_tokens: int = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage: Dict[str, Any] = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        cost: float = llm_cost(model, prompt_tokens, completion_tokens)
+
+        labels: Dict[str, str] = {"graph": self.graph, "node": node, "model": model}
+        self.metrics.observe("agent_llm_duration_seconds", labels, seconds)
+        self.metrics.inc("agent_llm_tokens_total", {**labels, "type": "prompt"}, prompt_tokens)
+        self.metrics.inc("agent_llm_tokens_total", {**labels, "type": "completion"}, completion_tokens)
+        self.metrics.inc("agent_llm_cost_usd_total", labels, cost)
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["prompt_tokens"] += prompt_tokens
+            self.llm["completion_tokens"] += completion_tokens
+            self.llm["cost_usd"] += cost
+        self._add(self.nodes, node, prompt_tokens = prompt_tokens, completion_tokens = completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+        with self._lock:
+            self._llm_runs.pop(run_id, None)
+
+    # Tool calls.
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name") or "unknown")
+
+    def _tool_done(self, run_id: UUID, status: str) -> None:
+        kind, tool, seconds = self._finish(run_id)
+        if kind != "tool":
+            return
+        self.metrics.inc("agent_tool_calls_total", {"graph": self.graph, "tool": tool, "status": status})
+        self.metrics.observe("agent_tool_duration_seconds", {"graph": self.graph, "tool": tool}, seconds)
+        self._add(self.tools, tool, calls = 1, errors = int(status == "error"), seconds = seconds)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._tool_done(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._tool_done(run_id, "error")
+
+    def summary(self) -> str:
+        """Per node and per tool table of this run, for CLI entry points."""
+        lines: List[str] = [f"{'node':<24}{'calls':>7}{'errors':>8}{'seconds':>10}{'prompt tok':>12}{'compl. tok':>12}"]
+        for node, row in self.nodes.items():
+            lines.append(
+                f"{node:<24}{int(row['calls']):>7}{int(row['errors']):>8}{row['seconds']:>10.3f}"
+                f"{int(row.get('prompt_tokens', 0)):>12}{int(row.get('completion_tokens', 0)):>12}"
+            )
+        for tool, row in self.tools.items():
+            lines.append(f"{'tool ' + tool:<24}{int(row['calls']):>7}{int(row['errors']):>8}{row['seconds']:>10.3f}")
+        lines.append(
+            f"LLM calls: {int(self.llm['calls'])}, tokens: {int(self.llm['prompt_tokens'])} prompt + "
+            f"{int(self.llm['completion_tokens'])} completion, estimated cost: ${self.llm['cost_usd']:.5f}"
+        )
+        return "\n".join(lines)
+
+
+def instrumented_config(
+    config: Optional[Dict[str, Any]],
+    graph: str,
+    enabled: bool,
+    run_metrics: Optional[RunMetrics] = None
+) -> Tuple[Dict[str, Any], Optional[RunMetrics]]:
+    """
+    Add a RunMetrics callback to a run config. Disabled, the config is returned untouched and
+    nothing is attached, so the graphs run exactly as without instrumentation.
+    """
+    config = dict(config or {})
+    if not enabled:
+        return config, None
+    run_metrics = run_metrics or RunMetrics(graph)
+    config["callbacks"] = [*(config.get("callbacks") or []), run_metrics]
+    return config, run_metrics
@@ -0,0 +1,181 @@
+from typing import Any, Dict, Iterable, List, Optional
+from collections import Counter
+from difflib import SequenceMatcher
+from langchain_core.messages import AIMessage, BaseMessage
+import re
+import threading
+import time
+
+
+# Critiques that mean "nothing is missing", compared after lower casing and stripping punctuation.
+TRIVIAL_CRITIQUES: set[str] = {
+    "", "none", "n a", "na", "nil", "nothing", "no", "nothing is missing", "nothing missing",
+    "nothing significant", "nothing major", "nothing important", "nothing else", "no gaps", "none identified"
+}
+
+
+# Revisions per run of the original graph, which always revised exactly once.
+BASELINE_ITERATIONS: int = 1
+
+
+class LoopState:
+    """What the stopping policies look at, derived from the messages of a reflexion run."""
+
+    def __init__(self, messages: List[BaseMessage]) -> None:
+        self.messages = messages
+        self.ai_messages: List[AIMessage] = [
+            message for message in messages if isinstance(message, AIMessage) and message.tool_calls
+        ]
+
+    @property
+    def iterations(self) -> int:
+        """Number of revisions so far, the first AIMessage is the responder's answer."""
+        return max(len(self.ai_messages) - 1, 0)
+
+    def answer_args(self, index: int) -> Dict[str, Any]:
+        return self.ai_messages[index].tool_calls[0]["args"] if len(self.ai_messages) >= abs(index) else {}
+
+    @property
+    def answer(self) -> str:
+        return str(self.answer_args(-1).get("answer", ""))
+
+    @property
+    def previous_answer(self) -> str:
+        return str(self.answer_args(-2).get("answer", "")) if len(self.ai_messages) > 1 else ""
+
+    @property
+    def missing(self) -> str:
+        reflection: Any = self.answer_args(-1).get("reflection") or {}
+        return str(reflection.get("missing", "") if isinstance(reflection, dict) else reflection)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum((message.usage_metadata or {}).get("total_tokens", 0) for message in self.ai_messages)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Wall time since the responder started, from the `started_at` stamped by the graph nodes."""
+        started_at: Optional[float] = (
+            self.ai_messages[0].response_metadata.get("started_at") if self.ai_messages else None
+        )
+        return time.time() - started_at if started_at else 0.0
+
+
+class StoppingPolicy:
+    """Decides after each revision whether the reflexion loop should stop. Returns the reason, or None to go on."""
+
+    name: str = "policy"
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        raise NotImplementedError
+
+
+class MaxIterations(StoppingPolicy):
+    name = "max_iterations"
+
+    def __init__(self, max_iterations: int = 1) -> None:
+        self.max_iterations = max_iterations
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        return self.name if state.iterations >= self.max_iterations else None
+
+
+class EmptyCritique(StoppingPolicy):
+    """Stop when the latest reflection finds nothing missing."""
+
+    name = "empty_critique"
+
+    def __init__(self, trivial: Iterable[str] = TRIVIAL_CRITIQUES) -> None:
+        self.trivial: set[str] = set(trivial)
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        critique: str = " ".join(re.findall(r"[a-z0-9]+", state.missing.casefold()))
+        return self.name if critique in self.trivial else None
+
+
+class AnswerConverged(StoppingPolicy):
+    """Stop when a revision changed less than `min_change` (0 to 1) of the previous answer."""
+
+    name = "answer_converged"
+
+    def __init__(self, min_change: float = 0.05) -> None:
+        self.min_change = min_change
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        if state.iterations < 1:
+            return None
+        change: float = 1 - SequenceMatcher(None, state.previous_answer, state.answer, autojunk = False).ratio()
+        return self.name if change < self.min_change else None
+
+
+class TokenBudget(StoppingPolicy):
+    name = "token_budget"
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        return self.name if state.total_tokens >= self.max_tokens else None
+
+
+class LatencyBudget(StoppingPolicy):
+    name = "latency_budget"
+
+    def __init__(self, max_seconds: float) -> None:
+        self.max_seconds = max_seconds
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        return self.name if state.elapsed_seconds >= self.max_seconds else None
+
+
+class AnyOf(StoppingPolicy):
+    """
+    Stops as soon as one of the policies does. The quality policies are checked first, so a run
+    they stop is credited to them, and `max_iterations` is the fallback that is always enforced.
+    """
+
+    name = "any_of"
+
+    def __init__(self, policies: Iterable[StoppingPolicy], max_iterations: int = 1) -> None:
+        self.max_iterations = max_iterations
+        self.policies: List[StoppingPolicy] = [*policies, MaxIterations(max_iterations)]
+
+    def should_stop(self, state: LoopState) -> Optional[str]:
+        for policy in self.policies:
+            if (reason := policy.should_stop(state)) is not None:
+                return reason
+        return None
+
+
+class StoppingStats:
+    """
+    Counts how the reflexion runs stopped, and the revisions saved or added against the single
+    revision of the original graph (`BASELINE_ITERATIONS`), not against `max_iterations`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.runs: int = 0
+        self.iterations: int = 0
+        self.iterations_saved: int = 0
+        self.iterations_added: int = 0
+        self.reasons: Counter[str] = Counter()
+
+    def record(self, iterations: int, reason: str) -> None:
+        with self._lock:
+            self.runs += 1
+            self.iterations += iterations
+            self.iterations_saved += max(BASELINE_ITERATIONS - iterations, 0)
+            self.iterations_added += max(iterations - BASELINE_ITERATIONS, 0)
+            self.reasons[reason] += 1
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "iterations": self.iterations,
+                "iterations_saved": self.iterations_saved,
+                "iterations_added": self.iterations_added,
+                "reasons": dict(self.reasons)
+            }
@@ -0,0 +1,396 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+from collections import Counter
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from pydantic import BaseModel, ValidationError, create_model
+import json
+import re
+import threading
+import uuid
+
+
+# Prefixes of the JSON literals, completed when the text stops in the middle of one.
+LITERALS: Dict[str, str] = {
+    literal[:length]: literal for literal in ("true", "false", "null") for length in range(1, len(literal) + 1)
+}
+PARTIAL_NUMBER = re.compile(r"[-+.eE]+$")
+PARTIAL_ESCAPE = re.compile(r"(\\+)(u[0-9a-fA-F]{0,3})?$")
+PARTIAL_LITERAL = re.compile(r"[a-z]+$")
+
+REASK_TEMPLATE: str = (
+    "Your previous answer was cut off or did not match the schema. These fields are already done:\n{done}\n\n"
+    "Call {tool} with ONLY the missing fields: {fields}. Keep them consistent with the fields above."
+)
+
+
+class _Container:
+    """An open object or array of the IncrementalJSONParser, with where its current member starts."""
+
+    __slots__ = ("char", "member_start", "value_start")
+
+    def __init__(self, char: str, member_start: int) -> None:
+        self.char = char
+        self.member_start = member_start # Offset in the output of the current key (object) or item (array).
+        self.value_start: Optional[int] = None # Offset after the ':' of the current object member.
+
+
+class IncrementalJSONParser:
+    """
+    Tolerant JSON parser fed with the fragments of a streamed tool call.
+
+    `feed` scans only the new characters, keeping the open containers and the string state, and
+    drops the defects it can fix on the way: text around the JSON (prose, markdown fences) and
+    trailing commas. `value` closes whatever is still open (an unterminated string, a half written
+    literal or number, a key without value, missing closing braces) and parses the result, so the
+    arguments can be read while they stream, and a truncated payload still yields every complete field.
+    """
+
+    def __init__(self) -> None:
+        self._out: List[str] = []
+        self._stack: List[_Container] = []
+        self._in_string: bool = False
+        self._escape: bool = False
+        self._started: bool = False
+        self._done: bool = False
+        self.repaired: bool = False # True once a defect had to be fixed.
+
+    def _last_significant(self) -> int:
+        index: int = len(self._out) - 1
+        while index >= 0 and self._out[index].isspace():
+            index -= 1
+        return index
+
+    def feed(self, text: str) -> None:
+        for char in text:
+            if self._done:
+                self.repaired = self.repaired or not char.isspace()
+                continue
+            if not self._started:
+                if char not in "{[":
+                    self.repaired = self.repaired or not char.isspace()
+                    continue
+                self._started = True
+
+            if self._in_string:
+                self._out.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char in "}]":
+                if not self._stack:
+                    continue
+                last: int = self._last_significant()
+                if last >= 0 and self._out[last] == ",":
+                    del self._out[last] # Trailing comma.
+                    self.repaired = True
+                # A bracket that does not match closes the container that is actually open.
+                self.repaired = self.repaired or char != ("}" if self._stack[-1].char == "{" else "]")
+                self._out.append("}" if self._stack.pop().char == "{" else "]")
+                self._done = not self._stack
+                continue
+
+            self._out.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(_Container(char, len(self._out)))
+            elif self._stack and char == ",":
+                self._stack[-1].member_start = len(self._out)
+                self._stack[-1].value_start = None
+            elif self._stack and char == ":":
+                self._stack[-1].value_start = len(self._out)
+
+    def text(self) -> str:
+        """The JSON fed so far, with every open string and container closed."""
+        if not self._started:
+            return ""
+        out: str = "".join(self._out)
+        container: Optional[_Container] = self._stack[-1] if self._stack else None
+
+        if self._in_string:
+            escape: Optional[re.Match] = PARTIAL_ESCAPE.search(out)
+            if escape and len(escape.group(1)) % 2 == 1:
+                out = out[:escape.end(1) - 1] # A backslash or \u escape cut short.
+            if container and container.char == "{" and container.value_start is None:
+                out = out[:container.member_start] # A key cut short, drop the member.
+            else:
+                out += '"'
+        elif container:
+            out = out.rstrip()
+            literal: Optional[re.Match] = PARTIAL_LITERAL.search(out)
+            if literal and literal.group() in LITERALS:
+                out = out[:literal.start()] + LITERALS[literal.group()]
+            else:
+                out = PARTIAL_NUMBER.sub("", out) if out and not out.endswith(("}", "]", '"')) else out
+            if container.char == "{" and (
+                container.value_start is None or not out[container.value_start:].strip()
+            ):
+                out = out[:container.member_start] # A key without its value.
+
+        if self._stack:
+            out = out.rstrip().removesuffix(",")
+            out += "".join("}" if open_container.char == "{" else "]" for open_container in reversed(self._stack))
+        return out
+
+    @property
+    def complete(self) -> bool:
+        """Whether the root value was closed by the stream itself."""
+        return self._done
+
+    def complete_fields(self) -> Dict[str, Any]:
+        """
+        The members of the root object the stream finished. The member it stopped in is left out,
+        a string or list cut short still parses but is not the value the model meant.
+        """
+        value: Any | None = self.value()
+        if not isinstance(value, dict):
+            return {}
+        root: Optional[_Container] = self._stack[0] if self._stack else None
+        if value and root and root.char == "{" and root.value_start is not None and "".join(self._out[root.value_start:]).strip():
+            value.pop(next(reversed(value)))
+        return value
+
+    def value(self) -> Any | None:
+        """The parsed value fed so far, None before the first brace or when it cannot be repaired."""
+        text: str = self.text()
+        if not text:
+            return None
+        try:
+            return json.loads(text, strict = False) # strict = False accepts raw newlines in strings.
+        except ValueError:
+            return None
+
+
+def parse_partial_json(text: str) -> Tuple[Any | None, bool]:
+    """Parse possibly truncated or malformed JSON. Returns the value (None when hopeless) and whether it needed repair."""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    value: Any | None = parser.value()
+    return value, parser.repaired or not parser.complete
+
+
+def parse_partial_object(text: str) -> Tuple[Dict[str, Any], bool]:
+    """The complete members of a possibly truncated or malformed JSON object, and whether it needed repair."""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.complete_fields(), parser.repaired or not parser.complete
+
+
+class ToolCallStream:
+    """
+    Follows the tool calls of a streamed AIMessage: every AIMessageChunk is added to the message
+    and its argument fragments are fed to one IncrementalJSONParser per tool call.
+    """
+
+    def __init__(self) -> None:
+        self.message: Optional[AIMessage] = None
+        self.parsers: Dict[int, IncrementalJSONParser] = {}
+        self.names: Dict[int, str] = {}
+
+    @staticmethod
+    def _fragments(chunk: AIMessage) -> List[Tuple[int, Optional[str], str]]:
+        if isinstance(chunk, AIMessageChunk):
+            return [
+                (tool_call_chunk.get("index") or 0, tool_call_chunk.get("name"), tool_call_chunk.get("args") or "")
+                for tool_call_chunk in chunk.tool_call_chunks
+            ]
+        # A model without streaming yields its whole AIMessage at once.
+        return [
+            *((index, tool_call["name"], json.dumps(tool_call["args"])) for index, tool_call in enumerate(chunk.tool_calls)),
+            *((len(chunk.tool_calls) + index, invalid.get("name"), invalid.get("args") or "") for index, invalid in enumerate(chunk.invalid_tool_calls)),
+        ]
+
+    def add(self, chunk: AIMessage) -> Dict[str, Any]:
+        """Add a chunk, returns the arguments parsed so far of the tool call it belongs to."""
+        self.message = chunk if self.message is None else self.message + chunk
+        latest: Any = None
+        for index, name, args in self._fragments(chunk):
+            parser: IncrementalJSONParser = self.parsers.setdefault(index, IncrementalJSONParser())
+            if name:
+                self.names[index] = name
+            parser.feed(args)
+            latest = parser.value()
+        return latest if isinstance(latest, dict) else {}
+
+    def args(self, name: str) -> Tuple[Dict[str, Any], bool] | None:
+        """The final arguments of the first tool call named `name`, and whether they needed repair."""
+        for index, parser in sorted(self.parsers.items()):
+            if self.names.get(index) == name:
+                return parser.complete_fields(), parser.repaired or not parser.complete
+        return None
+
+
+class StructuredOutputStats:
+    """Counts the answers that needed repair, the follow-up LLM calls and the fields they asked for."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.messages: int = 0
+        self.repaired: int = 0
+        self.reasks: int = 0
+        self.failed: int = 0
+        self.reasked_fields: Counter[str] = Counter()
+
+    def record(self, repaired: bool, reasked_fields: List[List[str]], failed: bool) -> None:
+        with self._lock:
+            self.messages += 1
+            self.repaired += int(repaired)
+            self.reasks += len(reasked_fields)
+            self.failed += int(failed)
+            for fields in reasked_fields:
+                self.reasked_fields.update(fields)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "repaired": self.repaired,
+                "reasks": self.reasks,
+                "failed": self.failed,
+                "reasked_fields": dict(self.reasked_fields)
+            }
+
+
+class StructuredOutput:
+    """
+    Turns the AIMessage of a chain bound to the `schema` tool into one with a valid tool call.
+
+    The arguments are read from the tool call, else from the raw string of an invalid tool call,
+    else from a JSON answer written in the content, and repaired with IncrementalJSONParser.
+    Fields that are missing or fail validation are asked again, with a tool holding only those
+    fields, at most `max_reasks` times. The complete fields are never regenerated.
+    When the fields still cannot be completed the tool call keeps the valid ones, the graph
+    reads the arguments with `.get`, and `stats` counts the failure.
+    """
+
+    def __init__(self, schema: Type[BaseModel], llm: Callable[[], BaseChatModel], max_reasks: int = 1) -> None:
+        self.schema = schema
+        self.llm = llm
+        self.max_reasks = max_reasks
+        self.stats = StructuredOutputStats()
+
+    def _raw_args(self, message: AIMessage) -> Tuple[Dict[str, Any], bool]:
+        for tool_call in message.tool_calls:
+            if tool_call["name"] == self.schema.__name__:
+                return dict(tool_call["args"]), False
+        for invalid_tool_call in message.invalid_tool_calls:
+            if invalid_tool_call.get("name") in (self.schema.__name__, None):
+                return parse_partial_object(invalid_tool_call.get("args") or "")[0], True
+        if isinstance(message.content, str) and message.content.strip():
+            value, _ = parse_partial_object(message.content)
+            if value:
+                return value, True
+        return {}, False
+
+    def validate(self, args: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """Split the arguments into the valid fields and the names of the fields to ask again, in schema order."""
+        try:
+            return self.schema.model_validate(args).model_dump(), []
+        except ValidationError as e:
+            invalid: set[str] = {str(error["loc"][0]) for error in e.errors() if error["loc"]}
+        valid: Dict[str, Any] = {}
+        for name, field in self.schema.model_fields.items():
+            if name in invalid or name not in args:
+                continue
+            try:
+                valid[name] = create_model("Field", **{name: (field.annotation, field)}).model_validate({name: args[name]}).model_dump()[name]
+            except ValidationError:
+                invalid.add(name)
+        missing: List[str] = [
+            name for name, field in self.schema.model_fields.items() if name not in valid and (field.is_required() or name in invalid)
+        ]
+        return valid, missing
+
+    def _missing_fields_tool(self, missing: List[str]) -> Type[BaseModel]:
+        fields: Dict[str, Any] = {name: (self.schema.model_fields[name].annotation, self.schema.model_fields[name]) for name in missing}
+        return create_model(f"{self.schema.__name__}MissingFields", __doc__ = f"The missing fields of {self.schema.__name__}.", **fields)
+
+    def _reask_messages(self, messages: List[BaseMessage], valid: Dict[str, Any], tool: Type[BaseModel]) -> List[BaseMessage]:
+        prompt: str = REASK_TEMPLATE.format(
+            done = json.dumps(valid, ensure_ascii = False), tool = tool.__name__, fields = ", ".join(tool.model_fields)
+        )
+        return [*messages, HumanMessage(content = prompt)]
+
+    def _reask_args(self, reply: AIMessage, tool: Type[BaseModel]) -> Dict[str, Any]:
+        for tool_call in reply.tool_calls:
+            if tool_call["name"] == tool.__name__:
+                return tool_call["args"]
+        return parse_partial_object(
+            next((invalid["args"] or "" for invalid in reply.invalid_tool_calls), "") or str(reply.content)
+        )[0]
+
+    def _merge(self, valid: Dict[str, Any], missing: List[str], reply: AIMessage, tool: Type[BaseModel]) -> Tuple[Dict[str, Any], List[str]]:
+        # Only the fields asked for are taken, the ones already done stay as they were.
+        reply_args: Dict[str, Any] = self._reask_args(reply, tool)
+        return self.validate({**valid, **{name: reply_args[name] for name in missing if name in reply_args}})
+
+    def _result(
+        self,
+        message: AIMessage,
+        args: Dict[str, Any],
+        repaired: bool,
+        reasked: List[List[str]],
+        missing: List[str]
+    ) -> AIMessage:
+        self.stats.record(repaired, reasked, failed = bool(missing))
+        tool_call_id: str = next(
+            (tool_call["id"] for tool_call in [*message.tool_calls, *message.invalid_tool_calls] if tool_call.get("id")),
+            f"call_{uuid.uuid4().hex}"
+        )
+        if not (repaired or reasked):
+            return message
+        return message.model_copy(update = {
+            "tool_calls": [{"name": self.schema.__name__, "args": args, "id": tool_call_id, "type": "tool_call"}],
+            "invalid_tool_calls": [],
+            "response_metadata": {**message.response_metadata, "structured_output": {"repaired": repaired, "reasked": reasked, "missing": missing}},
+        })
+
+    def _start(self, message: AIMessage, args: Optional[Tuple[Dict[str, Any], bool]]) -> Tuple[Dict[str, Any], bool, List[str]]:
+        raw_args, repaired = args if args is not None else self._raw_args(message)
+        valid, missing = self.validate(raw_args)
+        return valid, repaired or bool(missing), missing
+
+    def ensure(
+        self,
+        message: AIMessage,
+        messages: List[BaseMessage],
+        args: Optional[Tuple[Dict[str, Any], bool]] = None
+    ) -> AIMessage:
+        """
+        `messages` is the conversation the message answers, the follow-up calls extend it.
+        `args` are the arguments already parsed from the stream, see ToolCallStream.args.
+        """
+        valid, repaired, missing = self._start(message, args)
+        reasked: List[List[str]] = []
+        while missing and len(reasked) < self.max_reasks:
+            tool: Type[BaseModel] = self._missing_fields_tool(missing)
+            reply: AIMessage = self.llm().bind_tools([tool], tool_choice = tool.__name__).invoke(
+                self._reask_messages(messages, valid, tool)
+            )
+            reasked.append(missing)
+            valid, missing = self._merge(valid, missing, reply, tool)
+        return self._result(message, valid, repaired, reasked, missing)
+
+    async def aensure(
+        self,
+        message: AIMessage,
+        messages: List[BaseMessage],
+        args: Optional[Tuple[Dict[str, Any], bool]] = None
+    ) -> AIMessage:
+        """Async variant of `ensure`."""
+        valid, repaired, missing = self._start(message, args)
+        reasked: List[List[str]] = []
+        while missing and len(reasked) < self.max_reasks:
+            tool: Type[BaseModel] = self._missing_fields_tool(missing)
+            reply: AIMessage = await self.llm().bind_tools([tool], tool_choice = tool.__name__).ainvoke(
+                self._reask_messages(messages, valid, tool)
+            )
+            reasked.append(missing)
+            valid, missing = self._merge(valid, missing, reply, tool)
+        return self._result(message, valid, repaired, reasked, missing)
@@ -0,0 +1,61 @@
+# The agents share module names (config, graph, ...), run the tests of one agent at a time:
+#     python -m pytest reflexion_agent/tests
+from pathlib import Path
+import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+for name in (
+    "TAVILY_API_KEY", "GOOGLE_API_KEY", "PINECONE_API_KEY", "WATSONX_APIKEY", "WATSONX_URL",
+    "WATSONX_PROJECT_ID", "COHERE_API_KEY", "LANGSMITH_API_KEY", "LANGSMITH_ENDPOINT", "LANGSMITH_PROJECT"
+):
+    os.environ.setdefault(name, "test")
+os.environ["LANGSMITH_TRACING"] = "false"
+os.environ["STRUCTURED_OUTPUT_STREAMING"] = "false"
+
+from langchain_core.messages import AIMessage, HumanMessage # noqa: E402
+from langchain_core.runnables import RunnableLambda # noqa: E402
+import graph # noqa: E402
+from stopping import AnyOf, EmptyCritique, LoopState # noqa: E402
+
+
+def first_answer(missing: str) -> AIMessage:
+    return AIMessage(
+        content = "",
+        tool_calls = [{
+            "name": "AnswerQuestion",
+            "args": {
+                "answer": "Python is the language of most AI agent frameworks.",
+                "reflection": {"missing": missing, "superfluous": "Nothing."},
+                "search_queries": ["python ai agent frameworks"],
+            },
+            "id": "call_1",
+        }],
+    )
+
+
+def test_quality_policies_are_checked_before_max_iterations():
+    policy = AnyOf([EmptyCritique()], max_iterations = 1)
+    state = LoopState([HumanMessage(content = "topic"), first_answer("None."), first_answer("None.")])
+    assert policy.should_stop(state) == "empty_critique"
+
+
+def test_a_first_answer_with_critique_goes_to_the_search():
+    assert graph.should_continue([HumanMessage(content = "topic"), first_answer("No sources are cited.")]) == graph.TOOLS_EXECUTOR
+
+
+def test_a_good_first_answer_skips_the_revision(monkeypatch):
+    def revisor(_):
+        raise AssertionError("The revisor must not run.")
+
+    monkeypatch.setattr(graph, "get_responder_chain", lambda: RunnableLambda(lambda _: first_answer("Nothing is missing.")))
+    monkeypatch.setattr(graph, "get_revisor_chain", lambda: RunnableLambda(revisor))
+    runs_before = graph.stopping_stats.runs
+    saved_before = graph.stopping_stats.iterations_saved
+
+    messages = graph.graph.invoke([HumanMessage(content = "Write a post on Python for AI agents.")])
+
+    assert [type(message).__name__ for message in messages] == ["HumanMessage", "AIMessage"]
+    assert graph.stopping_stats.runs == runs_before + 1
+    assert graph.stopping_stats.iterations_saved == saved_before + 1
+    assert graph.stopping_stats.reasons["empty_critique"] >= 1
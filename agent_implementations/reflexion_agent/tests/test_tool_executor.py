@@ -0,0 +1,52 @@
+# The agents share module names (config, graph, ...), run the tests of one agent at a time:
+#     python -m pytest reflexion_agent/tests
+from pathlib import Path
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+for name in (
+    "TAVILY_API_KEY", "GOOGLE_API_KEY", "PINECONE_API_KEY", "WATSONX_APIKEY", "WATSONX_URL",
+    "WATSONX_PROJECT_ID", "COHERE_API_KEY", "LANGSMITH_API_KEY", "LANGSMITH_ENDPOINT", "LANGSMITH_PROJECT"
+):
+    os.environ.setdefault(name, "test")
+os.environ["LANGSMITH_TRACING"] = "false"
+
+from langchain_core.messages import AIMessage, HumanMessage # noqa: E402
+import pytest # noqa: E402
+import tool_executor # noqa: E402
+from config import get_settings # noqa: E402
+
+
+class FakeSearch:
+    """Records how many searches run at the same time."""
+
+    def __init__(self):
+        self.running: int = 0
+        self.most_running: int = 0
+
+    async def ainvoke(self, query: str) -> dict:
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return {"query": query}
+
+
+@pytest.mark.parametrize("parallel_search, most_running", [(True, 3), (False, 1)])
+def test_aexecute_tool_honours_parallel_search(monkeypatch, parallel_search, most_running):
+    search = FakeSearch()
+    monkeypatch.setattr(tool_executor, "get_tavily_search", lambda: search)
+    monkeypatch.setattr(get_settings(), "parallel_search", parallel_search)
+    monkeypatch.setattr(get_settings(), "search_max_concurrency", 4)
+    monkeypatch.setattr(get_settings(), "evidence_store", False)
+    state = [
+        HumanMessage(content = "topic"),
+        AIMessage(content = "", tool_calls = [{"name": "AnswerQuestion", "args": {"search_queries": ["a", "b", "c"]}, "id": "call_1"}]),
+    ]
+
+    messages = asyncio.run(tool_executor.aexecute_tool(state))
+
+    assert search.most_running == most_running
+    assert [message.tool_call_id for message in messages] == ["call_1"]
@@ -1,39 +1,64 @@
 from typing import Any
 from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage, AIMessage
-from langchain_tavily import TavilySearch
-from config import settings
+from langchain_core.tools import BaseTool
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from config import get_settings
+from evidence import build_evidence_messages
+from functools import lru_cache
+import asyncio
+import contextvars
 import json
+import time
 
 
 
-tavily_search = TavilySearch(
-    max_results = 2,
-    tavily_api_key = settings.tavily_api_key
-)
+@lru_cache(maxsize = None)
+def get_tavily_search() -> BaseTool:
+    """The cached Tavily search tool, created on the first search and reused afterwards."""
+    from search_cache import CachedTavilySearch, SearchCache
+    from transport import PooledTavilySearchAPIWrapper
 
-def execute_tool(state: list[BaseMessage]) -> list[BaseMessage]:
+    settings = get_settings()
+    search_cache = SearchCache(
+        path = settings.search_cache_path,
+        ttl_seconds = settings.search_cache_ttl_seconds,
+        max_entries = settings.search_cache_max_entries,
+        memory_entries = settings.search_cache_memory_entries
+    )
 
-    # Get the last AIMessage from the state.
-    last_ai_message: AIMessage = state[-1]
+    return CachedTavilySearch(
+        max_results = 2,
+        api_wrapper = PooledTavilySearchAPIWrapper(tavily_api_key = settings.tavily_api_key),
+        cache = search_cache
+    )
 
-    if (not hasattr(last_ai_message, "tool_calls")) or (not last_ai_message.tool_calls):
-        # if the last LLM call did not use any tools we append empty list.
-        return state + []
-    
+
+def _unique_search_queries(tool_calls: list[dict]) -> list[str]:
+    """Collect the search queries of every tool call, keeping first-seen order and dropping duplicates."""
+    queries: list[str] = []
+    for tool_call in tool_calls:
+        for query in tool_call["args"].get("search_queries", []):
+            if query not in queries:
+                queries.append(query)
+    return queries
+
+
+def _timeout_result(query: str) -> dict[str, Any]:
+    return {"error": f"Search for '{query}' timed out after {get_settings().search_timeout_seconds} seconds."}
+
+
+def _build_tool_messages(tool_calls: list[dict], results: dict[str, dict]) -> list[ToolMessage]:
+    """Build one ToolMessage per tool call, in the original tool call order."""
     tool_messages: list[ToolMessage] = []
 
-    for tool_call in last_ai_message.tool_calls:
+    for tool_call in tool_calls:
         tool_call_id: str = tool_call["id"] # Id of the tool call.
         # Get the search queries from tool call args.
-        search_queries: list[str] = tool_call["args"].get("search_queries", []) 
-
-        # Search for search_queries using Tavily.
-        query_results: dict[str, dict[str, Any]] =  {}
+        search_queries: list[str] = tool_call["args"].get("search_queries", [])
 
-        for query in search_queries:
-            
-            query_result: dict = tavily_search.invoke(query)
-            query_results[query] = query_result
+        query_results: dict[str, dict[str, Any]] = {
+            query: results[query] for query in search_queries
+        }
 
         tool_messages.append(
             ToolMessage(
@@ -41,10 +66,135 @@ def execute_tool(state: list[BaseMessage]) -> list[BaseMessage]:
                 tool_call_id = tool_call_id
             )
         )
-    
+
     return tool_messages
 
 
+def _tool_messages(state: list[BaseMessage], tool_calls: list[dict], results: dict[str, dict]) -> list[ToolMessage]:
+    settings = get_settings()
+    if not settings.evidence_store:
+        return _build_tool_messages(tool_calls, results)
+    # Deduplicated passages ranked against the critique, within a token budget, see evidence.py.
+    return build_evidence_messages(
+        state,
+        tool_calls,
+        results,
+        top_k = settings.evidence_top_k,
+        token_budget = settings.evidence_token_budget,
+        passage_chars = settings.evidence_passage_chars
+    )
+
+
+def _search_sequentially(queries: list[str]) -> dict[str, dict]:
+    return {query: get_tavily_search().invoke(query) for query in queries}
+
+
+def _search_in_threads(queries: list[str]) -> dict[str, dict]:
+    """
+    Run every query on a thread pool bounded by `search_max_concurrency`.
+    The timeout of each query starts when a worker picks it up, so queries waiting
+    for a free worker are not penalised.
+    """
+    settings = get_settings()
+    timeout: float = settings.search_timeout_seconds
+    started_at: dict[str, float] = {}
+    results: dict[str, dict] = {}
+
+    def search(query: str) -> dict:
+        started_at[query] = time.monotonic()
+        return get_tavily_search().invoke(query)
+
+    executor = ThreadPoolExecutor(max_workers = settings.search_max_concurrency)
+    # Each search runs in a copy of the caller's context, so the run's callbacks see the tool calls.
+    futures: dict[Future, str] = {
+        executor.submit(contextvars.copy_context().run, search, query): query for query in queries
+    }
+    pending: set[Future] = set(futures)
+
+    try:
+        while pending:
+            now: float = time.monotonic()
+            deadlines: list[float] = [
+                started_at[futures[future]] + timeout for future in pending if futures[future] in started_at
+            ]
+            wait_for: float = max(min(deadlines) - now, 0) if deadlines else timeout
+            done, pending = wait(pending, timeout = wait_for, return_when = FIRST_COMPLETED)
+
+            for future in done:
+                query: str = futures[future]
+                try:
+                    results[query] = future.result()
+                except Exception as e:
+                    results[query] = {"error": str(e)}
+
+            # Give up on queries that have been running longer than the timeout.
+            now = time.monotonic()
+            for future in list(pending):
+                query: str = futures[future]
+                if query in started_at and now - started_at[query] >= timeout:
+                    results[query] = _timeout_result(query)
+                    pending.discard(future)
+    finally:
+        # Do not block the round on searches that already timed out.
+        executor.shutdown(wait = False, cancel_futures = True)
+
+    return results
+
+
+async def _search_concurrently(queries: list[str], max_concurrency: int) -> dict[str, dict]:
+    """Run every query on the event loop, at most `max_concurrency` at a time."""
+    settings = get_settings()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def search(query: str) -> dict:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(get_tavily_search().ainvoke(query), timeout = settings.search_timeout_seconds)
+            except asyncio.TimeoutError:
+                return _timeout_result(query)
+            except Exception as e:
+                return {"error": str(e)}
+
+    outputs: list[dict] = await asyncio.gather(*(search(query) for query in queries))
+    return dict(zip(queries, outputs))
+
+
+def execute_tool(state: list[BaseMessage]) -> list[BaseMessage]:
+
+    # Get the last AIMessage from the state.
+    last_ai_message: AIMessage = state[-1]
+
+    if (not hasattr(last_ai_message, "tool_calls")) or (not last_ai_message.tool_calls):
+        # if the last LLM call did not use any tools we append empty list.
+        return state + []
+
+    # Search for all the queries of all the tool calls using Tavily.
+    queries: list[str] = _unique_search_queries(last_ai_message.tool_calls)
+    if get_settings().parallel_search:
+        results: dict[str, dict] = _search_in_threads(queries)
+    else:
+        results = _search_sequentially(queries)
+
+    return _tool_messages(state, last_ai_message.tool_calls, results)
+
+
+async def aexecute_tool(state: list[BaseMessage]) -> list[BaseMessage]:
+    """Async variant of `execute_tool`, used when the graph runs with `ainvoke`/`astream`."""
+
+    last_ai_message: AIMessage = state[-1]
+
+    if (not hasattr(last_ai_message, "tool_calls")) or (not last_ai_message.tool_calls):
+        return state + []
+
+    queries: list[str] = _unique_search_queries(last_ai_message.tool_calls)
+    settings = get_settings()
+    # Without parallel_search the queries run one after another, as in `execute_tool`.
+    max_concurrency: int = settings.search_max_concurrency if settings.parallel_search else 1
+    results: dict[str, dict] = await _search_concurrently(queries, max_concurrency)
+
+    return _tool_messages(state, last_ai_message.tool_calls, results)
+
+
 
     
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+from typing import Any, AsyncIterator, Callable, Dict
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from instrumentation import MetricsRegistry
+import asyncio
+import math
+import threading
+import time
+
+
+class Rejected(Exception):
+    """A request turned away by admission control, answered with `status_code` and a Retry-After header."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(math.ceil(self.retry_after), 1))}
+
+
+class AdmissionController:
+    """
+    Caps the agent runs in progress at `max_concurrency`, and lets at most `max_queue` requests
+    wait for a slot. A request arriving to a full queue, or waiting longer than `queue_timeout_seconds`,
+    is rejected right away with 503, so a burst is shed at the door instead of slowing every run
+    down and overrunning the Gemini and Tavily rate limits together.
+
+    The Retry-After estimate is the time to drain the queue at the moving average run duration.
+    The limits are per process, with serve.py every worker has its own controller.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int = 64,
+        queue_timeout_seconds: float = 10.0,
+        metrics: MetricsRegistry | None = None
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.metrics = metrics
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active: int = 0
+        self.waiting: int = 0
+        self.duration_ewma: float = 1.0
+
+    def retry_after(self) -> float:
+        return self.duration_ewma * (self.waiting + 1) / self.max_concurrency
+
+    async def acquire(self) -> float:
+        """Wait for a slot, returns the time it was granted. Raises Rejected when the queue is full or too slow."""
+        queued_at: float = time.monotonic()
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending, so a burst cannot all slip past the queue check.
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            raise Rejected(503, "queue_full", self.retry_after())
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout = self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                raise Rejected(503, "queue_timeout", self.retry_after()) from None
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        started_at: float = time.monotonic()
+        if self.metrics:
+            self.metrics.observe("agent_admission_queue_seconds", {}, started_at - queued_at)
+        return started_at
+
+    def release(self, started_at: float) -> None:
+        self.active -= 1
+        self.duration_ewma = 0.2 * (time.monotonic() - started_at) + 0.8 * self.duration_ewma
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        started_at: float = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started_at)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse holding an admission slot until the response is over, however it ends: the body
+    was streamed, the client left before the first chunk, or the task was cancelled. A `finally` in
+    the body generator is not enough, it never runs for a body that was not started.
+
+    `release` is called exactly once, by the response or, if the response is never sent, when it is
+    garbage collected. The body generator is closed as well, which stops the agent run it drives.
+    """
+
+    def __init__(self, content: Any, release: Callable[[], None], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self._release = release
+        self._released: bool = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+            if (aclose := getattr(self.body_iterator, "aclose", None)) is not None:
+                await aclose()
+
+    def __del__(self) -> None:
+        self.release()
+
+
+class ClientRateLimiter:
+    """
+    Token bucket per client: `burst` requests at once, refilled at `requests_per_minute`.
+    `check` never waits, it returns how long the client has to wait, or 0 when the request may go.
+    The least recently seen clients are forgotten past `max_clients`.
+    """
+
+    def __init__(self, requests_per_minute: int, burst: int = 10, max_clients: int = 10000) -> None:
+        self.rate: float = requests_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict() # client -> (tokens, updated_at)
+
+    def check(self, client: str) -> float:
+        now: float = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(client, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            wait: float = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last = False)
+        return wait
+
+    def admit(self, client: str) -> None:
+        """Raises Rejected (429) when the client is over its rate."""
+        if (wait := self.check(client)) > 0:
+            raise Rejected(429, "client_rate_limited", wait)
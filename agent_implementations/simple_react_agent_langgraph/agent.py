@@ -1,37 +1,77 @@
-from langchain.agents import create_react_agent
-from langchain.schema.runnable import Runnable
+from langchain_core.runnables import Runnable
+from langchain_core.language_models.chat_models import BaseChatModel
 from typing import List
-from langchain_core.tools import BaseTool
-from config import settings
-from tools import available_tools
-from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
-from langchain import hub
+from functools import lru_cache
+from config import get_settings
+from tools import get_available_tools
 from langchain_core.prompts import PromptTemplate
 from langchain_core.agents import AgentAction, AgentFinish
 from dotenv import load_dotenv
 from langchain_core.exceptions import OutputParserException
+from llm_cache import SQLiteLRUCache
 
 load_dotenv() # To make sure all the env variables to Trace using LangSmith.
 
 
-tools: List[BaseTool] = available_tools
+# The "hwchase17/react" prompt from the LangChain hub, vendored so that building the agent
+# needs no network call.
+REACT_PROMPT_TEMPLATE: str = """Answer the following questions as best you can. You have access to the following tools:
 
+{tools}
 
-llm = ChatGoogleGenerativeAI(
-    google_api_key =  settings.google_api_key,
-    model = "gemini-2.5-flash",
-    max_tokens = 3000,
-    temperature = 0.9
-)
+Use the following format:
 
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
 
-react_prompt_template: PromptTemplate = hub.pull("hwchase17/react")
+Begin!
 
-agent: Runnable = create_react_agent(
-    llm = llm,
-    prompt = react_prompt_template,
-    tools = tools
-)
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+
+@lru_cache(maxsize = None)
+def get_react_prompt() -> PromptTemplate:
+    return PromptTemplate.from_template(REACT_PROMPT_TEMPLATE)
+
+
+@lru_cache(maxsize = None)
+def get_llm_cache() -> SQLiteLRUCache | None:
+    settings = get_settings()
+    if not settings.llm_cache:
+        return None
+    return SQLiteLRUCache(path = settings.llm_cache_path, max_entries = settings.llm_cache_max_entries)
+
+
+@lru_cache(maxsize = None)
+def get_llm() -> BaseChatModel:
+    from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        google_api_key = get_settings().google_api_key,
+        model = "gemini-2.5-flash",
+        max_tokens = 3000,
+        temperature = 0.9,
+        cache = get_llm_cache()
+    )
+
+
+@lru_cache(maxsize = None)
+def get_agent() -> Runnable:
+    """The ReAct agent runnable, built with its LLM and tools on first use and reused afterwards."""
+    from langchain.agents import create_react_agent
+
+    return create_react_agent(
+        llm = get_llm(),
+        prompt = get_react_prompt(),
+        tools = get_available_tools()
+    )
 
 
 if __name__ == "__main__":
@@ -44,7 +84,7 @@ if __name__ == "__main__":
 
     for sample_question in sample_questions:
         try:
-            agent_outcome: (AgentAction | AgentFinish) = agent.invoke(
+            agent_outcome: (AgentAction | AgentFinish) = get_agent().invoke(
                 {
                     "input": sample_question,
                     "intermediate_steps": [],
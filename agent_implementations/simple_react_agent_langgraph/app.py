@@ -1,18 +1,233 @@
-from fastapi import FastAPI
-from graph import graph, AgentState
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from graph import graph, AgentState, PLAN, REASON, ACTION, close_caches, get_observation_store, get_speculative_executor, speculation_disabled_reason, warm_up
+from config import get_settings
+from semantic_cache import SemanticCache, build_embedder
+from instrumentation import instrumented_config, registry
+from admission import AdmissionController, AdmittedStreamingResponse, ClientRateLimiter, Rejected
+from transport import WARM_UP_URLS, HttpPool, get_http_pool
+from langchain_core.agents import AgentAction, AgentFinish
+from typing import Any, AsyncIterator, Dict
+from functools import lru_cache
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import time
+
+
+@lru_cache(maxsize = None)
+def get_semantic_cache() -> SemanticCache:
+    settings = get_settings()
+    return SemanticCache(
+        embedder = build_embedder(settings.semantic_cache_embedder, settings.google_api_key),
+        threshold = settings.semantic_cache_threshold,
+        ttl_seconds = settings.semantic_cache_ttl_seconds,
+        max_entries = settings.semantic_cache_max_entries
+    )
+
+
+@lru_cache(maxsize = None)
+def get_admission_controller() -> AdmissionController | None:
+    settings = get_settings()
+    if settings.admission_max_concurrency is None:
+        return None
+    return AdmissionController(
+        max_concurrency = settings.admission_max_concurrency,
+        max_queue = settings.admission_max_queue,
+        queue_timeout_seconds = settings.admission_queue_timeout_seconds,
+        metrics = registry if settings.instrumentation else None
+    )
+
+
+@lru_cache(maxsize = None)
+def get_client_rate_limiter() -> ClientRateLimiter | None:
+    settings = get_settings()
+    if settings.client_requests_per_minute is None:
+        return None
+    return ClientRateLimiter(requests_per_minute = settings.client_requests_per_minute, burst = settings.client_burst)
+
+
+def client_id(request: Request) -> str:
+    """
+    The key of the client's rate limit: the peer address, or the `client_id_header` set by a trusted
+    proxy. A header sent by the caller is not used, rotating it would bypass the limit.
+    """
+    if (header := get_settings().client_id_header) and (value := request.headers.get(header)):
+        # A proxy appends the address it saw to x-forwarded-for, the entries before it are the caller's.
+        return value.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "anonymous"
+
+
+async def admit(request: Request) -> float | None:
+    """
+    Rate limit the client, then wait for an agent slot. Returns the time the slot was granted, to
+    hand back to `release`, or None with admission control off. Rejections become 429 or 503.
+    """
+    try:
+        if (client_rate_limiter := get_client_rate_limiter()) is not None:
+            client_rate_limiter.admit(client_id(request))
+        admission_controller: AdmissionController | None = get_admission_controller()
+        return await admission_controller.acquire() if admission_controller else None
+    except Rejected as e:
+        if get_settings().instrumentation:
+            registry.inc("agent_admission_rejected_total", {"reason": e.reason})
+        raise HTTPException(status_code = e.status_code, detail = e.reason, headers = e.headers) from None
+
+
+def release(started_at: float | None) -> None:
+    if started_at is not None:
+        get_admission_controller().release(started_at)
+
+
+def _run_config() -> Dict[str, Any]:
+    """Run config of one request: instrumentation callbacks and the deadline of the ReAct loop."""
+    settings = get_settings()
+    run_config, _ = instrumented_config(None, "react", settings.instrumentation)
+    if settings.agent_deadline_seconds is not None:
+        run_config["configurable"] = {"deadline": time.time() + settings.agent_deadline_seconds}
+    return run_config
+
+
+def _tools_used(response: AgentState) -> list[str]:
+    return [agent_action.tool for agent_action, _ in response["intermediate_steps"]]
 
 
 def get_answer(input: str) -> dict:
+    settings = get_settings()
+    if settings.semantic_cache and (cached := get_semantic_cache().lookup(input)) is not None:
+        return cached
+
+    run_config: Dict[str, Any] = _run_config()
     response: AgentState = graph.invoke(
         AgentState(
             input = input,
             agent_outcome = None,
             intermediate_steps = []
-        )
+        ),
+        config = run_config
     )
+
+    if settings.semantic_cache:
+        get_semantic_cache().store(input, response["agent_outcome"].return_values, _tools_used(response))
     return response["agent_outcome"].return_values
 
+
+async def aget_answer(input: str) -> dict:
+    """Async variant of `get_answer`, so the event loop is free while the agent waits on the LLM and tools."""
+    settings = get_settings()
+    if settings.semantic_cache and (cached := await get_semantic_cache().alookup(input)) is not None:
+        return cached
+
+    run_config: Dict[str, Any] = _run_config()
+    response: AgentState = await graph.ainvoke(
+        AgentState(
+            input = input,
+            agent_outcome = None,
+            intermediate_steps = []
+        ),
+        config = run_config
+    )
+
+    if settings.semantic_cache:
+        await get_semantic_cache().astore(input, response["agent_outcome"].return_values, _tools_used(response))
+    return response["agent_outcome"].return_values
+
+
+def _is_node_end(event: Dict[str, Any], node: str) -> bool:
+    """True for the end event of the graph node itself, not of the runnables nested inside it."""
+    return (
+        event["event"] == "on_chain_end"
+        and event["name"] == node
+        and any(tag.startswith("graph:step:") for tag in event.get("tags", []))
+    )
+
+
+async def stream_answer(input: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the graph with `astream_events` and yield one event per step as it happens:
+        - token: a chunk of the LLM completion inside the reason node.
+        - action: the AgentAction chosen by the reason node.
+        - observation: the tool output produced by the action node.
+        - final: the AgentFinish return values.
+    """
+    run_config: Dict[str, Any] = _run_config()
+    async for event in graph.astream_events(
+        AgentState(
+            input = input,
+            agent_outcome = None,
+            intermediate_steps = []
+        ),
+        config = run_config,
+        version = "v2"
+    ):
+        kind: str = event["event"]
+        node: str | None = event.get("metadata", {}).get("langgraph_node")
+
+        if kind == "on_chat_model_stream" and node == REASON:
+            content: Any = event["data"]["chunk"].content
+            if content:
+                yield {"type": "token", "content": content}
+
+        elif _is_node_end(event, REASON):
+            agent_outcome: AgentAction | AgentFinish = event["data"]["output"]["agent_outcome"]
+            if isinstance(agent_outcome, AgentFinish):
+                yield {"type": "final", "output": agent_outcome.return_values}
+            else:
+                yield {
+                    "type": "action",
+                    "tool": agent_outcome.tool,
+                    "tool_input": agent_outcome.tool_input,
+                    "log": agent_outcome.log
+                }
+
+        elif _is_node_end(event, PLAN) and event["data"]["output"]:
+            # Answered by the calculator fast path, without the agent.
+            for agent_action, observation in event["data"]["output"]["intermediate_steps"]:
+                yield {"type": "observation", "tool": agent_action.tool, "output": observation}
+            yield {"type": "final", "output": event["data"]["output"]["agent_outcome"].return_values}
+
+        elif _is_node_end(event, ACTION):
+            for agent_action, observation in event["data"]["output"]["intermediate_steps"]:
+                yield {"type": "observation", "tool": agent_action.tool, "output": observation}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Runs in every worker process once it has started (see serve.py), so each worker builds its own
+    agent and clients, and none is inherited from the parent. The connections of the HttpPool are
+    opened before the first request and kept warm while the worker is idle. On shutdown uvicorn
+    first stops accepting connections and waits for the requests in flight, then the connections
+    and the caches are closed.
+    """
+    settings = get_settings()
+    http_pool: HttpPool = get_http_pool()
+    # The agent's LLM is Gemini, over its own gRPC channel, only the Tavily client uses the pool.
+    urls: list[str] = [WARM_UP_URLS["tavily"]]
+
+    if settings.speculative_execution and (reason := speculation_disabled_reason()) is not None:
+        print(f"Speculative tool execution is disabled: {reason}.", end = "\n")
+
+    await asyncio.to_thread(warm_up)
+    keep_warm: asyncio.Task | None = None
+    if settings.http_warm_up_connections > 0:
+        await http_pool.awarm_up(urls, settings.http_warm_up_connections)
+        if settings.http_keep_warm_seconds is not None:
+            keep_warm = asyncio.create_task(
+                http_pool.keep_warm(urls, settings.http_keep_warm_seconds, settings.http_warm_up_connections)
+            )
+
+    yield
+
+    if keep_warm is not None:
+        keep_warm.cancel()
+    get_speculative_executor().close()
+    await http_pool.aclose()
+    await asyncio.to_thread(close_caches)
+
+
 app = FastAPI(
+    lifespan = lifespan,
     title = "ReAct Agent",
     summary = "A simple ReAct agent implementation using LangGraph",
     description = "This API provides a simple ReAct agent that can perform actions based on user input.",
@@ -21,7 +236,7 @@ app = FastAPI(
 
 
 @app.get("/react_agent")
-async def react_agent(input: str) -> dict:
+async def react_agent(input: str, request: Request) -> dict:
     """
     Endpoint to get the answer from the ReAct agent.
     
@@ -30,8 +245,73 @@ async def react_agent(input: str) -> dict:
     
     Returns:
         dict: The agent's response containing the outcome.
+
+    Raises:
+        HTTPException: 429 when the client is over its rate, 503 when the agent queue is full,
+            both with a Retry-After header.
+    """
+    started_at: float | None = await admit(request)
+    try:
+        return await aget_answer(input)
+    finally:
+        release(started_at)
+
+
+@app.get("/react_agent/stream")
+async def react_agent_stream(input: str, request: Request) -> StreamingResponse:
+    """
+    Streaming variant of `/react_agent`.
+
+    Args:
+        input (str): The input string provided to the agent.
+
+    Returns:
+        StreamingResponse: Newline delimited JSON, one object per token, action, observation and the final answer.
+    """
+    # Admitted before the response starts, so a rejection is still a plain 429 or 503. The slot is
+    # held until the response is over, see AdmittedStreamingResponse.
+    started_at: float | None = await admit(request)
+
+    async def ndjson() -> AsyncIterator[str]:
+        async for event in stream_answer(input):
+            yield json.dumps(event, default = str) + "\n"
+
+    return AdmittedStreamingResponse(ndjson(), release = lambda: release(started_at), media_type = "application/x-ndjson")
+
+
+@app.get("/observations/{observation_id}")
+async def observation(observation_id: str) -> Any:
+    """
+    Full output of a tool call whose observation was shortened in the agent's scratchpad, by the id
+    given in the observation. Kept in memory by the worker that ran the call, for the latest calls only.
+    """
+    if (output := get_observation_store().get(observation_id)) is None:
+        raise HTTPException(status_code = 404, detail = f"Observation {observation_id} not found.")
+    return output
+
+
+@app.get("/transport")
+async def transport() -> dict:
+    """Connection pool stats of the LLM and search clients of this worker: open, active and idle connections, queued and saturated requests."""
+    return get_http_pool().stats
+
+
+@app.get("/speculation")
+async def speculation() -> dict:
+    """
+    Tool calls this worker started while the LLM was still streaming: used, discarded, and the seconds they ran ahead.
+    `disabled_reason` tells why speculation is not running, None while it runs.
+    """
+    return {**get_speculative_executor().stats, "disabled_reason": speculation_disabled_reason()}
+
+
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    """
+    Prometheus metrics of the agent: node and LLM latencies, token counts, estimated cost and tool calls.
+    Empty unless the `instrumentation` setting is on.
     """
-    return get_answer(input)
+    return PlainTextResponse(registry.render_prometheus(), media_type = "text/plain; version=0.0.4")
     
 
 
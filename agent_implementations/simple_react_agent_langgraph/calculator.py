@@ -0,0 +1,186 @@
+from typing import Any, Callable, Dict, List
+from datetime import datetime
+import ast
+import math
+import operator
+import re
+
+
+class CalculatorError(ValueError):
+    """The expression is not pure arithmetic, or cannot be evaluated."""
+
+
+MAX_EXPRESSION_LENGTH: int = 500
+MAX_EXPONENT: int = 100
+# Digits of any intermediate result, checked before a power is computed and after every operation.
+MAX_DIGITS: int = 1000
+
+BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+}
+
+
+def date_names(now: datetime | None = None) -> Dict[str, int]:
+    """Names of the current date parts usable in expressions, "date" is the day of the month."""
+    now = now or datetime.now()
+    return {
+        "day": now.day,
+        "date": now.day,
+        "month": now.month,
+        "year": now.year,
+        "hour": now.hour,
+        "minute": now.minute,
+    }
+
+
+def evaluate(expression: str, names: Dict[str, int | float] | None = None) -> int | float:
+    """
+    Evaluate an arithmetic expression without `eval`: numbers, + - * / // % **, parentheses,
+    abs, round, min, max, sqrt and the date names of `date_names`. Anything else raises CalculatorError.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise CalculatorError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters.")
+    names = date_names() if names is None else names
+
+    try:
+        tree: ast.Expression = ast.parse(expression.strip(), mode = "eval")
+    except SyntaxError as e:
+        raise CalculatorError(f"Invalid expression {expression!r}.") from e
+
+    def bounded(value: int | float) -> int | float:
+        # bit_length is cheap, 3.33 bits per digit.
+        if isinstance(value, int) and value.bit_length() > MAX_DIGITS * 3.33:
+            raise CalculatorError(f"Result longer than {MAX_DIGITS} digits.")
+        return value
+
+    def visit(node: ast.AST) -> int | float:
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return bounded(node.value)
+        if isinstance(node, ast.Name) and node.id in names:
+            return names[node.id]
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return bounded(UNARY_OPERATORS[type(node.op)](visit(node.operand)))
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left, right = visit(node.left), visit(node.right)
+            if isinstance(node.op, ast.Pow):
+                if abs(right) > MAX_EXPONENT:
+                    raise CalculatorError(f"Exponent larger than {MAX_EXPONENT}.")
+                # The size of the result before computing it, nested powers would take forever.
+                if abs(left) > 1 and right > 0 and right * math.log10(abs(left)) > MAX_DIGITS:
+                    raise CalculatorError(f"Result longer than {MAX_DIGITS} digits.")
+            return bounded(BINARY_OPERATORS[type(node.op)](left, right))
+        if (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in FUNCTIONS and not node.keywords
+        ):
+            return FUNCTIONS[node.func.id](*(visit(arg) for arg in node.args))
+        raise CalculatorError(f"Unsupported element {ast.dump(node)[:60]} in {expression!r}.")
+
+    try:
+        return visit(tree.body)
+    except CalculatorError:
+        raise
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise CalculatorError(f"Cannot evaluate {expression!r}: {e}.") from e
+
+
+def format_number(value: int | float) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.12g}" if isinstance(value, float) else str(value)
+
+
+def calculate_all(expressions: str) -> str:
+    """Evaluate expressions separated by ";" or new lines, one "expression = value" line each."""
+    names: Dict[str, int] = date_names()
+    lines: List[str] = []
+    for expression in filter(None, (part.strip() for part in re.split(r"[;\n]", expressions))):
+        try:
+            lines.append(f"{expression} = {format_number(evaluate(expression, names))}")
+        except ValueError as e:
+            # CalculatorError, or a result too large for str() (int max str digits).
+            lines.append(f"{expression}: {e}")
+    return "\n".join(lines)
+
+
+# Natural language arithmetic, eg. "what is 2.89762 plus 98.872634, add the result with 87.8, and
+# multiply it with 2.5", translated into one expression by `plan`.
+
+QUESTION_PREFIX = re.compile(r"^(?:what(?:'s| is)|whats|calculate|compute|evaluate|how much is|tell me)\s+")
+DATE_OPERAND = re.compile(r"\b(?:the\s+)?(?:current\s+|today'?s\s+)?(day|date|month|year|hour|minute)\b")
+WORD_OPERATORS: List[tuple[re.Pattern, str]] = [
+    (re.compile(r"\bmultiplied by\b"), "*"),
+    (re.compile(r"\bdivided by\b"), "/"),
+    (re.compile(r"\bto the power of\b"), "**"),
+    (re.compile(r"\bplus\b"), "+"),
+    (re.compile(r"\bminus\b"), "-"),
+    (re.compile(r"\btimes\b"), "*"),
+    (re.compile(r"\bmod(?:ulo)?\b"), "%"),
+]
+RESULT = r"(?:(?:it|the result|that)\s+)?"
+STEPS: List[tuple[re.Pattern, str]] = [
+    (re.compile(rf"^add\s+{RESULT}(?:with\s+|to\s+)?(?P<operand>.+?)(?:\s+to\s+(?:it|the result|that))?$"), "+"),
+    (re.compile(r"^subtract\s+(?P<operand>.+?)(?:\s+from\s+(?:it|the result|that))?$"), "-"),
+    (re.compile(rf"^mu+ltiply\s+{RESULT}(?:with\s+|by\s+)?(?P<operand>.+)$"), "*"),
+    (re.compile(rf"^divide\s+{RESULT}by\s+(?P<operand>.+)$"), "/"),
+]
+CLAUSE_SEPARATOR = re.compile(r"\s*(?:[,;]|\bthen\b)\s*")
+
+
+def _to_expression(text: str) -> str:
+    text = DATE_OPERAND.sub(lambda match: match.group(1), text)
+    for pattern, symbol in WORD_OPERATORS:
+        text = pattern.sub(symbol, text)
+    return text.strip()
+
+
+def _group(expression: str) -> str:
+    return expression if re.fullmatch(r"[\w.]+", expression) else f"({expression})"
+
+
+def plan(question: str) -> str | None:
+    """
+    The expression of a purely arithmetic or date question, or None when the question needs the agent.
+    The expression is only returned if it evaluates, so the caller can answer without any LLM call.
+    """
+    text: str = QUESTION_PREFIX.sub("", question.strip().lower().rstrip("?.! "))
+    clauses: List[str] = [re.sub(r"^and\s+", "", clause) for clause in CLAUSE_SEPARATOR.split(text) if clause]
+    if not clauses:
+        return None
+
+    expression: str = _to_expression(clauses[0])
+    for clause in clauses[1:]:
+        for pattern, symbol in STEPS:
+            if match := pattern.match(clause):
+                expression = f"{_group(expression)} {symbol} {_group(_to_expression(match.group('operand')))}"
+                break
+        else:
+            return None
+
+    # A single number or date name is not a calculation.
+    if not re.search(r"[-+*/%]|\w\(", expression):
+        return None
+    try:
+        evaluate(expression)
+    except CalculatorError:
+        return None
+    return expression
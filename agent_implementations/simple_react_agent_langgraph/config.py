@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings): 
@@ -10,9 +11,77 @@ class Settings(BaseSettings):
     langsmith_tracing: bool
     langsmith_project: str
 
+    # Search result cache shared by the TavilySearch tool.
+    search_cache_path: str = "search_cache.db"
+    search_cache_ttl_seconds: int = 86400
+    search_cache_max_entries: int = 5000
+    search_cache_memory_entries: int = 256
+
+    # Opt-in exact match cache of LLM calls. Like the search cache, one SQLite file is shared by
+    # every worker process of serve.py.
+    llm_cache: bool = False
+    llm_cache_path: str = "llm_cache.db"
+    llm_cache_max_entries: int = 10000
+
+    # Opt-in semantic cache of final answers.
+    semantic_cache: bool = False
+    semantic_cache_embedder: str = "hashing"
+    semantic_cache_threshold: float = 0.9
+    semantic_cache_ttl_seconds: float = 3600
+    semantic_cache_max_entries: int = 1000
+
+    # Answer purely arithmetic or date questions with the local calculator, without any LLM call.
+    calculator_fast_path: bool = True
+
+    # Admission control of the API, see admission.py. Limits are per worker process, None disables one.
+    admission_max_concurrency: int | None = 16
+    admission_max_queue: int = 64
+    admission_queue_timeout_seconds: float = 10.0
+    client_requests_per_minute: int | None = 60
+    client_burst: int = 10
+    # Clients are rate limited by peer address. Behind a trusted proxy, name the header it sets
+    # (eg. "x-forwarded-for", its last entry is used); never a header the caller controls.
+    client_id_header: str | None = None
+
+    # Bounds of one ReAct run, past either the loop stops before the next LLM call.
+    agent_max_steps: int = 8
+    agent_deadline_seconds: float | None = 60.0
+
+    # Scratchpad of the ReAct loop, see scratchpad.py. Observations are cut to the first limit,
+    # only the last `scratchpad_max_steps` steps are shown in full to the LLM.
+    scratchpad_max_observation_chars: int = 2000
+    scratchpad_max_steps: int = 4
+    observation_store_max_entries: int = 1000
+
+    # Shared keep-alive HTTP connection pool of the Groq and Tavily clients, see transport.py.
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 60.0
+    http_timeout_seconds: float = 60.0
+    http2: bool = True
+    # Connections opened per host when the API starts, then re-opened every `http_keep_warm_seconds`.
+    http_warm_up_connections: int = 2
+    http_keep_warm_seconds: float | None = 45.0
+
+    # Speculative tool execution, see speculative.py: the LLM output is streamed and a tool of
+    # `speculative_tools` starts as soon as its Action Input is complete, before the final parse.
+    # Opt-in: with the hwchase17/react prompt the input is unquoted on the last line, which is only
+    # complete when the stream ends, so it pays off only for prompts quoting the input or ending its
+    # line. Off while `llm_cache` is on, streamed calls skip the cache.
+    speculative_execution: bool = False
+    speculative_tools: list[str] = ["tavily_search"]
+    speculative_max_workers: int = 4
+
+    # Per node timings, token counts and tool calls, see instrumentation.py.
+    instrumentation: bool = False
+
     class Config:
         env_file = ".env"
         extra = "ignore"
 
-settings = Settings()
-print("API Keys loaded succesfully.")
\ No newline at end of file
+@lru_cache(maxsize = None)
+def get_settings() -> Settings:
+    """Settings are read from the environment and .env on first use, then reused by every caller."""
+    settings: Settings = Settings()
+    print("API Keys loaded succesfully.")
+    return settings
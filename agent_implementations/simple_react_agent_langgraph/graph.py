@@ -1,14 +1,22 @@
-from agent import agent
+from agent import get_agent, get_llm_cache
 from langgraph.graph import StateGraph, END
 import operator
 from typing import Any, List, Tuple, TypedDict, Annotated, Dict
 from langchain_core.agents import AgentAction, AgentFinish
-import json 
-from tools import available_tools
-from langchain_core.tools import BaseTool
+from tools import get_tavily_search, get_tool_registry
+from tool_registry import RegisteredTool
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from dotenv import load_dotenv
 from langchain_core.exceptions import OutputParserException
-from langchain_tavily import TavilySearch
+from config import get_settings
+from instrumentation import instrumented_config
+from calculator import CalculatorError, evaluate, format_number, plan
+from scratchpad import ObservationStore, ScratchpadPolicy
+from speculative import SpeculativeExecutor
+from functools import lru_cache
+from concurrent.futures import CancelledError
+import asyncio
+import time
 
 
 
@@ -21,7 +29,8 @@ class AgentState(TypedDict):
     Attributes:
         input: The input string provided to the agent.
         agent_outcome: The outcome of the agent's action, which can be an AgentAction or AgentFinish.
-        intermediate_steps: A list of tuples containing the agent's actions and their corresponding outputs.
+        intermediate_steps: A list of tuples containing the agent's actions and their corresponding outputs,
+            shortened by the scratchpad policy (the full outputs are in the ObservationStore).
     """
 
     input: str 
@@ -30,70 +39,246 @@ class AgentState(TypedDict):
 
 
 
+@lru_cache(maxsize = None)
+def get_observation_store() -> ObservationStore:
+    return ObservationStore(max_entries = get_settings().observation_store_max_entries)
+
+
+@lru_cache(maxsize = None)
+def get_scratchpad_policy() -> ScratchpadPolicy:
+    settings = get_settings()
+    return ScratchpadPolicy(
+        store = get_observation_store(),
+        max_observation_chars = settings.scratchpad_max_observation_chars,
+        max_steps = settings.scratchpad_max_steps
+    )
+
+
+def _agent_input(state: AgentState) -> AgentState:
+    """The state as the agent sees it, with the older steps folded by the scratchpad policy."""
+    return {**state, "intermediate_steps": get_scratchpad_policy().render(state["intermediate_steps"])}
+
+
+PLAN = "plan"
 REASON = "reason"
 ACTION = "action"
 
 
-def reason_node(state: AgentState) -> AgentState:
-    
+def _finish_from_parse_error(e: OutputParserException) -> AgentFinish:
+    print(f"ReActSingleInputOutputParseException occurs, so type cast the llm output into AgentFinish object", end = "\n")
+    return AgentFinish(
+        return_values = {"output": e.llm_output},
+        log = "Now, I Know the final answer."
+    )
+
+
+def plan_node(state: AgentState) -> AgentState:
+    """
+    Pre-planner: a purely arithmetic or date question (see calculator.plan) is answered here with one
+    `calculate` step, instead of one LLM round trip per operation. Any other question goes to the agent.
+    """
+    if not get_settings().calculator_fast_path or (expression := plan(state["input"])) is None:
+        return {}
+
+    try:
+        result: str = format_number(evaluate(expression))
+    except (CalculatorError, ArithmeticError, ValueError):
+        # Eg. a result too large to print (int digit limit): the agent answers instead.
+        return {}
+    return {
+        "agent_outcome": AgentFinish(
+            return_values = {"output": f"{expression} = {result}"},
+            log = "Answered by the calculator fast path."
+        ),
+        "intermediate_steps": [
+            (AgentAction(tool = "calculate", tool_input = expression, log = "Calculator fast path."), result)
+        ]
+    }
+
+
+def _early_finish(state: AgentState, config: RunnableConfig) -> AgentFinish | None:
+    """
+    Ends the loop before the next LLM call once the run has used `max_steps` tool calls or passed
+    its `deadline` (a time.time() timestamp), both read from config["configurable"].
+    """
+    configurable: Dict[str, Any] = (config or {}).get("configurable", {})
+    max_steps: int = configurable.get("max_steps", get_settings().agent_max_steps)
+    deadline: float | None = configurable.get("deadline")
+
+    if len(state["intermediate_steps"]) >= max_steps:
+        limit: str = "iteration limit"
+    elif deadline is not None and time.time() >= deadline:
+        limit = "time limit"
+    else:
+        return None
+
+    # Same output as LangChain's AgentExecutor when it stops early.
+    return AgentFinish(
+        return_values = {"output": f"Agent stopped due to {limit}."},
+        log = f"Stopped after {len(state['intermediate_steps'])} steps, {limit} reached."
+    )
+
+
+def speculation_disabled_reason() -> str | None:
+    """Why speculative tool execution is not running, None while it runs."""
+    settings = get_settings()
+    if not settings.speculative_execution:
+        return "speculative_execution is off"
+    if not settings.speculative_tools:
+        return "speculative_tools is empty"
+    if settings.llm_cache:
+        # Streamed LLM calls skip the LLM cache, so speculation stays off while the cache is on.
+        return "llm_cache is on, and streamed LLM calls would skip the cache"
+    return None
+
+
+def _speculating() -> bool:
+    return speculation_disabled_reason() is None
+
+
+def reason_node(state: AgentState, config: RunnableConfig) -> AgentState:
+
+    if (agent_finish := _early_finish(state, config)) is not None:
+        return {"agent_outcome": agent_finish}
+
     try:
         
-        agent_outcome: AgentAction | AgentFinish = agent.invoke(state)
+        if _speculating():
+            agent_outcome: AgentAction | AgentFinish = get_speculative_executor().invoke(get_agent(), _agent_input(state))
+        else:
+            agent_outcome = get_agent().invoke(_agent_input(state))
     
     except OutputParserException as e:
-        print(f"ReActSingleInputOutputParseException occurs, so type cast the llm output into AgentFinish object", end = "\n")
-        agent_outcome: AgentFinish = AgentFinish(
-            return_values = {"output": e.llm_output},
-            log = "Now, I Know the final answer."
-        )
+        agent_outcome: AgentFinish = _finish_from_parse_error(e)
 
     return {
         "agent_outcome": agent_outcome
     }
 
 
+async def areason_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    """Async variant of `reason_node`, used when the graph runs with `ainvoke`/`astream`."""
 
-def action_node(state: AgentState) -> AgentState:
+    if (agent_finish := _early_finish(state, config)) is not None:
+        return {"agent_outcome": agent_finish}
+
+    try:
+        if _speculating():
+            agent_outcome: AgentAction | AgentFinish = await get_speculative_executor().ainvoke(get_agent(), _agent_input(state))
+        else:
+            agent_outcome = await get_agent().ainvoke(_agent_input(state))
+    except OutputParserException as e:
+        agent_outcome: AgentFinish = _finish_from_parse_error(e)
+
+    return {
+        "agent_outcome": agent_outcome
+    }
+
+
+def _prepare_tool_call(agent_action: AgentAction) -> Tuple[RegisteredTool | None, Any]:
+    """Find the tool requested by the AgentAction and parse its input with the tool's schema."""
 
-    agent_action: AgentAction = state["agent_outcome"]
     print(f"Current agent_action: {agent_action}", end = "\n")
 
-    # Extract tool name and tool input from AgentAction
-    tool_name: str = agent_action.tool
-    tool_input: str = agent_action.tool_input
+    # Find the matching tool in the prebuilt registry.
+    registered_tool: RegisteredTool | None = get_tool_registry().get(agent_action.tool)
+    print(f"Current tool name: {agent_action.tool}", end = "\n")
 
-    tools_by_name: Dict[str, BaseTool | TavilySearch] = {tool.name: tool for tool in available_tools} 
-    # Find the matching tool function.
-    tool_function: BaseTool | None = tools_by_name.get(tool_name)
-    print(f"Current tool name: {tool_name}", end = "\n")
+    if registered_tool is None:
+        return None, agent_action.tool_input
 
+    # Raises a ValidationError if the input does not fit the tool's args_schema.
+    parsed_input: Any = registered_tool.parse(agent_action.tool_input)
+    print(f"The parsed input is {parsed_input}")
+    return registered_tool, parsed_input
 
-    # Try to load the tool input, if it is like a JSON.
-    parsed_input = tool_input
-    if isinstance(parsed_input, str):
-        try:
-            parsed_input = json.loads(tool_input)
-            print(f"The parsed input is {parsed_input}")
-        except json.JSONDecodeError:
-            pass # Leave it as string if not a valid JSON.
 
-    
-    # Execute the tool function with parsed_input. 
-    if tool_function:
-        try:
-            output: Any = tool_function.invoke(input = parsed_input)
-        except Exception as e:
-            print(f"Unexpected Error occurs {str(e)}")
-            output = f"Error occurred while executing tool {tool_name}: {str(e)}"
-    else:
-        output = f"Tool {tool_name} not found."
-    
+def _action_update(agent_action: AgentAction, output: Any) -> AgentState:
     print(f"The output of this tool is: {output}", end = "\n")
+    # The state keeps a bounded observation, the full output stays in the ObservationStore.
     return {
-        "intermediate_steps": [(agent_action, str(output))]
+        "intermediate_steps": [(agent_action, get_scratchpad_policy().compact(output))]
     }
 
 
+def _run_tool(agent_action: AgentAction) -> Any:
+    """The output of the tool asked for by the AgentAction, or the error message for the agent."""
+    try:
+        registered_tool, parsed_input = _prepare_tool_call(agent_action)
+        if registered_tool:
+            return registered_tool.tool.invoke(input = parsed_input)
+        return f"Tool {agent_action.tool} not found."
+    except Exception as e:
+        print(f"Unexpected Error occurs {str(e)}")
+        return f"Error occurred while executing tool {agent_action.tool}: {str(e)}"
+
+
+async def _arun_tool(agent_action: AgentAction) -> Any:
+    """Async variant of `_run_tool`, awaits the tool with `ainvoke`."""
+    try:
+        registered_tool, parsed_input = _prepare_tool_call(agent_action)
+        if registered_tool:
+            return await registered_tool.tool.ainvoke(input = parsed_input)
+        return f"Tool {agent_action.tool} not found."
+    except Exception as e:
+        print(f"Unexpected Error occurs {str(e)}")
+        return f"Error occurred while executing tool {agent_action.tool}: {str(e)}"
+
+
+@lru_cache(maxsize = None)
+def get_speculative_executor() -> SpeculativeExecutor:
+    settings = get_settings()
+    return SpeculativeExecutor(
+        run_tool = _run_tool,
+        arun_tool = _arun_tool,
+        tools = settings.speculative_tools,
+        max_workers = settings.speculative_max_workers
+    )
+
+
+def action_node(state: AgentState) -> AgentState:
+
+    agent_action: AgentAction = state["agent_outcome"]
+    
+    # Execute the tool function with parsed_input, unless the reason node already started it.
+    output: Any = None
+    if (speculation := get_speculative_executor().take(agent_action)) is not None:
+        try:
+            output = speculation.result()
+        except CancelledError:
+            # Cancelled after it was handed out (eg. by close()), run the tool now.
+            speculation = None
+    if speculation is None:
+        output = _run_tool(agent_action)
+    
+    return _action_update(agent_action, output)
+
+
+async def aaction_node(state: AgentState) -> AgentState:
+    """Async variant of `action_node`, awaits the tool with `ainvoke`."""
+
+    agent_action: AgentAction = state["agent_outcome"]
+
+    output: Any = None
+    if (speculation := get_speculative_executor().take(agent_action)) is not None:
+        try:
+            output = await speculation.aresult()
+        except (CancelledError, asyncio.CancelledError):
+            if not speculation.future.cancelled() or asyncio.current_task().cancelling():
+                raise # This node itself is being cancelled.
+            speculation = None
+    if speculation is None:
+        output = await _arun_tool(agent_action)
+
+    return _action_update(agent_action, output)
+
+
+def plan_route(state: AgentState) -> str:
+    if isinstance(state.get("agent_outcome"), AgentFinish):
+        return END
+    return REASON
+
+
 def should_continue(state: AgentState) -> AgentState:
     
     # print(f"Current agent outcome in should_continue: {state["agent_outcome"]}")
@@ -104,10 +289,20 @@ def should_continue(state: AgentState) -> AgentState:
 
 # Build the state graph for the agent.
 graph_builder = StateGraph(AgentState)
-graph_builder.add_node(REASON, reason_node)
-graph_builder.add_node(ACTION, action_node)
+# Each node carries a sync and an async implementation, so the same graph serves `invoke` and `ainvoke`.
+graph_builder.add_node(PLAN, plan_node)
+graph_builder.add_node(REASON, RunnableLambda(reason_node, afunc = areason_node, name = REASON))
+graph_builder.add_node(ACTION, RunnableLambda(action_node, afunc = aaction_node, name = ACTION))
 
-graph_builder.set_entry_point(REASON)
+graph_builder.set_entry_point(PLAN)
+graph_builder.add_conditional_edges(
+    PLAN,
+    plan_route,
+    path_map = {
+        REASON: REASON,
+        END: END
+    }
+)
 graph_builder.add_edge(ACTION, REASON)
 graph_builder.add_conditional_edges(
     REASON,
@@ -121,24 +316,41 @@ graph_builder.add_conditional_edges(
 graph = graph_builder.compile()
 
 
+def warm_up() -> None:
+    """Build the agent, its clients and the tool registry now rather than on the first request."""
+    get_agent()
+    get_tool_registry()
+
+
+def close_caches() -> None:
+    """Close the SQLite connections of the caches, the last step of a graceful shutdown."""
+    if (llm_cache := get_llm_cache()) is not None:
+        llm_cache.close()
+    get_tavily_search().cache.close()
+
+
 if __name__ == "__main__":
 
     sample_questions: List[str] = [
         "Hello, This is Nagarjun, I'm an AI Engineer",
         # "What is 2.89762 plus 98.872634",
-        # "what is 2.89762 plus 98.872634, add the result with 87.8, and muultiply it with 2.5",
+        "what is 2.89762 plus 98.872634, add the result with 87.8, and muultiply it with 2.5",
         "Get the current date and month and give me their sum and product",
         # "Why langgraph is best in AI Frameworks."
     ]
 
     
     for sample_question in sample_questions:
+        run_config, run_metrics = instrumented_config(None, "react", get_settings().instrumentation)
         response: AgentState = graph.invoke(
             AgentState(
                 input = sample_question,
                 agent_outcome = None,
                 intermediate_steps = []
-            )
+            ),
+            config = run_config
         )
 
-        print(f"Question: {sample_question}\n\nAnswer: {response["agent_outcome"]}\n\nIntermediate Steps: {response["intermediate_steps"]}")
\ No newline at end of file
+        print(f"Question: {sample_question}\n\nAnswer: {response["agent_outcome"]}\n\nIntermediate Steps: {response["intermediate_steps"]}")
+        if run_metrics:
+            print(run_metrics.summary())
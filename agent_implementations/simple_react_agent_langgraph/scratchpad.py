@@ -0,0 +1,109 @@
+from typing import Any, Dict, List, Tuple
+from collections import OrderedDict
+from langchain_core.agents import AgentAction
+import json
+import threading
+import uuid
+
+
+class ObservationStore:
+    """
+    Full tool outputs, kept out of the agent state and the prompts, by observation id.
+    An in-memory LRU of `max_entries` outputs, per process (with serve.py, per worker).
+    """
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._outputs: OrderedDict[str, Any] = OrderedDict()
+
+    def put(self, output: Any) -> str:
+        observation_id: str = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._outputs[observation_id] = output
+            while len(self._outputs) > self.max_entries:
+                self._outputs.popitem(last = False)
+        return observation_id
+
+    def get(self, observation_id: str) -> Any | None:
+        with self._lock:
+            if observation_id not in self._outputs:
+                return None
+            self._outputs.move_to_end(observation_id)
+            return self._outputs[observation_id]
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "..."
+
+
+def _render_search_results(output: Dict[str, Any], max_chars: int) -> str:
+    """Tavily results as "title (url): content" lines, without the scores, timings and raw content."""
+    results: List[Dict[str, Any]] = output.get("results") or []
+    per_result: int = max(max_chars // max(len(results), 1) - 100, 100)
+    lines: List[str] = [
+        f"{result.get('title', '')} ({result.get('url', '')}): {_truncate(str(result.get('content', '')), per_result)}"
+        for result in results
+    ]
+    if answer := output.get("answer"):
+        lines.insert(0, f"Answer: {answer}")
+    return "\n".join(lines) or "No results."
+
+
+class ScratchpadPolicy:
+    """
+    Keeps the prompt of every ReAct step bounded.
+
+    `compact` turns a tool output into the observation stored in the state: search results are
+    rendered as short text, anything longer than `max_observation_chars` is cut, and the cut
+    observation names the id of the full output in the ObservationStore.
+    `render` is what the agent sees of the steps: the last `max_steps` in full, the older ones
+    folded into a single step listing the action and the start of its observation.
+    """
+
+    def __init__(
+        self,
+        store: ObservationStore,
+        max_observation_chars: int = 2000,
+        max_steps: int = 4,
+        summary_chars: int = 200
+    ) -> None:
+        self.store = store
+        self.max_observation_chars = max_observation_chars
+        self.max_steps = max_steps
+        self.summary_chars = summary_chars
+
+    def compact(self, output: Any) -> str:
+        shortened: bool = False
+        if isinstance(output, dict) and "results" in output:
+            text: str = _render_search_results(output, self.max_observation_chars)
+            shortened = True
+        elif isinstance(output, (dict, list)):
+            text = json.dumps(output, default = str, ensure_ascii = False)
+        else:
+            text = str(output)
+
+        if len(text) > self.max_observation_chars:
+            text = _truncate(text, self.max_observation_chars)
+            shortened = True
+        if not shortened:
+            return text
+        return f"{text}\n[Shortened, full output: {self.store.put(output)}]"
+
+    def render(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> List[Tuple[AgentAction, str]]:
+        if len(intermediate_steps) <= self.max_steps:
+            return intermediate_steps
+
+        older: List[Tuple[AgentAction, str]] = intermediate_steps[:len(intermediate_steps) - self.max_steps]
+        # Only the most recent of the older steps are listed, so the summary is bounded as well.
+        max_lines: int = max(self.max_observation_chars // self.summary_chars, 1)
+        lines: List[str] = [
+            f"- {action.tool}({_truncate(str(action.tool_input), 100)}): {_truncate(' '.join(observation.split()), self.summary_chars)}"
+            for action, observation in older[-max_lines:]
+        ]
+        summary = AgentAction(
+            tool = "earlier_steps",
+            tool_input = "",
+            log = f"I already took {len(older)} earlier steps:\n" + "\n".join(lines)
+        )
+        return [(summary, "Summarized above."), *intermediate_steps[-self.max_steps:]]
@@ -0,0 +1,53 @@
+"""
+Production serving mode of the ReAct agent API: several uvicorn worker processes sharing one port.
+
+Workers are started with the spawn method, so each one imports `app` in a fresh interpreter and its
+lifespan builds the graph, the LLM client and the Tavily client in that process. No client, socket
+or SQLite connection is inherited from the parent. The search cache and the opt-in LLM cache are
+SQLite files in WAL mode, every worker opens its own connection to the same path, so a result
+fetched by one worker is a cache hit for the others.
+
+On SIGTERM or SIGINT each worker stops accepting connections, lets the requests in flight (including
+streams) finish for up to --graceful-timeout seconds, then closes its caches.
+
+Usage (from this directory):
+    python serve.py --workers 4 --port 8000
+    python benchmarks/load_test.py --url http://127.0.0.1:8000   # from agent_implementations
+"""
+from typing import List, Optional
+import argparse
+import os
+import uvicorn
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default = "0.0.0.0")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--workers", type = int, default = os.cpu_count() or 1, help = "Worker processes, one per core by default.")
+    parser.add_argument("--graceful-timeout", type = float, default = 30.0, help = "Seconds to drain the requests in flight on shutdown.")
+    parser.add_argument("--keep-alive", type = int, default = 5, help = "Seconds an idle keep-alive connection is kept open.")
+    parser.add_argument("--limit-concurrency", type = int, default = None, help = "Connections per worker before answering 503.")
+    parser.add_argument("--backlog", type = int, default = 2048)
+    parser.add_argument("--log-level", default = "info")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    uvicorn.run(
+        "app:app",
+        app_dir = os.path.dirname(os.path.abspath(__file__)),
+        host = args.host,
+        port = args.port,
+        workers = args.workers,
+        timeout_graceful_shutdown = args.graceful_timeout,
+        timeout_keep_alive = args.keep_alive,
+        limit_concurrency = args.limit_concurrency,
+        backlog = args.backlog,
+        log_level = args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableSequence
+import asyncio
+import contextvars
+import json
+import re
+import threading
+import time
+
+
+# The regex of LangChain's ReActSingleInputOutputParser, which makes the final decision.
+ACTION_PATTERN: re.Pattern = re.compile(r"Action\s*\d*\s*:[\s]*(.*?)Action\s*\d*\s*Input\s*\d*\s*:[\s]*(.*)", re.DOTALL)
+FINAL_ANSWER: str = "Final Answer:"
+
+
+def _text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block if isinstance(block, str) else str(block.get("text", ""))
+        for block in message.content if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+def _self_delimited(text: str) -> bool:
+    """A quoted string or a JSON object that is already closed, nothing more can belong to it."""
+    if len(text) > 1 and text[0] == text[-1] == '"':
+        return True
+    if text.startswith("{") and text.endswith("}"):
+        try:
+            json.loads(text)
+            return True
+        except ValueError:
+            return False
+    return False
+
+
+def complete_action(text: str) -> Tuple[str, str] | None:
+    """
+    The (tool, tool_input) of a partial ReAct completion once its Action Input is complete: its
+    line has ended, or it is a closed quoted string or JSON object. Normalized as the ReAct parser
+    does, so it can be compared with the final AgentAction.
+
+    The agent's stop sequence "\\nObservation" also swallows the newline ending the input line, so
+    an unquoted input on the last line is only known to be complete when the stream ends.
+    """
+    if FINAL_ANSWER in text or (match := ACTION_PATTERN.search(text)) is None:
+        return None
+    tool_input, newline, _ = match.group(2).partition("\n")
+    if not newline and not _self_delimited(tool_input.strip()):
+        return None
+    tool_input = tool_input.strip(" ").strip('"')
+    if not tool_input:
+        return None
+    return match.group(1).strip(), tool_input
+
+
+class Speculation:
+    """A tool call started before the LLM finished its completion."""
+
+    __slots__ = ("tool", "tool_input", "future", "started_at", "head_start")
+
+    def __init__(self, tool: str, tool_input: str, future: Future | asyncio.Future) -> None:
+        self.tool = tool
+        self.tool_input = tool_input
+        self.future = future
+        self.started_at: float = time.perf_counter()
+        self.head_start: float = 0.0 # Seconds the tool ran before the completion ended.
+
+    def matches(self, outcome: AgentAction | AgentFinish) -> bool:
+        return isinstance(outcome, AgentAction) and (outcome.tool, outcome.tool_input) == (self.tool, self.tool_input)
+
+    def cancel(self) -> None:
+        # A search already sent cannot be taken back, its result is just never read.
+        self.future.cancel()
+
+    def result(self) -> Any:
+        return self.future.result()
+
+    async def aresult(self) -> Any:
+        if isinstance(self.future, asyncio.Future):
+            return await self.future
+        return await asyncio.wrap_future(self.future)
+
+
+class SpeculativeExecutor:
+    """
+    Starts the tool of a ReAct step while the LLM is still streaming its completion.
+
+    The completion is streamed instead of invoked, and parsed as it grows (see `complete_action`).
+    As soon as the Action Input is complete, a tool of `tools` (side effect free ones only: a call
+    may be wasted) starts in the background. When the stream ends the ReAct parser decides as
+    usual: if its AgentAction asks for the same tool with the same input, the running call is kept
+    for the action node (`take`), otherwise it is cancelled or its result dropped.
+
+    `run_tool` and `arun_tool` take the AgentAction and return the tool output, errors included, as
+    the action node would. Calls kept but never taken (eg. a cancelled run) are dropped after `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        run_tool: Callable[[AgentAction], Any],
+        arun_tool: Callable[[AgentAction], Awaitable[Any]],
+        tools: Iterable[str],
+        max_workers: int = 4,
+        ttl_seconds: float = 300.0
+    ) -> None:
+        self.run_tool = run_tool
+        self.arun_tool = arun_tool
+        self.tools: set[str] = set(tools)
+        self.ttl_seconds = ttl_seconds
+        self._pool = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "speculative-tool")
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Tuple[AgentAction, Speculation]] = {} # id(AgentAction) -> its running call.
+        self.started: int = 0
+        self.used: int = 0
+        self.discarded: int = 0
+        self.head_start_seconds: float = 0.0
+
+    @staticmethod
+    def split(agent: Runnable) -> Tuple[Runnable, Runnable] | None:
+        """The agent as (prompt and LLM, output parser), None if it is not a RunnableSequence ending in a parser."""
+        if not isinstance(agent, RunnableSequence) or len(agent.steps) < 2:
+            return None
+        return RunnableSequence(*agent.steps[:-1]), agent.last
+
+    def _speculate(self, text: str, start: Callable[[AgentAction], Future | asyncio.Future]) -> Speculation | None:
+        if (action := complete_action(text)) is None or action[0] not in self.tools:
+            return None
+        speculation = Speculation(*action, start(AgentAction(tool = action[0], tool_input = action[1], log = text)))
+        with self._lock:
+            self.started += 1
+        return speculation
+
+    def _decide(self, outcome: AgentAction | AgentFinish | None, speculation: Speculation | None) -> None:
+        """Keep the call for the action node if the final AgentAction agrees with it, drop it otherwise."""
+        if speculation is None:
+            return
+        now: float = time.perf_counter()
+        with self._lock:
+            for key, (_, stale) in list(self._pending.items()):
+                if now - stale.started_at > self.ttl_seconds:
+                    stale.cancel()
+                    del self._pending[key]
+                    self.discarded += 1
+            if outcome is not None and speculation.matches(outcome):
+                speculation.head_start = now - speculation.started_at
+                self._pending[id(outcome)] = (outcome, speculation)
+                return
+            self.discarded += 1
+        speculation.cancel()
+
+    def invoke(self, agent: Runnable, agent_input: Dict[str, Any]) -> AgentAction | AgentFinish:
+        """Like `agent.invoke(agent_input)`, starting the tool while the completion streams."""
+        if (parts := self.split(agent)) is None:
+            return agent.invoke(agent_input)
+        head, parser = parts
+
+        def start(action: AgentAction) -> Future:
+            return self._pool.submit(contextvars.copy_context().run, self.run_tool, action)
+
+        message: BaseMessage | None = None
+        text: str = ""
+        speculation: Speculation | None = None
+        outcome: AgentAction | AgentFinish | None = None
+        try:
+            for chunk in head.stream(agent_input):
+                message = chunk if message is None else message + chunk
+                text += _text(chunk)
+                if speculation is None:
+                    speculation = self._speculate(text, start)
+            outcome = parser.invoke(message if message is not None else "")
+        finally:
+            self._decide(outcome, speculation)
+        return outcome
+
+    async def ainvoke(self, agent: Runnable, agent_input: Dict[str, Any]) -> AgentAction | AgentFinish:
+        """Async variant of `invoke`, the tool runs as a task of the event loop."""
+        if (parts := self.split(agent)) is None:
+            return await agent.ainvoke(agent_input)
+        head, parser = parts
+
+        def start(action: AgentAction) -> asyncio.Future:
+            return asyncio.ensure_future(self.arun_tool(action))
+
+        message: BaseMessage | None = None
+        text: str = ""
+        speculation: Speculation | None = None
+        outcome: AgentAction | AgentFinish | None = None
+        try:
+            async for chunk in head.astream(agent_input):
+                message = chunk if message is None else message + chunk
+                text += _text(chunk)
+                if speculation is None:
+                    speculation = self._speculate(text, start)
+            outcome = await parser.ainvoke(message if message is not None else "")
+        finally:
+            self._decide(outcome, speculation)
+        return outcome
+
+    def take(self, agent_action: AgentAction) -> Speculation | None:
+        """The call started for this AgentAction, if any and not cancelled. It is handed out once."""
+        with self._lock:
+            entry: Tuple[AgentAction, Speculation] | None = self._pending.get(id(agent_action))
+            if entry is None or entry[0] is not agent_action:
+                return None
+            del self._pending[id(agent_action)]
+            if entry[1].future.cancelled():
+                return None
+            self.used += 1
+            self.head_start_seconds += entry[1].head_start
+            return entry[1]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tools": sorted(self.tools),
+                "started": self.started,
+                "used": self.used,
+                "discarded": self.discarded,
+                "pending": len(self._pending),
+                "head_start_seconds": round(self.head_start_seconds, 3),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            pending: List[Speculation] = [speculation for _, speculation in self._pending.values()]
+            self._pending.clear()
+        for speculation in pending:
+            speculation.cancel()
+        self._pool.shutdown(wait = False, cancel_futures = True)
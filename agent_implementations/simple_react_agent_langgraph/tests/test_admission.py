@@ -0,0 +1,76 @@
+# The agents share module names (config, graph, ...), run the tests of one agent at a time:
+#     python -m pytest simple_react_agent_langgraph/tests
+from pathlib import Path
+import asyncio
+import gc
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest # noqa: E402
+from starlette.requests import ClientDisconnect # noqa: E402
+from admission import AdmissionController, AdmittedStreamingResponse # noqa: E402
+
+
+SCOPE = {"type": "http", "asgi": {"spec_version": "2.4"}}
+
+
+async def admitted_response(controller: AdmissionController, body) -> AdmittedStreamingResponse:
+    started_at = await controller.acquire()
+    return AdmittedStreamingResponse(body, release = lambda: controller.release(started_at), media_type = "application/x-ndjson")
+
+
+async def never_ending_body():
+    await asyncio.Event().wait()
+    yield "{}\n"
+
+
+async def receive():
+    await asyncio.Event().wait()
+
+
+def test_client_gone_before_the_first_chunk_releases_the_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrency = 1)
+        response = await admitted_response(controller, never_ending_body())
+        assert controller.active == 1
+
+        async def send(message):
+            raise OSError("Client disconnected.")
+
+        with pytest.raises(ClientDisconnect):
+            await response(SCOPE, receive, send)
+        assert controller.active == 0
+        # The slot is usable again.
+        controller.release(await controller.acquire())
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_stream_releases_the_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrency = 1)
+        response = await admitted_response(controller, never_ending_body())
+
+        async def send(message):
+            pass
+
+        task = asyncio.create_task(response(SCOPE, receive, send))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_response_never_sent_releases_the_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrency = 1)
+        response = await admitted_response(controller, never_ending_body())
+        del response
+        gc.collect()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+# The agents share module names (config, graph, ...), run the tests of one agent at a time:
+#     python -m pytest simple_react_agent_langgraph/tests
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest # noqa: E402
+from calculator import MAX_DIGITS, CalculatorError, calculate_all, evaluate, plan # noqa: E402
+
+
+def test_plan_answers_chained_operations():
+    expression = plan("what is 2.5 plus 97.5, and multiply it with 2")
+    assert expression == "(2.5 + 97.5) * 2"
+    assert evaluate(expression) == 200
+
+
+def test_nested_power_is_rejected_before_it_is_computed():
+    started_at = time.perf_counter()
+    assert plan("what is (((9**99)**99)**99)**99") is None
+    with pytest.raises(CalculatorError):
+        evaluate("(((9**99)**99)**99)**99")
+    assert time.perf_counter() - started_at < 1
+
+
+def test_products_past_the_digit_limit_are_rejected():
+    with pytest.raises(CalculatorError):
+        evaluate("9**99 * 9**99 * 9**99 * 9**99 * 9**99 * 9**99 * 9**99 * 9**99 * 9**99 * 9**99 * 9**99")
+    assert len(str(evaluate("9**99 * 9**99"))) < MAX_DIGITS
+
+
+def test_calculate_reports_the_error_on_its_line():
+    assert calculate_all("(9**99)**99; 6*7").splitlines() == [
+        f"(9**99)**99: Result longer than {MAX_DIGITS} digits.",
+        "6*7 = 42",
+    ]
@@ -0,0 +1,29 @@
+# The agents share module names (config, graph, ...), run the tests of one agent at a time:
+#     python -m pytest simple_react_agent_langgraph/tests
+from pathlib import Path
+import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+for name in ("TAVILY_API_KEY", "GOOGLE_API_KEY", "LANGSMITH_API_KEY", "LANGSMITH_ENDPOINT", "LANGSMITH_PROJECT"):
+    os.environ.setdefault(name, "test")
+os.environ["LANGSMITH_TRACING"] = "false"
+
+import pytest # noqa: E402
+import graph # noqa: E402
+from config import get_settings # noqa: E402
+
+
+@pytest.mark.parametrize("speculative_execution, speculative_tools, llm_cache, reason", [
+    (False, ["tavily_search"], False, "speculative_execution is off"),
+    (True, [], False, "speculative_tools is empty"),
+    (True, ["tavily_search"], True, "llm_cache is on, and streamed LLM calls would skip the cache"),
+    (True, ["tavily_search"], False, None),
+])
+def test_speculation_disabled_reason(monkeypatch, speculative_execution, speculative_tools, llm_cache, reason):
+    monkeypatch.setattr(get_settings(), "speculative_execution", speculative_execution)
+    monkeypatch.setattr(get_settings(), "speculative_tools", speculative_tools)
+    monkeypatch.setattr(get_settings(), "llm_cache", llm_cache)
+
+    assert graph.speculation_disabled_reason() == reason
+    assert graph._speculating() is (reason is None)
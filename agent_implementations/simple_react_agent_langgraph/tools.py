@@ -1,10 +1,12 @@
 from datetime import datetime
 from langchain_core.tools import tool 
-from langchain_tavily import TavilySearch
-from config import settings
+from config import get_settings
+from functools import lru_cache
+from tool_registry import ToolRegistry
 from typing import List, Any
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
+from calculator import calculate_all
 
 class InputSchema(BaseModel):
     """
@@ -72,14 +74,58 @@ def division(num_1: int | float, num_2: int | float) -> float:
 
 
 
-tavily_search = TavilySearch(
-    tavily_api_key = settings.tavily_api_key,
-    max_results = 2
+class CalculateSchema(BaseModel):
+    """CalculateSchema holds one or more arithmetic expressions, separated by ';'."""
+    expression: str = Field(description = "Arithmetic expressions separated by ';' eg. (2.5 + 3) * 4; day * month")
+
+
+@tool(
+    name_or_callable = "calculate",
+    description = (
+        "Use to evaluate a whole arithmetic expression in one step instead of chaining addition, "
+        "subtraction, multiplication and division, eg. (2.89762 + 98.872634 + 87.8) * 2.5. "
+        "Supports + - * / // % **, parentheses, abs, round, min, max, sqrt and the names "
+        "day, month, year, hour and minute for the current date and time. "
+        "Separate several expressions with ';'."
+    ),
+    args_schema = CalculateSchema
 )
+def calculate(expression: str) -> str:
+    """Returns one "expression = value" line per expression."""
+    return calculate_all(expression)
+
+
+
+@lru_cache(maxsize = None)
+def get_tavily_search() -> BaseTool:
+    """The cached Tavily search tool, created on first use and reused afterwards."""
+    from search_cache import CachedTavilySearch, SearchCache
+    from transport import PooledTavilySearchAPIWrapper
+
+    settings = get_settings()
+    search_cache = SearchCache(
+        path = settings.search_cache_path,
+        ttl_seconds = settings.search_cache_ttl_seconds,
+        max_entries = settings.search_cache_max_entries,
+        memory_entries = settings.search_cache_memory_entries
+    )
+
+    return CachedTavilySearch(
+        api_wrapper = PooledTavilySearchAPIWrapper(tavily_api_key = settings.tavily_api_key),
+        max_results = 2,
+        cache = search_cache
+    )
+
+
+@lru_cache(maxsize = None)
+def get_available_tools() -> List[BaseTool]:
+    return [get_current_date, addition, multiplication, subtraction, division, calculate, get_tavily_search()]
+
 
-available_tools: List[BaseTool | TavilySearch] = [
-    get_current_date, addition, multiplication, subtraction, division, tavily_search
-]
+# Name index and argument parsers, built once on first use and shared by the graph nodes.
+@lru_cache(maxsize = None)
+def get_tool_registry() -> ToolRegistry:
+    return ToolRegistry(get_available_tools())
 
 
 